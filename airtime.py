@@ -0,0 +1,56 @@
+# airtime.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+from math import ceil
+
+# --- CONFIGURATION & CONSTANTS ---
+
+# Meshtastic modem presets: (spreading factor, bandwidth in Hz, coding rate 4/(4+cr))
+MODEM_PRESETS = {
+    'SHORT_TURBO':    (7, 500000, 1),
+    'SHORT_FAST':     (7, 250000, 1),
+    'SHORT_SLOW':     (8, 250000, 1),
+    'MEDIUM_FAST':    (9, 250000, 1),
+    'MEDIUM_SLOW':    (10, 250000, 1),
+    'LONG_FAST':      (11, 250000, 1),
+    'LONG_MODERATE':  (11, 125000, 4),
+    'LONG_SLOW':      (12, 125000, 4),
+    'VERY_LONG_SLOW': (12, 62500, 4),
+}
+DEFAULT_PRESET = 'LONG_FAST'   # The Meshtastic default channel
+
+PREAMBLE_SYMBOLS = 16          # Meshtastic uses a 16 symbol preamble
+MESH_HEADER_BYTES = 16         # Unencrypted Meshtastic packet header sent before the payload
+DATA_OVERHEAD_BYTES = 4        # Protobuf framing of the Data message (portnum + payload length)
+ROUTING_ACK_BYTES = MESH_HEADER_BYTES + 10   # A routing ACK: header plus a small Routing message
+
+
+def frame_bytes(text):
+    """Bytes on air for a text message: UTF-8 payload plus the Meshtastic header and framing."""
+    return len(text.encode('utf-8')) + MESH_HEADER_BYTES + DATA_OVERHEAD_BYTES
+
+
+def airtime_seconds(frame_size, preset=DEFAULT_PRESET):
+    """
+    LoRa time on air for a frame of frame_size bytes (Semtech AN1200.13 formula, explicit
+    header, CRC on, low data rate optimisation when a symbol lasts longer than 16 ms).
+    """
+    sf, bandwidth, cr = MODEM_PRESETS[preset]
+    symbol_time = (2 ** sf) / bandwidth
+    low_data_rate = 1 if symbol_time > 0.016 else 0
+    preamble = (PREAMBLE_SYMBOLS + 4.25) * symbol_time
+    payload_symbols = 8 + max(ceil((8 * frame_size - 4 * sf + 28 + 16) / (4 * (sf - 2 * low_data_rate))) * (cr + 4), 0)
+    return preamble + payload_symbols * symbol_time
+
+
+def text_airtime(text, preset=DEFAULT_PRESET):
+    """Time on air for one text packet."""
+    return airtime_seconds(frame_bytes(text), preset)
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    print(f"{'preset':<15} {'20 B':>8} {'120 B':>8} {'233 B':>8}  (time on air, ms)")
+    for name in MODEM_PRESETS:
+        row = [airtime_seconds(size + MESH_HEADER_BYTES + DATA_OVERHEAD_BYTES, name) * 1000 for size in (20, 120, 233)]
+        print(f"{name:<15} {row[0]:>8.0f} {row[1]:>8.0f} {row[2]:>8.0f}")
@@ -0,0 +1,324 @@
+# archive_store.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import copy
+import gzip
+import io
+import json
+import os
+import re
+import threading
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+
+# --- CONFIGURATION & CONSTANTS ---
+MANIFEST_FILE = 'manifest.json'
+SEGMENT_POSTS = 1000         # A topic's newest segment takes appended posts until it holds this many
+CACHED_SEGMENTS = 4          # Decoded segments kept in memory for paging through the archive
+SECONDS_PER_DAY = 86400
+
+_RETENTION_SPEC = re.compile(r'^(?:([A-Za-z]):)?(?:(\d+)|(\d+(?:\.\d+)?)d|(\d+)/(\d+(?:\.\d+)?)d)$')
+
+
+def parse_retention(specs, topics):
+    """
+    Parses --retention specs into {topic_id: (max_posts, max_age_seconds)}, None meaning no limit.
+    Each spec is "N" (keep the newest N posts), "Dd" (keep D days), "N/Dd" (both), optionally
+    prefixed with a topic, e.g. "500/90d H:100". Specs without a topic apply to every topic
+    and topic specs override them. Raises ValueError for a malformed spec or unknown topic.
+    """
+    default = (None, None)
+    per_topic = {}
+    for spec in specs:
+        match = _RETENTION_SPEC.match(spec.strip())
+        if not match:
+            raise ValueError(f"bad retention '{spec}' (use N, Dd or N/Dd, optionally as TOPIC:...)")
+        topic_id, posts, days, both_posts, both_days = match.groups()
+        posts, days = posts or both_posts, days or both_days
+        limits = (int(posts) if posts else None, float(days) * SECONDS_PER_DAY if days else None)
+        if topic_id is None:
+            default = limits
+        elif topic_id.upper() in topics:
+            per_topic[topic_id.upper()] = limits
+        else:
+            raise ValueError(f"unknown topic '{topic_id}' in retention '{spec}'")
+    retention = {topic_id: per_topic.get(topic_id, default) for topic_id in topics}
+    return {topic_id: limits for topic_id, limits in retention.items() if limits != (None, None)}
+
+
+def describe_retention(limits):
+    max_posts, max_age = limits
+    parts = []
+    if max_posts:
+        parts.append(f"newest {max_posts} posts")
+    if max_age:
+        parts.append(f"{max_age / SECONDS_PER_DAY:g} days")
+    return ' or '.join(parts)
+
+
+class ArchiveStore:
+    """
+    Compressed, append-only archive of posts that retention moved out of BBSData's hot lists.
+
+    Each topic's archive is a run of gzip segments of JSON lines, oldest first. New posts are
+    appended to the topic's newest segment as another gzip member until it holds
+    SEGMENT_POSTS, then a new segment is started; segments are never rewritten. The small
+    manifest (post counts, ID ranges and committed byte length per segment, per-poster
+    totals for the board stats) is all that is loaded at open. Reads decode only the segment holding the requested
+    posts and keep the last few decoded segments in an LRU cache.
+    """
+    def __init__(self, directory, topics):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # {segment file: list of messages}
+        self.stats = {'segment_reads': 0, 'cache_hits': 0}
+        self._topics = {topic_id: {'segments': [], 'posters': {}} for topic_id in topics}
+        self._load_manifest()
+        self._starts = {}             # {topic_id: first archive position of each segment}
+        for topic_id in self._topics:
+            self._index_topic(topic_id)
+
+    @property
+    def manifest_file(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return
+        try:
+            with open(self.manifest_file, 'r') as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"BBS Data Manager: Error reading archive manifest ({e}). Archived posts are unavailable.")
+            return
+        for topic_id, entry in saved.get('topics', {}).items():
+            if topic_id in self._topics:
+                self._topics[topic_id] = entry
+
+    def _save_manifest(self):
+        """Writes the manifest through a temporary file and an atomic rename."""
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'topics': self._topics}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.manifest_file)
+
+    def _index_topic(self, topic_id):
+        starts, position = [], 0
+        for segment in self._topics[topic_id]['segments']:
+            starts.append(position)
+            position += segment['count']
+        self._starts[topic_id] = starts
+
+    # --- WRITES ---
+
+    def append(self, topic_id, messages):
+        """
+        Archives messages (oldest first, IDs above everything already archived in the topic).
+        The segment is fsync'd before the manifest records it, so a crash in between leaves
+        the posts in the hot set, and archiving them again later is harmless: the segment is
+        first cut back to the length the manifest committed, dropping any torn gzip member.
+        """
+        if not messages:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            # Changes go to a copy that replaces the topic's entry once the manifest is saved
+            entry = copy.deepcopy(self._topics[topic_id])
+            pending = list(messages)
+            while pending:
+                segments = entry['segments']
+                # Segments from manifests without a committed length may end in a torn member,
+                # so they are closed rather than appended to
+                if not segments or segments[-1]['count'] >= SEGMENT_POSTS or 'bytes' not in segments[-1]:
+                    segments.append({'file': f"{topic_id}-{pending[0]['id']}.jsonl.gz", 'count': 0,
+                                     'first_id': pending[0]['id'], 'last_id': 0, 'bytes': 0})
+                segment = segments[-1]
+                batch, pending = pending[:SEGMENT_POSTS - segment['count']], pending[SEGMENT_POSTS - segment['count']:]
+                path = os.path.join(self.directory, segment['file'])
+                with open(path, 'ab') as raw:
+                    raw.truncate(segment['bytes'])    # Drop whatever an interrupted append left behind
+                    with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                        f.write(''.join(json.dumps(m) + "\n" for m in batch).encode('utf-8'))
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    segment['bytes'] = os.fstat(raw.fileno()).st_size
+                segment['count'] += len(batch)
+                segment['last_id'] = batch[-1]['id']
+                self._cache.pop(segment['file'], None)
+                for message in batch:
+                    totals = entry['posters'].setdefault(message['user_id'], [0, message['timestamp'], message['timestamp']])
+                    totals[0] += 1
+                    totals[1] = min(totals[1], message['timestamp'])
+                    totals[2] = max(totals[2], message['timestamp'])
+            previous, self._topics[topic_id] = self._topics[topic_id], entry
+            try:
+                self._save_manifest()
+            except OSError:
+                self._topics[topic_id] = previous
+                raise
+            self._index_topic(topic_id)
+
+    # --- READS ---
+
+    def count(self, topic_id):
+        entry = self._topics.get(topic_id)
+        return sum(segment['count'] for segment in entry['segments']) if entry else 0
+
+    def last_id(self, topic_id):
+        """Highest message ID archived in the topic (0 if none)."""
+        entry = self._topics.get(topic_id)
+        return entry['segments'][-1]['last_id'] if entry and entry['segments'] else 0
+
+    def max_id(self):
+        return max((self.last_id(topic_id) for topic_id in self._topics), default=0)
+
+    def poster_counts(self):
+        """Returns (topic, user_id, count, first timestamp, last timestamp) rows for the stats rebuild."""
+        return [(topic_id, user_id, count, first_post, last_post)
+                for topic_id, entry in self._topics.items()
+                for user_id, (count, first_post, last_post) in entry['posters'].items()]
+
+    def page(self, topic_id, offset, limit, total=None):
+        """
+        Returns up to `limit` archived posts of a topic, newest first, skipping the `offset` newest.
+        total is the archive count the offset was measured against (default: the current count),
+        so posts archived since then do not shift the page.
+        """
+        if total is None:
+            total = self.count(topic_id)
+        position = total - 1 - offset      # Archive position (oldest first) of the first post returned
+        result = []
+        while position >= 0 and len(result) < limit:
+            index = bisect_right(self._starts[topic_id], position) - 1
+            messages = self._segment(self._topics[topic_id]['segments'][index])
+            start = self._starts[topic_id][index]
+            while position >= start and len(result) < limit:
+                if position - start < len(messages):     # Posts lost from a damaged segment are skipped
+                    result.append(messages[position - start])
+                position -= 1
+        return result
+
+    def get(self, topic_id, msg_id):
+        """Returns the archived message with this ID if it belongs to the topic, otherwise None."""
+        entry = self._topics.get(topic_id)
+        if not entry:
+            return None
+        for segment in entry['segments']:
+            if segment['first_id'] <= msg_id <= segment['last_id']:
+                for message in self._segment(segment):
+                    if message['id'] == msg_id:
+                        return message
+                return None
+        return None
+
+    def find(self, msg_id):
+        """Returns (topic_id, message) for an archived message ID in any topic, or None."""
+        for topic_id in self._topics:
+            message = self.get(topic_id, msg_id)
+            if message is not None:
+                return topic_id, message
+        return None
+
+    def messages(self, topic_id):
+        """Yields every archived post of a topic, oldest first (search index rebuild)."""
+        for segment in self._topics[topic_id]['segments']:
+            yield from self._segment(segment, cache=False)
+
+    def _segment(self, segment, cache=True):
+        """Returns the decoded posts of one segment, reading it from disk if it is not cached."""
+        name = segment['file']
+        with self._lock:
+            messages = self._cache.get(name)
+            if messages is not None:
+                self._cache.move_to_end(name)
+                self.stats['cache_hits'] += 1
+                return messages
+        messages = []
+        last_id = 0
+        try:
+            # Only the committed bytes are decoded; a torn member after them is never read
+            with open(os.path.join(self.directory, name), 'rb') as raw:
+                data = raw.read(segment.get('bytes', -1))
+            with io.TextIOWrapper(gzip.GzipFile(fileobj=io.BytesIO(data)), encoding='utf-8') as f:
+                for line in f:
+                    message = json.loads(line)
+                    # Skip posts appended twice by an interrupted archive run, or not yet in the manifest
+                    if last_id < message['id'] <= segment['last_id']:
+                        messages.append(message)
+                        last_id = message['id']
+        except (OSError, EOFError, zlib.error, json.JSONDecodeError) as e:
+            print(f"BBS Data Manager: Error reading archive segment {name}: {e}")
+        with self._lock:
+            self.stats['segment_reads'] += 1
+            if cache:
+                self._cache[name] = messages
+                while len(self._cache) > CACHED_SEGMENTS:
+                    self._cache.popitem(last=False)
+        return messages
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    import tempfile
+
+    assert parse_retention(['500/90d', 'H:100'], ['G', 'H']) == {'G': (500, 90 * SECONDS_PER_DAY), 'H': (100, None)}
+    assert parse_retention(['30d'], ['G']) == {'G': (None, 30 * SECONDS_PER_DAY)}
+    for bad in ('', 'x', 'Q:10', '10/'):
+        try:
+            parse_retention([bad], ['G', 'H'])
+            raise AssertionError(f"accepted '{bad}'")
+        except ValueError:
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        SEGMENT_POSTS = 7
+        store = ArchiveStore(tmp, ['G', 'H'])
+        posts = [{'id': i, 'timestamp': float(i), 'user_id': f"!{i % 3}", 'subject': f"s{i}", 'body': 'b'} for i in range(1, 31)]
+        for start in range(0, 20, 4):
+            store.append('G', posts[start:start + 4])
+
+        def crash():
+            raise OSError("simulated crash before the manifest was written")
+        store._save_manifest = crash
+        try:
+            store.append('G', posts[20:24])
+        except OSError:
+            pass
+        assert store.count('G') == 20, "a failed append leaves the manifest untouched"
+
+        # After the crash the same posts are archived again; the copy already in the segment is skipped
+        reopened = ArchiveStore(tmp, ['G', 'H'])
+        reopened.append('G', posts[20:24])
+        reopened.append('G', posts[24:30])
+        reopened = ArchiveStore(tmp, ['G', 'H'])
+        assert reopened.count('G') == 30 and reopened.last_id('G') == 30 and reopened.count('H') == 0
+        assert [m['id'] for m in reopened.page('G', 0, 5)] == [30, 29, 28, 27, 26]
+        assert [m['id'] for m in reopened.page('G', 27, 5)] == [3, 2, 1]
+        assert [m['id'] for m in reopened.page('G', 0, 30)] == list(range(30, 0, -1))
+        assert reopened.get('G', 17)['subject'] == 's17' and reopened.get('H', 17) is None
+        assert reopened.find(22) == ('G', posts[21])
+        assert [m['id'] for m in reopened.messages('G')] == list(range(1, 31))
+        assert sum(row[2] for row in reopened.poster_counts()) == 30
+
+        # A crash in the middle of an append leaves a torn gzip member after the committed bytes
+        segment = reopened._topics['G']['segments'][-1]
+        with open(os.path.join(tmp, segment['file']), 'ab') as f:
+            f.write(gzip.compress(json.dumps(posts[0]).encode('utf-8'))[:25])
+        reopened = ArchiveStore(tmp, ['G', 'H'])
+        assert [m['id'] for m in reopened.page('G', 0, 3)] == [30, 29, 28]
+        more = [dict(posts[0], id=i, subject=f"s{i}") for i in range(31, 34)]
+        reopened.append('G', more)
+        reopened = ArchiveStore(tmp, ['G', 'H'])
+        assert [m['id'] for m in reopened.page('G', 0, 34)] == list(range(33, 0, -1))
+
+        # A segment that decodes to fewer posts than the manifest counts is paged around, not indexed past
+        segment = reopened._topics['G']['segments'][0]
+        with open(os.path.join(tmp, segment['file']), 'r+b') as f:
+            f.truncate(segment['bytes'] // 2)
+        reopened = ArchiveStore(tmp, ['G', 'H'])
+        survivors = len(reopened._segment(segment))
+        assert survivors < 7 and [m['id'] for m in reopened.page('G', 26, 10)] == list(range(survivors, 0, -1))
+        print(f"ArchiveStore OK: {len(reopened._topics['G']['segments'])} segments, {reopened.stats}")
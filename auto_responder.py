@@ -6,8 +6,22 @@ import meshtastic.serial_interface
 from pubsub import pub
 import time
 import logging
+import os
 import sys
-from bbs_data_manager import BBSData
+from bbs_data_manager import BBSData, STORAGE_MODES, BBS_DATA_FILE, TOPIC_KEYS
+from archive_store import parse_retention
+from send_scheduler import SendScheduler, AckFlowControl, PRIORITY_INTERACTIVE, PRIORITY_GAME, PRIORITY_BULK
+from render_cache import RenderCache, ALL_TOPICS
+from session_manager import SessionStore
+from worker_pool import KeyedWorkerPool, DEFAULT_WORKERS
+from packet_trace import TraceRecorder
+from dedupe_cache import DedupeCache
+from rate_limiter import (RateLimiter, LIMIT_SETTINGS, DEFAULT_NODE_RATE, DEFAULT_NODE_AIRTIME,
+                          DEFAULT_GLOBAL_RATE, DEFAULT_GLOBAL_AIRTIME)
+from metrics import MetricsRegistry, JsonFileExporter, start_http_exporter, DEFAULT_JSON_INTERVAL
+from airtime import DEFAULT_PRESET, text_airtime
+from chip_bank import CHIP_BANK_FILE
+from packet_packer import pack_message, fits_in_packet, payload_bytes, MAX_PAYLOAD_BYTES
 from math import ceil
 import argparse
 
@@ -46,6 +60,7 @@ BBS_SECTION_MENU_ASCII = """
 [A] Topic Activity Summary
 [R] Read Public Board
 [P] Post New Message
+[S] Search: S <words>
 [M] Back to Main Menu
 
 ----------------------------------"""
@@ -91,69 +106,181 @@ TOPIC_NAMES = {
     'H': 'Help Desk'
 }
 
+# Longest message body a draft may collect before 'END' (characters)
+MAX_DRAFT_CHARS = 2000
+
 # --- GLOBAL USER STATE TRACKING (THE MEMORY) ---
-USER_STATES = {}
+# Bounded: idle sessions expire and the least recently active one is evicted at capacity.
+# Blackjack chips are not lost with a session: every settled hand is in games.CHIP_BANK.
+
+def _on_session_evicted(node_id, session, reason):
+    """Cleans up an evicted session: discards any draft post and parked MORE packets, pays out an open poker hand."""
+    if session.get('body_chunks'):
+        print(f"INFO: Discarded unfinished post draft of {node_id} ({reason} session eviction).")
+    if games.settle_open_hand(node_id, session):
+        print(f"INFO: Settled the open video poker hand of {node_id} ({reason} session eviction).")
+    discard_more_packets(node_id, session)
+    print(f"INFO: Session for {node_id} evicted ({reason}).")
+
+USER_STATES = SessionStore(on_evict=_on_session_evicted)
+
 
+# Rendered subject-list pages, message views and their packet lists.
+# Pages of a topic are invalidated by every new post to that topic.
+page_cache = RenderCache()
+
+def attach_data_handler(handler):
+    """Makes handler the active message store and hooks the render cache to its posts."""
+    global bbs_data_handler
+    bbs_data_handler = handler
+    handler.add_post_listener(page_cache.on_post)
+    return handler
 
 # Initialize the BBS Data Handler globally
-bbs_data_handler = BBSData(page_size=4)
+bbs_data_handler = attach_data_handler(BBSData(page_size=4))
+
+# Outbound queue: replies are sent from a background thread, round-robin between nodes
+outbound_scheduler = SendScheduler(pacing_delay=2.5)
+
+# Inbound packets are handled on a worker pool: one node's packets stay in arrival order,
+# different nodes run in parallel. main() resizes it from --workers.
+packet_workers = KeyedWorkerPool(max_workers=DEFAULT_WORKERS)
+
+# Set by --record-trace: every received text packet is written out for mesh_simulator.py
+trace_recorder = None
+
+# Node IDs allowed to use sysop commands such as STATS (--sysop)
+SYSOP_IDS = set()
+
+# Rebroadcast and retried copies of a packet are recognised by (packet id, sender) and never
+# handled twice. With --resend-duplicates the cached reply is sent again instead of ignored.
+dedupe_cache = DedupeCache()
+RESEND_DUPLICATES = False
+
+# Per-node and global command / airtime budgets, checked before a command is handled.
+# A throttled node gets one short warning (unless --quiet-throttle), then silence. Sysops are exempt.
+rate_limiter = RateLimiter()
+THROTTLE_REPLY = True
+SLOW_DOWN_MESSAGE = "Slow down! Too many requests. Try again in {wait}s."
+
+# Paged delivery (--more-pages K): a reply longer than K packets sends the first K and parks
+# the rest in the session until the user sends MORE. Any other command drops them. 0 = off.
+MORE_PAGE_PACKETS = 0
+MORE_PROMPT = "\n[MORE] {left} left"
+MORE_PROMPT_RESERVE = payload_bytes(MORE_PROMPT.format(left=9999))   # Room kept in every paged packet
+
+
+# --- METRICS ---
+# Exported with --metrics-port (Prometheus text) or --metrics-file (JSON), and summarised by STATS.
+METRICS = MetricsRegistry()
+command_seconds = METRICS.histogram('command_seconds', "Command handler latency in seconds.", ('command',))
+packets_sent = METRICS.counter('packets_sent_total', "Reply packets handed to the radio.", ('dest',))
+bytes_sent = METRICS.counter('bytes_sent_total', "UTF-8 payload bytes of reply packets.", ('dest',))
+airtime_sent = METRICS.counter('airtime_seconds_total', f"Estimated time on air of reply packets ({DEFAULT_PRESET}).")
+storage_write_seconds = METRICS.histogram('storage_write_seconds', "post_message + save_data latency in seconds.")
+more_parked = METRICS.counter('more_parked_packets_total', "Reply packets held back for MORE (--more-pages).", ('dest',))
+more_served = METRICS.counter('more_served_packets_total', "Held-back packets sent after a MORE.", ('dest',))
+more_dropped = METRICS.counter('more_dropped_packets_total', "Held-back packets never requested.", ('dest',))
+throttled_requests = METRICS.counter('throttled_requests_total', "Commands refused by the rate limiter.", ('reason', 'action'))
+duplicate_packets = METRICS.counter('duplicate_packets_total', "Duplicate text packets not handled again.", ('action',))
+METRICS.gauge('dedupe_entries', "Packets remembered for duplicate detection.", lambda: len(dedupe_cache))
+more_airtime_saved = METRICS.counter('more_airtime_saved_seconds_total', "Estimated time on air of packets never requested.")
+METRICS.gauge('sessions', "Live user sessions.", lambda: len(USER_STATES))
+METRICS.gauge('outbound_queue_packets', "Reply packets waiting to be sent.", lambda: outbound_scheduler.pending())
+METRICS.gauge('worker_queue_packets', "Received packets queued or being handled.", lambda: packet_workers.pending())
+METRICS.gauge('pacing_sleep_seconds_total', "Time the sender spent waiting out the pacing gap.",
+              lambda: outbound_scheduler.stats['pacing_wait'], kind='counter')
+METRICS.gauge('ack_wait_seconds_total', "Time spent waiting for chunk ACKs (--ack-flow).",
+              lambda: outbound_scheduler.flow_control.stats['ack_wait_total'] if outbound_scheduler.flow_control else 0.0,
+              kind='counter')
+METRICS.gauge('ack_retransmissions_total', "Chunks retransmitted after a missing ACK (--ack-flow).",
+              lambda: (outbound_scheduler.flow_control.stats['transmissions'] - outbound_scheduler.flow_control.stats['packets'])
+              if outbound_scheduler.flow_control else 0, kind='counter')
+METRICS.gauge('preempted_sends_total', "Interactive or game packets sent ahead of waiting lower-priority packets.",
+              lambda: outbound_scheduler.stats['preempted'], kind='counter')
+METRICS.gauge('starvation_turns_total', "Sends given to a lower priority class that had been passed over too often.",
+              lambda: outbound_scheduler.stats['starvation_turns'], kind='counter')
+METRICS.gauge('demoted_replies_total', "Replies queued in a lower class behind an earlier reply to the same node.",
+              lambda: outbound_scheduler.stats['demoted'], kind='counter')
+
+def _record_sent_packet(destId, text):
+    """Send listener: per-destination packet/byte counts and estimated airtime."""
+    airtime = text_airtime(text)
+    packets_sent.inc(dest=destId)
+    bytes_sent.inc(len(text.encode('utf-8')), dest=destId)
+    airtime_sent.inc(airtime)
+    rate_limiter.charge_airtime(destId, airtime)
+
+outbound_scheduler.add_send_listener(_record_sent_packet)
 
 
 # --- HELPER FUNCTION (CRITICAL for long replies) ---
 
-def chunk_and_send(interface, destId, message, skip_headers=False):
+def split_into_chunks(message, skip_headers=False):
     """
-    Splits a message into safe 190-character chunks and sends them sequentially.
-    Includes a 2.5 second delay between chunks to prevent packet dropping.
+    Splits a message into packets of at most MAX_PAYLOAD_BYTES UTF-8 bytes and returns the
+    final packet texts, including the [i/n] headers when there is more than one packet.
     """
-    max_chunk_size = 190 
-    min_trailing_chunk_size = 10
-    
-    lines = message.split('\n')
-    current_chunk = ""
-    chunks = []
-    
-    for line in lines:
-        line_with_newline = line + "\n"
-        
-        if len(current_chunk) + len(line_with_newline) > max_chunk_size:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = line_with_newline
-        else:
-            current_chunk += line_with_newline
-            
-    if current_chunk:
-        chunks.append(current_chunk)
+    return pack_message(message, skip_headers=skip_headers)
 
-    if len(chunks) > 1:
-        last_chunk = chunks[-1]
-        
-        if len(last_chunk) <= min_trailing_chunk_size:
-            second_to_last = chunks[-2]
-            
-            if len(second_to_last) + len(last_chunk) <= max_chunk_size:
-                chunks[-2] += last_chunk
-                chunks.pop() 
 
-    total_chunks = len(chunks)
+def chunk_and_send(interface, destId, message, skip_headers=False, session=None, priority=None):
+    """
+    Splits a message into Meshtastic-sized packets and queues them for sending.
+    The outbound scheduler keeps the 2.5 second gap between transmissions, so the
+    caller (onReceive) returns immediately instead of sleeping per chunk.
+    Packet lists are cached by message text, so re-sending a cached page skips the split.
+    With paged delivery on and the user's session given, only the first page is queued.
+    Unless a priority class is given, one packet counts as interactive and more as bulk.
+    """
+    packets = _cached_packets(message, skip_headers)
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE if len(packets) == 1 else PRIORITY_BULK
+    if session is not None and MORE_PAGE_PACKETS and len(packets) > MORE_PAGE_PACKETS:
+        # Repack with room for the [MORE] prompt in whichever packet ends a page
+        packets = _cached_packets(message, skip_headers, MAX_PAYLOAD_BYTES - MORE_PROMPT_RESERVE)
+        more_parked.inc(len(packets) - MORE_PAGE_PACKETS, dest=destId)
+        return _queue_page(interface, destId, session, packets, priority)
     
-    print(f"DEBUG: Message is {len(message)} chars, final split into {total_chunks} chunks.")
-    print(f"** SENDING REPLY to {destId} ({total_chunks} Chunks) **")
+    print(f"DEBUG: Message is {len(message)} chars, final split into {len(packets)} chunks.")
+    print(f"** QUEUED REPLY to {destId} ({len(packets)} Chunks, {outbound_scheduler.pending()} already queued) **")
     
-    for i, chunk in enumerate(chunks):
-        
-        if total_chunks > 1 and not skip_headers:
-            header = f"[{i+1}/{total_chunks}] "
-            final_message = header + chunk
-        else:
-            final_message = chunk 
-
-        interface.sendText(final_message, destinationId=destId)
-        
-        time.sleep(2.5) 
-        
-    print("SUCCESS: Reply sent.")
+    outbound_scheduler.enqueue(interface, destId, packets, priority)
+    return packets
+
+def _cached_packets(message, skip_headers, limit=MAX_PAYLOAD_BYTES):
+    cache_key = ('packets', message, skip_headers, limit)
+    packets = page_cache.get(cache_key)
+    if packets is None:
+        packets = pack_message(message, limit, skip_headers=skip_headers)
+        page_cache.put(cache_key, packets)
+    return packets
+
+def _queue_page(interface, destId, session, packets, priority=PRIORITY_BULK):
+    """Queues the first page of packets, ending it with the [MORE] prompt, and parks the rest."""
+    page, rest = list(packets[:MORE_PAGE_PACKETS]), packets[MORE_PAGE_PACKETS:]
+    if rest:
+        page[-1] += MORE_PROMPT.format(left=len(rest))
+        session['more_packets'] = rest
+    print(f"** QUEUED PAGE to {destId} ({len(page)} Chunks, {len(rest)} parked for MORE) **")
+    outbound_scheduler.enqueue(interface, destId, page, priority)
+    return page
+
+def send_more_packets(interface, destId, session):
+    """Serves the next page of the packets parked in the session and returns it (None if none are parked)."""
+    parked = session.pop('more_packets', None)
+    if not parked:
+        return None
+    more_served.inc(min(len(parked), MORE_PAGE_PACKETS), dest=destId)
+    return _queue_page(interface, destId, session, parked)
+
+def discard_more_packets(destId, session):
+    """Drops the packets parked for MORE once the user has moved on, counting the airtime saved."""
+    parked = session.pop('more_packets', None)
+    if parked:
+        more_dropped.inc(len(parked), dest=destId)
+        more_airtime_saved.inc(sum(text_airtime(packet) for packet in parked))
+        print(f"INFO: Dropped {len(parked)} unrequested chunks for {destId}.")
         
 # --- COMMAND HANDLERS (Menu-Driven) ---
 
@@ -165,23 +292,38 @@ def handle_activity_summary():
     """
     Generates a summary of total message counts per topic.
     REQUEST 4: Changed menu prompt from [M] to [B].
+    Built from the live counters in bbs_data_handler.stats and cached until the next post.
     """
+    cache_key = ('summary',)
+    cached_summary = page_cache.get(cache_key)
+    if cached_summary is not None:
+        return cached_summary
+    generation = page_cache.generation(ALL_TOPICS)
+    
+    stats = bbs_data_handler.stats
     reply_lines = [
         "-=( Board Activity Summary )=-",
         "----------------------------------",
     ]
-    total_count = 0
     for topic_id, topic_name in TOPIC_NAMES.items():
-        count = len(bbs_data_handler.messages.get(topic_id, []))
-        total_count += count
+        count = stats.topics[topic_id].total
         reply_lines.append(f"[{topic_id}] {topic_name:<15}: {count:>4} msgs")
         
     reply_lines.extend([
         "----------------------------------",
-        f"Total Messages: {total_count}",
-        "[B] Back to Board "
+        f"Total Messages: {stats.total}",
     ])
-    return "\n".join(reply_lines)
+    if stats.newest:
+        topic_id, msg = stats.newest
+        reply_lines.append(f"Newest: [{topic_id} {msg['id']}] {msg['subject'][:20]} ({msg['user_id'][-4:]})")
+    if stats.most_active:
+        poster = stats.posters[stats.most_active]
+        reply_lines.append(f"Most Active: {stats.most_active[-4:]} ({poster.total} msgs, {poster.posts_per_day():.1f}/day)")
+    reply_lines.append("[B] Back to Board ")
+    
+    summary = "\n".join(reply_lines)
+    page_cache.put(cache_key, summary, topic_id=ALL_TOPICS, generation=generation)
+    return summary
 
 
 def handle_read_subject_list(fromId, topic_id, page_num=0):
@@ -192,8 +334,9 @@ def handle_read_subject_list(fromId, topic_id, page_num=0):
     if topic_id not in TOPIC_NAMES:
         return f"Invalid Topic ID '{topic_id}'. Use G, N, T, O, or H. Send R to see options."
 
-    topic_messages = bbs_data_handler.messages.get(topic_id, [])
-    total_messages = len(topic_messages)
+    # Read before the counts, so a post landing while the page is built keeps it out of the cache
+    generation = page_cache.generation(topic_id)
+    total_messages = bbs_data_handler.topic_count(topic_id)
     
     if total_messages == 0:
         topic_name = TOPIC_NAMES[topic_id]
@@ -209,9 +352,13 @@ def handle_read_subject_list(fromId, topic_id, page_num=0):
     USER_STATES[fromId]['current_page'] = page_num
     USER_STATES[fromId]['max_pages'] = max_page 
     
-    start_index = page_num * bbs_data_handler.page_size
-    end_index = start_index + bbs_data_handler.page_size
-    messages_on_page = topic_messages[start_index:end_index]
+    page_size = bbs_data_handler.page_size
+    cache_key = ('page', topic_id, page_num, page_size)
+    cached_page = page_cache.get(cache_key)
+    if cached_page is not None:
+        return cached_page
+    
+    messages_on_page = bbs_data_handler.get_page(topic_id, page_num, page_size)
     
     if not messages_on_page:
         return f"Page {page_num + 1} does not exist. Max page is {int(max_page)}.\n\n{READ_TOPIC_MENU_ASCII}"
@@ -221,9 +368,9 @@ def handle_read_subject_list(fromId, topic_id, page_num=0):
         "------------------",
     ]
     
-    for i, msg in enumerate(messages_on_page):
-        message_number = start_index + i + 1
-        reply_lines.append(f"[{message_number}] {msg['subject'][:25]} ({msg['user_id'][-4:]})")
+    # Messages are listed by their permanent ID, so the number stays valid after new posts
+    for msg in messages_on_page:
+        reply_lines.append(f"[{msg['id']}] {msg['subject'][:25]} ({msg['user_id'][-4:]})")
         
     has_next_page = (page_num + 1) < max_page
     
@@ -235,25 +382,63 @@ def handle_read_subject_list(fromId, topic_id, page_num=0):
     reply_lines.append(f"[B] Board Menu") 
     reply_lines.append("------------------")
         
+    page_text = "\n".join(reply_lines)
+    page_cache.put(cache_key, page_text, topic_id=topic_id, generation=generation)
+    return page_text
+
+
+def handle_search_results(fromId, page_num=0):
+    """
+    Shows one page of the user's last search. Hits are ranked by BBSData.search and kept
+    in the session as (topic, id) pairs, so paging never re-runs the query.
+    """
+    state = USER_STATES[fromId]
+    query = state.get('search_query', '')
+    hits = state.get('search_hits') or []
+    page_size = bbs_data_handler.page_size
+    max_page = ceil(len(hits) / page_size)
+    
+    if not hits:
+        return f"No posts match '{query[:30]}'.\nTry other words, or [B] Board Menu."
+    
+    state['current_page'] = page_num
+    state['max_pages'] = max_page
+    
+    reply_lines = [
+        f"*Search '{query[:20]}' - Page {page_num + 1}/{max_page}*",
+        "------------------",
+    ]
+    for topic_id, msg_id in hits[page_num * page_size:(page_num + 1) * page_size]:
+        msg = bbs_data_handler.get_message(topic_id, msg_id)
+        if msg:
+            reply_lines.append(f"[{msg_id}] {topic_id}: {msg['subject'][:22]} ({msg['user_id'][-4:]})")
+    
+    if (page_num + 1) < max_page:
+        reply_lines.append(f"[N] Next Page")
+    reply_lines.append(f"[B] Board Menu")
+    reply_lines.append("------------------")
     return "\n".join(reply_lines)
 
 
-def handle_read_full_message(topic_id, msg_index):
+def handle_read_full_message(topic_id, msg_id):
     """
-    Retrieves and formats the full body of a message.
+    Retrieves and formats the full body of a message, looked up by its message ID.
+    Messages never change after posting, so the rendered view is cached without a topic tag.
     """
-    topic_messages = bbs_data_handler.messages.get(topic_id, [])
-    list_index = msg_index - 1
+    cache_key = ('msg', topic_id, msg_id)
+    cached_view = page_cache.get(cache_key)
+    if cached_view is not None:
+        return cached_view
     
-    if list_index < 0 or list_index >= len(topic_messages):
-        return f"Invalid message number {msg_index} in Topic {topic_id}."
-        
-    msg = topic_messages[list_index]
+    msg = bbs_data_handler.get_message(topic_id, msg_id)
+    
+    if msg is None:
+        return f"Invalid message number {msg_id} in Topic {topic_id}."
     
     timestamp = time.strftime("%d/%b %I:%M%p", time.localtime(msg['timestamp']))
     
     full_body_content = (
-        f"--- Msg {msg_index} in {TOPIC_NAMES[topic_id]} ---\n"
+        f"--- Msg {msg_id} in {TOPIC_NAMES[topic_id]} ---\n"
         f"From: {msg['user_id'][-4:]}\n"
         f"Date: {timestamp}\n"
         f"Subject: {msg['subject'][:28]}\n"
@@ -263,6 +448,7 @@ def handle_read_full_message(topic_id, msg_index):
         f"[B] Board Menu"
     )
     
+    page_cache.put(cache_key, full_body_content)
     return full_body_content
 
 
@@ -302,12 +488,23 @@ def handle_post_body_collect(fromId, text):
     if text.upper().strip() == "END":
         return handle_post_body_final(fromId)
 
-    if text.strip():
-        state['body_chunks'].append(text.strip())
+    chunk = text.strip()
+    body_chunks = state['body_chunks']
+    # Length of the body as it will be stitched ("\n\n" between chunks)
+    current_body_length = sum(len(c) for c in body_chunks) + 2 * max(len(body_chunks) - 1, 0)
     
-    collected_chunk_number = len(state['body_chunks']) 
+    if chunk:
+        added_length = len(chunk) + (2 if body_chunks else 0)
+        if current_body_length + added_length > MAX_DRAFT_CHARS:
+            return (
+                f"Body limit is {MAX_DRAFT_CHARS} chars; that chunk was not added ({current_body_length} chars so far).\n"
+                f"Send 'END' to post, or [B] to cancel."
+            )
+        body_chunks.append(chunk)
+        current_body_length += added_length
+    
+    collected_chunk_number = len(body_chunks) 
     next_chunk_number = collected_chunk_number + 1
-    current_body_length = len("\n\n".join(state['body_chunks']))
 
     return (
         f"Chunk {collected_chunk_number} collected ({current_body_length} chars).\n"
@@ -331,9 +528,15 @@ def handle_post_body_final(fromId):
     topic_id = state.get('topic')
     subject = state.get('subject', 'No Subject')
     
-    bbs_data_handler.user_id = fromId
-    bbs_data_handler.post_message(topic_id, subject, full_body)
-    bbs_data_handler.save_data()
+    # Authorship travels with the call; posts from other nodes may be running concurrently
+    with storage_write_seconds.time():
+        posted = bbs_data_handler.post_message(topic_id, subject, full_body, user_id=fromId)
+        if posted is not None:
+            bbs_data_handler.save_data()
+    
+    if posted is None:
+        # Nothing was stored; keep the draft so the user can retry
+        return "ERROR: Your post could not be saved. Send 'END' to try again, or [B] to cancel."
     
     if 'state' in state: del state['state'] 
     if 'body_chunks' in state: del state['body_chunks']
@@ -344,237 +547,527 @@ def handle_post_body_final(fromId):
     return f"SUCCESS: Posted '{subject}' to '{TOPIC_NAMES[topic_id]}'.\n\nSend [B] for Board Menu."
 
 
-# --- MESHTASTIC RECEIVE LISTENER (The Command Router) ---
+# --- COMMAND ROUTING (Table-Driven Dispatcher) ---
+#
+# Every packet is resolved with a handful of dict lookups instead of walking an if/elif chain.
+# Lookup order (first match wins):
+#   1. Interactive state handlers (posting, games), keyed by exact state or state family prefix.
+#   2. PRIORITY_COMMANDS, which work from any menu (X always logs off).
+#   3. COMMAND_ROUTES[(last_menu, command)]: commands that mean something only in one menu.
+#   4. MENU_FALLBACKS[last_menu]: catch-all for a menu (e.g. invalid input in the Games Center).
+#   5. A bare number reads that message ID in the last topic viewed.
+#   6. GLOBAL_COMMANDS[command]: commands that work from every other menu.
+#   7. Anything else (or a handler returning None) gets the Main Menu.
+# Handlers take a CommandRequest and return the reply text (or None to fall through to 7).
+
+class CommandRequest:
+    """One incoming text packet, as seen by a command handler."""
+    __slots__ = ('fromId', 'text', 'command_input', 'words', 'command', 'state_data',
+                 'needs_chunking', 'skip_headers')
+
+    def __init__(self, fromId, text, state_data):
+        self.fromId = fromId
+        self.text = text
+        self.command_input = text.upper().strip()
+        self.words = self.command_input.split()
+        self.command = self.words[0] if self.words else ""
+        self.state_data = state_data
+        self.needs_chunking = False
+        self.skip_headers = False
+
+
+STATE_HANDLERS = {}      # {state or 'family_' prefix: (handler, handles_exit_commands)}
+PRIORITY_COMMANDS = {}   # {command: handler}
+COMMAND_ROUTES = {}      # {(last_menu, command): handler}
+MENU_FALLBACKS = {}      # {last_menu: handler}
+GLOBAL_COMMANDS = {}     # {command: handler}
+
+# Commands that break out of an interactive state (unless the state handles them itself)
+EXIT_COMMANDS = ('M', 'X', 'B', 'Q')
+
+
+def register_state_handler(state, handler, handles_exit_commands=False):
+    """
+    Routes all input from users in `state` to handler. A state ending in '_' registers a
+    whole family (e.g. 'game_blackjack_'). Games set handles_exit_commands so M/Q/B/X
+    reach the game instead of the generic interactive-mode exit.
+    """
+    STATE_HANDLERS[state] = (handler, handles_exit_commands)
 
-def onReceive(packet, interface):
-    """Called by the Meshtastic library when a message is received."""
 
-    if packet.get('decoded', {}).get('portnum') != 'TEXT_MESSAGE_APP':
-        return
+def register_command(menu, command, handler):
+    """Routes `command` to handler while the user's last_menu is `menu` (None = from any menu)."""
+    if menu is None:
+        GLOBAL_COMMANDS[command] = handler
+    else:
+        COMMAND_ROUTES[(menu, command)] = handler
 
-    fromId = packet.get('fromId', 'Unknown')
-    text = packet['decoded']['text']
-    
-    print(f"\n{'='*40}")
-    print(f"** RECEIVED MESSAGE **")
-    print(f"From: {fromId}")
-    print(f"Text: \"{text}\"")
-    print(f"{'='*40}")
 
-    command_input = text.upper().strip()
-    words = command_input.split()
-    
-    reply_message = None
-    needs_chunking = False
-    skip_headers = False
-    command = words[0] if words else ""
-    
-    if fromId not in USER_STATES:
-        USER_STATES[fromId] = {'first_contact': True, 'last_menu': 'MAIN', 'reset_next': False} 
-    
-    state_data = USER_STATES[fromId]
-    current_state = state_data.get('state')
+def register_menu_fallback(menu, handler):
+    """Handles every command in `menu` that has no route of its own."""
+    MENU_FALLBACKS[menu] = handler
+
+
+def _find_state_handler(state):
+    entry = STATE_HANDLERS.get(state)
+    if entry is None:
+        entry = STATE_HANDLERS.get(state[:state.rfind('_') + 1])
+    return entry
+
+
+def dispatch_command(req):
+    """Resolves and runs the handler for one request. Returns the reply text."""
+    state_data = req.state_data
     
     # --- STAGE 1 (UNIVERSAL WAKE UP / POST-LOGOFF CHECK) ---
     if state_data.pop('first_contact', False) or state_data.pop('reset_next', False):
-        reply_message = MAIN_MENU_ASCII
         state_data['last_menu'] = 'MAIN'
-        
+        return MAIN_MENU_ASCII
+    
     # --- STAGE 2 (NORMAL COMMAND ROUTING) ---
+    reply_message = None
+    current_state = state_data.get('state')
+    
+    if current_state:
+        # Interactive mode has priority over menu navigation
+        entry = _find_state_handler(current_state)
+        if entry and entry[1]:
+            reply_message = entry[0](req)
+        elif req.command in EXIT_COMMANDS:
+            reply_message = handle_exit_interactive(req)
+        elif entry:
+            reply_message = entry[0](req)
     else:
-        # --- 0. CHECK USER STATE (INTERACTIVE MODE PRIORITY) ---
-        if current_state:
-            state = current_state
-            
-            # --- NEW: Check for Game States (PRIORITY) ---
-            if state.startswith('game_blackjack_') or state.startswith('game_minesweeper_'):
-                reply_message = games.handle_game_command(fromId, command_input, USER_STATES, games.GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
-                needs_chunking = True
-            # --- END NEW GAME CHECK ---
-            
-            # Allow user to break out of interactive mode (if not a game command)
-            if reply_message is None and command in ("M", "X", "B", "Q"):
-                
-                # Clear all interactive state data
-                if 'state' in state_data: del state_data['state']
-                if 'body_chunks' in state_data: del state_data['body_chunks']
-                if 'topic' in state_data: del state_data['topic']
-                if 'subject' in state_data: del state_data['subject']
-                if 'game_data' in state_data: del state_data['game_data'] # Clear any remaining game data
-                
-                if command == "X":
-                    reply_message = LOGOFF_ASCII
-                    state_data['last_menu'] = 'MAIN'
-                    state_data['reset_next'] = True
-                elif command == "B":
-                    # B in interactive mode (like POST/READ_TOPIC) goes to BBS menu
-                    reply_message = BBS_SECTION_MENU_ASCII
-                    state_data['last_menu'] = 'BBS'
-                
-                # Q and M for Games Context
-                elif command in ('Q', 'M') and state_data.get('last_menu') == 'GAMES':
-                    if command == 'Q':
-                        reply_message = games.GAMES_MENU_ASCII
-                        state_data['last_menu'] = 'GAMES'
-                    else:
-                        reply_message = MAIN_MENU_ASCII
-                        state_data['last_menu'] = 'MAIN'
-                        
-                else:
-                    reply_message = MAIN_MENU_ASCII
-                    state_data['last_menu'] = 'MAIN'
-                
-                print(f"INFO: User {fromId} exited interactive mode with '{command}'.")
-            
-            elif reply_message is None:
-                if state == 'posting_topic':
-                    reply_message = handle_post_topic_select(fromId, command_input)
-                elif state == 'posting_subject':
-                    reply_message = handle_post_subject(fromId, text)
-                elif state == 'posting_body_collect':
-                    reply_message = handle_post_body_collect(fromId, text)
-        
-        # --- SPECIAL HANDLING FOR X COMMAND (Not in Interactive Mode) ---
-        elif command == "X":
-            if 'last_topic' in state_data: del state_data['last_topic']
-            state_data['last_menu'] = 'MAIN'
-            state_data['reset_next'] = True
-            reply_message = LOGOFF_ASCII
-            
-        # --- 1. CONTEXTUAL COMMAND HANDLING (N/T for Paging/Navigation) ---
-        
-        elif state_data.get('last_menu') == 'READ_SUBJECT' and command == 'T':
-            reply_message = handle_read_topic_menu()
-            state_data['last_menu'] = 'READ_TOPIC'
-        
-        elif state_data.get('last_menu') == 'READ_SUBJECT' and command == 'N':
-            last_topic = state_data.get('last_topic')
-            current_page = state_data.get('current_page', 0)
-            max_pages = state_data.get('max_pages', 0)
-            next_page = current_page + 1
-            
-            if last_topic and (next_page < max_pages):
-                reply_message = handle_read_subject_list(fromId, last_topic, next_page)
-                needs_chunking = True
-                state_data['last_menu'] = 'READ_SUBJECT'
-            else:
-                reply_message = "No next page available."
-        
-        # Case B: User is in the MAIN menu context and sends 'G'
-        elif state_data.get('last_menu') == 'MAIN' and command == 'G':
-            reply_message = games.GAMES_MENU_ASCII
-            state_data['last_menu'] = 'GAMES'
-        
-        # --- NEW: Handle Game Selections from the GAMES Menu ---
-        elif state_data.get('last_menu') == 'GAMES':
-            if command == 'B':
-                reply_message = games.start_blackjack(fromId, USER_STATES, games.GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
-                needs_chunking = True
-            elif command == 'W':
-                reply_message = games.start_minesweeper(fromId, USER_STATES)
-                needs_chunking = True
-            elif command == 'M':
-                reply_message = MAIN_MENU_ASCII
-                state_data['last_menu'] = 'MAIN'
+        command = req.command
+        last_menu = state_data.get('last_menu')
+        handler = (PRIORITY_COMMANDS.get(command)
+                   or COMMAND_ROUTES.get((last_menu, command))
+                   or MENU_FALLBACKS.get(last_menu))
+        if handler is None:
+            if command.isdigit() and len(req.words) == 1:
+                handler = handle_number_read
             else:
-                reply_message = f"Invalid command in Games Center. Select a game or [M] Back to Main Menu."
-                reply_message += "\n\n" + games.GAMES_MENU_ASCII
-                state_data['last_menu'] = 'GAMES'
-        # --- END NEW GAME SELECTION HANDLING ---
-
-        # Case C: Single Number Read
-        elif command.isdigit() and len(words) == 1:
-            msg_num = int(command)
-            last_topic = state_data.get('last_topic') 
-            
-            if last_topic:
-                reply_message = handle_read_full_message(last_topic, msg_num)
-                needs_chunking = True 
-            else:
-                reply_message = f"** COMMAND '{command}' **\nTo read a message, first send R [Topic] or B for the menu."
-                
-        # --- 2. MAJOR MENU NAVIGATION (B now handles BBS menu navigation) ---
-        
-        elif command == "R":
-            if len(words) == 1:
-                reply_message = handle_read_topic_menu()
-                state_data['last_menu'] = 'READ_TOPIC'
-            
-            elif len(words) >= 2 and words[1] in TOPIC_NAMES:
-                topic_id = words[1]
-                total_messages = len(bbs_data_handler.messages.get(topic_id, []))
-                
-                page_or_msg_num = 0
-                if len(words) == 3:
-                    try:
-                        page_or_msg_num = int(words[2])
-                    except ValueError:
-                        reply_message = "Invalid page/message number. Example: R G 2 or R G 5"
-                
-                if reply_message is None:
-                    if page_or_msg_num >= 1 and page_or_msg_num <= total_messages: 
-                        reply_message = handle_read_full_message(topic_id, page_or_msg_num)
-                        needs_chunking = True
-                    else:
-                        page_num = page_or_msg_num - 1 if page_or_msg_num > 0 else 0
-                        reply_message = handle_read_subject_list(fromId, topic_id, page_num)  
-                        needs_chunking = True
-                        state_data['last_menu'] = 'READ_SUBJECT'
-            else:
-                reply_message = "Invalid READ command format or topic ID. Showing topic selection."
-                reply_message += "\n\n" + READ_TOPIC_MENU_ASCII
-                state_data['last_menu'] = 'READ_TOPIC'
+                handler = GLOBAL_COMMANDS.get(command)
+        if handler is not None:
+            reply_message = handler(req)
+    
+    # --- Default Fallback ---
+    if reply_message is None:
+        print(f"** COMMAND '{req.command_input}' UNRECOGNIZED. Sending Main Menu **")
+        reply_message = MAIN_MENU_ASCII
+        state_data['last_menu'] = 'MAIN'
+    return reply_message
 
-        elif command in ("P", "POST"):
-            reply_message = handle_post_start(fromId)
-            state_data['last_menu'] = 'BBS'
-            
-        elif command == "B":
-            # B now handles returning to the BBS section menu (Message Board)
-            reply_message = BBS_SECTION_MENU_ASCII
-            state_data['last_menu'] = 'BBS'
-        
-        elif command == "A":
-            # A returns the Activity Summary, which now contains the [B] prompt
-            reply_message = handle_activity_summary()
-            needs_chunking = True
-            state_data['last_menu'] = 'BBS'
 
-        elif command == "M":
+# --- ROUTE HANDLERS ---
+
+def handle_exit_interactive(req):
+    """Breaks out of an interactive (non-game) state with M, X, B or Q."""
+    state_data = req.state_data
+    command = req.command
+    
+    # Clear all interactive state data (an open poker hand is paid out first)
+    games.settle_open_hand(req.fromId, state_data)
+    if 'state' in state_data: del state_data['state']
+    if 'body_chunks' in state_data: del state_data['body_chunks']
+    if 'topic' in state_data: del state_data['topic']
+    if 'subject' in state_data: del state_data['subject']
+    if 'game_data' in state_data: del state_data['game_data'] # Clear any remaining game data
+    
+    if command == "X":
+        reply_message = LOGOFF_ASCII
+        state_data['last_menu'] = 'MAIN'
+        state_data['reset_next'] = True
+    elif command == "B":
+        # B in interactive mode (like POST/READ_TOPIC) goes to BBS menu
+        reply_message = BBS_SECTION_MENU_ASCII
+        state_data['last_menu'] = 'BBS'
+    
+    # Q and M for Games Context
+    elif command in ('Q', 'M') and state_data.get('last_menu') == 'GAMES':
+        if command == 'Q':
+            reply_message = games.GAMES_MENU_ASCII
+            state_data['last_menu'] = 'GAMES'
+        else:
             reply_message = MAIN_MENU_ASCII
             state_data['last_menu'] = 'MAIN'
             
-        # --- 3. Single-Letter Topic Selection ---
-        
-        elif command in TOPIC_NAMES and len(words) == 1:
-            is_nav_command = (state_data.get('last_menu') == 'READ_SUBJECT' and command in ('N', 'T'))
-            
-            if not is_nav_command and state_data.get('last_menu') in ('READ_TOPIC', 'READ_SUBJECT', 'BBS'):
-                reply_message = handle_read_subject_list(fromId, command, 0)  
-                
-                if READ_TOPIC_MENU_ASCII.strip() in reply_message and "Topic" in reply_message and "is empty" in reply_message:
-                    skip_headers = True 
-                
-                needs_chunking = True
-                state_data['last_menu'] = 'READ_SUBJECT'
-            else:
-                reply_message = None
+    else:
+        reply_message = MAIN_MENU_ASCII
+        state_data['last_menu'] = 'MAIN'
+    
+    print(f"INFO: User {req.fromId} exited interactive mode with '{command}'.")
+    return reply_message
+
+def handle_game_state(req):
+    req.needs_chunking = True
+    return games.handle_game_command(req.fromId, req.command_input, USER_STATES, games.GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
+
+def handle_logoff(req):
+    state_data = req.state_data
+    games.settle_open_hand(req.fromId, state_data)
+    if 'last_topic' in state_data: del state_data['last_topic']
+    state_data['last_menu'] = 'MAIN'
+    state_data['reset_next'] = True
+    return LOGOFF_ASCII
+
+def handle_back_to_topics(req):
+    req.state_data['last_menu'] = 'READ_TOPIC'
+    return handle_read_topic_menu()
+
+def handle_next_page(req):
+    state_data = req.state_data
+    last_topic = state_data.get('last_topic')
+    current_page = state_data.get('current_page', 0)
+    max_pages = state_data.get('max_pages', 0)
+    next_page = current_page + 1
+    
+    if last_topic and (next_page < max_pages):
+        req.needs_chunking = True
+        state_data['last_menu'] = 'READ_SUBJECT'
+        return handle_read_subject_list(req.fromId, last_topic, next_page)
+    return "No next page available."
+
+def handle_games_menu(req):
+    req.state_data['last_menu'] = 'GAMES'
+    return games.GAMES_MENU_ASCII
+
+def handle_start_blackjack(req):
+    req.needs_chunking = True
+    return games.start_blackjack(req.fromId, USER_STATES, games.GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
+
+def handle_start_video_poker(req):
+    req.needs_chunking = True
+    return games.start_video_poker(req.fromId, USER_STATES, games.GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
+
+def handle_start_minesweeper(req):
+    req.needs_chunking = True
+    return games.start_minesweeper(req.fromId, USER_STATES)
+
+def handle_leaderboard(req):
+    req.state_data['last_menu'] = 'GAMES'
+    return games.format_leaderboard(req.fromId) + "\n\n[M] Main Menu, or pick a game from [G]ames"
+
+def handle_games_invalid(req):
+    req.state_data['last_menu'] = 'GAMES'
+    return (f"Invalid command in Games Center. Select a game or [M] Back to Main Menu."
+            + "\n\n" + games.GAMES_MENU_ASCII)
+
+def handle_number_read(req):
+    """Case C: Single Number Read (message ID in the last topic viewed, or in the last search)."""
+    if req.state_data.get('last_menu') == 'SEARCH':
+        msg_id = int(req.command)
+        for topic_id, hit_id in req.state_data.get('search_hits') or ():
+            if hit_id == msg_id:
+                req.needs_chunking = True
+                return handle_read_full_message(topic_id, msg_id)
+    last_topic = req.state_data.get('last_topic') 
+    if last_topic:
+        req.needs_chunking = True 
+        return handle_read_full_message(last_topic, int(req.command))
+    return f"** COMMAND '{req.command}' **\nTo read a message, first send R [Topic] or B for the menu."
+
+def handle_read_command(req):
+    words = req.words
+    state_data = req.state_data
+    
+    if len(words) == 1:
+        state_data['last_menu'] = 'READ_TOPIC'
+        return handle_read_topic_menu()
+    
+    if words[1] not in TOPIC_NAMES:
+        state_data['last_menu'] = 'READ_TOPIC'
+        return ("Invalid READ command format or topic ID. Showing topic selection."
+                + "\n\n" + READ_TOPIC_MENU_ASCII)
+    
+    topic_id = words[1]
+    page_or_msg_num = 0
+    if len(words) == 3:
+        try:
+            page_or_msg_num = int(words[2])
+        except ValueError:
+            return "Invalid page/message number. Example: R G 2 or R G 5"
+    
+    req.needs_chunking = True
+    # A number matching a message ID in this topic reads it; anything else is a page
+    if page_or_msg_num >= 1 and bbs_data_handler.get_message(topic_id, page_or_msg_num): 
+        return handle_read_full_message(topic_id, page_or_msg_num)
+    page_num = page_or_msg_num - 1 if page_or_msg_num > 0 else 0
+    state_data['last_menu'] = 'READ_SUBJECT'
+    return handle_read_subject_list(req.fromId, topic_id, page_num)
+
+def handle_search_command(req):
+    """S <words>: ranked full-text search over subjects and bodies."""
+    state_data = req.state_data
+    query = req.text.strip()[len(req.command):].strip()
+    if not query:
+        state_data['last_menu'] = 'BBS'
+        return "Search the board: send S followed by words, e.g. S antenna range"
+    
+    state_data['search_query'] = query
+    state_data['search_hits'] = bbs_data_handler.search(query)
+    state_data['last_menu'] = 'SEARCH'
+    req.needs_chunking = True
+    return handle_search_results(req.fromId, 0)
+
+def handle_search_next_page(req):
+    next_page = req.state_data.get('current_page', 0) + 1
+    if next_page < req.state_data.get('max_pages', 0):
+        req.needs_chunking = True
+        return handle_search_results(req.fromId, next_page)
+    return "No next page available."
+
+def handle_stats_command(req):
+    """STATS (sysops only): a one-screen summary of the metrics. Anyone else gets the Main Menu."""
+    if req.fromId.lower() not in SYSOP_IDS:
+        return None
+    req.needs_chunking = True
+    return format_stats()
+
+def handle_limit_command(req):
+    """
+    LIMIT (sysops only): shows the rate limits. LIMIT <NAME> <N> changes one (0 = off),
+    LIMIT REPLY ON|OFF switches the slow-down warning. Anyone else gets the Main Menu.
+    """
+    global THROTTLE_REPLY
+    if req.fromId.lower() not in SYSOP_IDS:
+        return None
+    words = req.words
+    if len(words) == 3 and words[1] == 'REPLY' and words[2] in ('ON', 'OFF'):
+        THROTTLE_REPLY = words[2] == 'ON'
+    elif len(words) == 3 and words[1] in LIMIT_SETTINGS:
+        try:
+            rate_limiter.set_limit(words[1], float(words[2]))
+        except ValueError:
+            return "Usage: LIMIT <NAME> <N> (N >= 0, 0 = off)"
+        print(f"INFO: {req.fromId} set rate limit {words[1]} to {words[2]}.")
+    elif len(words) != 1:
+        return "Usage: LIMIT, LIMIT <NAME> <N> or LIMIT REPLY ON|OFF"
+    
+    req.needs_chunking = True
+    lines = ["-=( RATE LIMITS )=-"]
+    for name, value in rate_limiter.limits().items():
+        unit = LIMIT_SETTINGS[name][1]
+        lines.append(f"{name} {value:g}{unit}" if value else f"{name} off")
+    lines.append(f"REPLY {'ON' if THROTTLE_REPLY else 'OFF'}")
+    lines.append(f"Throttled: {throttled_requests.total()}")
+    lines.append("LIMIT <NAME> <N> to change")
+    return "\n".join(lines)
+
+def format_stats():
+    uptime = time.time() - METRICS.started
+    latency_p50 = command_seconds.quantile(0.5)
+    latency_p95 = command_seconds.quantile(0.95)
+    write_p50 = storage_write_seconds.quantile(0.5)
+    write_p95 = storage_write_seconds.quantile(0.95)
+    ms = lambda seconds: "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+    airtime = airtime_sent.total()
+    skipped = sorted(more_dropped.snapshot(), key=lambda row: row['value'], reverse=True)[:3]
+    top_skippers = ", ".join(f"{row['labels']['dest'][-4:]} {row['value']}" for row in skipped)
+    return "\n".join([
+        "-=( BBS STATS )=-",
+        f"Up {int(uptime // 3600)}h{int(uptime % 3600 // 60):02d}m, {len(USER_STATES)} sessions",
+        f"Cmds {command_seconds.count()}, p50 {ms(latency_p50)} p95 {ms(latency_p95)}",
+        f"Sent {packets_sent.total()} pkts, {bytes_sent.total() // 1024}KB",
+        f"Airtime ~{airtime:.0f}s ({airtime / max(uptime, 1):.1%} of uptime)",
+        f"Pacing sleep {outbound_scheduler.stats['pacing_wait']:.0f}s",
+        f"Queues: out {outbound_scheduler.pending()}, in {packet_workers.pending()}",
+        f"Store write p50 {ms(write_p50)} p95 {ms(write_p95)}",
+        f"Dupes: {dedupe_cache.stats['duplicates']} of {dedupe_cache.stats['packets']} pkts, "
+        f"throttled {throttled_requests.total()}",
+        f"MORE: {more_served.total()}/{more_parked.total()} pkts asked, "
+        f"{more_dropped.total()} skipped (~{more_airtime_saved.total():.0f}s air)",
+    ] + ([f"Most skipped: {top_skippers}"] if top_skippers else []))
+
+def handle_post_command(req):
+    req.state_data['last_menu'] = 'BBS'
+    return handle_post_start(req.fromId)
+
+def handle_bbs_menu(req):
+    # B now handles returning to the BBS section menu (Message Board)
+    req.state_data['last_menu'] = 'BBS'
+    return BBS_SECTION_MENU_ASCII
+
+def handle_activity_command(req):
+    # A returns the Activity Summary, which now contains the [B] prompt
+    req.needs_chunking = True
+    req.state_data['last_menu'] = 'BBS'
+    return handle_activity_summary()
+
+def handle_main_menu(req):
+    req.state_data['last_menu'] = 'MAIN'
+    return MAIN_MENU_ASCII
+
+def handle_topic_letter(req):
+    """Single-letter topic selection from the Read Topic, subject list or Board menus."""
+    if len(req.words) != 1:
+        return None
+    reply_message = handle_read_subject_list(req.fromId, req.command, 0)  
+    
+    if READ_TOPIC_MENU_ASCII.strip() in reply_message and "Topic" in reply_message and "is empty" in reply_message:
+        req.skip_headers = True 
+    
+    req.needs_chunking = True
+    req.state_data['last_menu'] = 'READ_SUBJECT'
+    return reply_message
 
-        # --- 4. Default Fallback ---
-        if reply_message is None:
-            print(f"** COMMAND '{command_input}' UNRECOGNIZED. Sending Main Menu **")
-            reply_message = MAIN_MENU_ASCII
-            state_data['last_menu'] = 'MAIN'
+
+# --- ROUTING TABLE ---
+
+register_state_handler('posting_topic', lambda req: handle_post_topic_select(req.fromId, req.command_input))
+register_state_handler('posting_subject', lambda req: handle_post_subject(req.fromId, req.text))
+register_state_handler('posting_body_collect', lambda req: handle_post_body_collect(req.fromId, req.text))
+register_state_handler('game_blackjack_', handle_game_state, handles_exit_commands=True)
+register_state_handler('game_poker_', handle_game_state, handles_exit_commands=True)
+register_state_handler('game_minesweeper_', handle_game_state, handles_exit_commands=True)
+
+PRIORITY_COMMANDS['X'] = handle_logoff
+PRIORITY_COMMANDS['STATS'] = handle_stats_command
+PRIORITY_COMMANDS['LIMIT'] = handle_limit_command
+
+register_command('READ_SUBJECT', 'T', handle_back_to_topics)
+register_command('READ_SUBJECT', 'N', handle_next_page)
+register_command('SEARCH', 'N', handle_search_next_page)
+register_command('MAIN', 'G', handle_games_menu)
+
+register_command('GAMES', 'B', handle_start_blackjack)
+register_command('GAMES', 'V', handle_start_video_poker)
+register_command('GAMES', 'W', handle_start_minesweeper)
+register_command('GAMES', 'L', handle_leaderboard)
+register_command('GAMES', 'M', handle_main_menu)
+register_menu_fallback('GAMES', handle_games_invalid)
+
+register_command(None, 'R', handle_read_command)
+register_command(None, 'P', handle_post_command)
+register_command(None, 'POST', handle_post_command)
+register_command(None, 'B', handle_bbs_menu)
+register_command(None, 'A', handle_activity_command)
+register_command(None, 'S', handle_search_command)
+register_command(None, 'M', handle_main_menu)
+
+for _menu in ('READ_TOPIC', 'READ_SUBJECT', 'BBS', 'SEARCH'):
+    for _topic_id in TOPIC_NAMES:
+        # setdefault keeps the READ_SUBJECT paging routes for N and T
+        COMMAND_ROUTES.setdefault((_menu, _topic_id), handle_topic_letter)
+
+
+# --- MESHTASTIC RECEIVE LISTENER ---
+
+def onReceive(packet, interface):
+    """
+    Called by the Meshtastic library when a message is received. Text packets are handed
+    to the worker pool, keyed by sender, so the pubsub thread never waits on a handler.
+    """
+
+    portnum = packet.get('decoded', {}).get('portnum')
+    
+    # Routing ACK/NAKs confirm our own outbound chunks when ACK flow control is enabled
+    if portnum == 'ROUTING_APP' and outbound_scheduler.flow_control:
+        outbound_scheduler.flow_control.on_routing_packet(packet)
+        return
+
+    if portnum != 'TEXT_MESSAGE_APP':
+        return
+
+    fromId = packet.get('fromId', 'Unknown')
+    packet_id = packet.get('id')
+    if packet_id and not dedupe_cache.claim(packet_id, fromId):
+        if RESEND_DUPLICATES:
+            # Queued behind the original, so its reply is cached by the time this runs
+            packet_workers.submit(fromId, handle_duplicate, packet_id, fromId, interface)
+        else:
+            duplicate_packets.inc(action='ignored')
+            print(f"INFO: Ignored duplicate packet {packet_id} from {fromId}.")
+        return
+
+    if trace_recorder:
+        trace_recorder.record(fromId, packet['decoded']['text'])
+    
+    if fromId.lower() not in SYSOP_IDS:
+        refusal = rate_limiter.check(fromId)
+        if refusal:
+            reason, retry_after, first = refusal
+            warn = first and THROTTLE_REPLY
+            throttled_requests.inc(reason=reason, action='warned' if warn else 'dropped')
+            print(f"INFO: Throttled {fromId} ({reason}, next command in {retry_after:.0f}s).")
+            if warn:
+                outbound_scheduler.enqueue(interface, fromId, [SLOW_DOWN_MESSAGE.format(wait=ceil(retry_after))])
+            return
     
+    packet_workers.submit(fromId, handle_packet, packet, interface)
+
+def handle_duplicate(packet_id, fromId, interface):
+    """Sends the cached reply of a duplicated packet again, unless part of it is still waiting to go out."""
+    reply = dedupe_cache.cached_reply(packet_id, fromId)
+    if reply and not outbound_scheduler.pending(fromId):
+        duplicate_packets.inc(action='resent')
+        print(f"INFO: Duplicate packet {packet_id} from {fromId}, resending the cached reply ({len(reply)} Chunks).")
+        outbound_scheduler.enqueue(interface, fromId, reply, PRIORITY_BULK)
+    else:
+        duplicate_packets.inc(action='ignored')
+        print(f"INFO: Ignored duplicate packet {packet_id} from {fromId}.")
+
+def _command_label(req):
+    """Metrics label for a request: the interactive state family, a routed command, 'number' or 'other'."""
+    state_data = req.state_data
+    if state_data.get('first_contact') or state_data.get('reset_next'):
+        return 'wake'
+    state = state_data.get('state')
+    if state:
+        return '_'.join(state.split('_')[:2]) if state.startswith('game_') else state
+    command = req.command
+    if command.isdigit():
+        return 'number'
+    if (command in PRIORITY_COMMANDS or command in GLOBAL_COMMANDS
+            or (state_data.get('last_menu'), command) in COMMAND_ROUTES):
+        return command
+    return 'other'
+
+def handle_packet(packet, interface):
+    """Handles one text packet: routes the command and queues the reply. Runs on a worker thread."""
+    fromId = packet.get('fromId', 'Unknown')
+    text = packet['decoded']['text']
+    
+    # One print call so banners from parallel workers don't interleave
+    print(
+        f"\n{'='*40}\n"
+        f"** RECEIVED MESSAGE **\n"
+        f"From: {fromId}\n"
+        f"Text: \"{text}\"\n"
+        f"{'='*40}"
+    )
+
+    state_data = USER_STATES.touch(fromId)
+    if state_data is None:
+        state_data = USER_STATES.create(fromId, first_contact=True, last_menu='MAIN', reset_next=False)
+    
+    req = CommandRequest(fromId, text, state_data)
+    
+    # Paged delivery: MORE serves the next page of the last reply, anything else drops it
+    if 'more_packets' in state_data:
+        if req.command_input == 'MORE':
+            with command_seconds.time(command='MORE'):
+                page = send_more_packets(interface, fromId, state_data)
+            dedupe_cache.store_reply(packet.get('id'), fromId, page)
+            return
+        discard_more_packets(fromId, state_data)
+    
+    label = _command_label(req)
+    with command_seconds.time(command=label):
+        reply_message = dispatch_command(req)
     
     # --- FINAL MESSAGE SENDING LOGIC ---
     if reply_message:
-        if needs_chunking or len(reply_message) > 200: 
-            chunk_and_send(interface, fromId, reply_message, skip_headers=skip_headers)
+        # Game turns get their own class; other replies are interactive or bulk by size
+        in_game = label.startswith('game_') or state_data.get('state', '').startswith('game_')
+        if req.needs_chunking or not fits_in_packet(reply_message):
+            packets = chunk_and_send(interface, fromId, reply_message, skip_headers=req.skip_headers,
+                                     session=state_data, priority=PRIORITY_GAME if in_game else None)
         else:
-            print(f"** SENDING REPLY to {fromId} (Single Packet) **")
-            interface.sendText(reply_message, destinationId=fromId)
-            print("SUCCESS: Reply sent.")
+            print(f"** QUEUED REPLY to {fromId} (Single Packet) **")
+            packets = [reply_message]
+            outbound_scheduler.enqueue(interface, fromId, packets, PRIORITY_GAME if in_game else PRIORITY_INTERACTIVE)
+        dedupe_cache.store_reply(packet.get('id'), fromId, packets)
         
 # --- ARGPARSE SETUP ---
 def parse_args():
@@ -592,11 +1085,152 @@ def parse_args():
             "Use: python3 auto_responder.py --debug"
         )
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--storage',
+        choices=STORAGE_MODES,
+        default='json',
+        help=(
+            "Message store engine (default: json).\n"
+            "json:    rewrite bbs_messages.json after every post.\n"
+            "journal: append each post to bbs_messages.json.journal and\n"
+            "         compact it into bbs_messages.json in the background.\n"
+            "sqlite:  keep messages in bbs_messages.db and read one page at a\n"
+            "         time (imports bbs_messages.json on first use)."
+        )
+    )
+    parser.add_argument(
+        '--ack-flow',
+        action='store_true',
+        help=(
+            "Sends each chunk with an ACK request and moves on as soon as it is\n"
+            "confirmed, retransmitting with backoff on timeout, instead of the\n"
+            "fixed 2.5 second gap between chunks."
+        )
+    )
+    parser.add_argument(
+        '--data-file',
+        default=BBS_DATA_FILE,
+        help=(
+            f"Message board file (default: {BBS_DATA_FILE} in the current directory).\n"
+            f"Journal, database, search index and chip bank ({CHIP_BANK_FILE})\n"
+            "files are kept next to it."
+        )
+    )
+    parser.add_argument(
+        '--retention',
+        nargs='+',
+        default=[],
+        metavar='SPEC',
+        help=(
+            "Keeps only recent posts in memory and moves older ones to compressed\n"
+            "archive files (bbs_messages.json.archive/), still readable page by page.\n"
+            "SPEC is N (newest N posts per topic), Dd (D days) or N/Dd, optionally\n"
+            "for one topic: --retention 500/90d H:100. json and journal storage only."
+        )
+    )
+    parser.add_argument(
+        '--record-trace',
+        metavar='PATH',
+        help=(
+            "Writes every received text packet to PATH (JSON Lines) so the\n"
+            "session can be replayed offline: python3 mesh_simulator.py --trace PATH"
+        )
+    )
+    parser.add_argument(
+        '--sysop',
+        nargs='+',
+        default=[],
+        metavar='NODE_ID',
+        help="Node IDs (e.g. !a1b2c3d4) allowed to use the STATS command."
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORT',
+        help="Serves Prometheus metrics at http://127.0.0.1:PORT/metrics."
+    )
+    parser.add_argument(
+        '--metrics-file',
+        metavar='PATH',
+        help=f"Writes a JSON metrics snapshot to PATH every {DEFAULT_JSON_INTERVAL} seconds."
+    )
+    parser.add_argument(
+        '--more-pages',
+        type=int,
+        default=0,
+        metavar='K',
+        help=(
+            "Sends long replies K packets at a time; the rest follow when the user\n"
+            "sends MORE and are dropped if they send anything else. 0 (default) sends\n"
+            "every reply in full."
+        )
+    )
+    parser.add_argument(
+        '--resend-duplicates',
+        action='store_true',
+        help=(
+            "Answers a duplicated packet (mesh rebroadcast or client retry) with the\n"
+            "reply already sent for it. By default duplicates are ignored; they are\n"
+            "never handled twice either way."
+        )
+    )
+    parser.add_argument(
+        '--node-rate',
+        type=float,
+        default=DEFAULT_NODE_RATE,
+        metavar='N',
+        help=f"Commands per minute one node may send (default: {DEFAULT_NODE_RATE} = no limit; try 12)."
+    )
+    parser.add_argument(
+        '--node-airtime',
+        type=float,
+        default=DEFAULT_NODE_AIRTIME,
+        metavar='SEC',
+        help=f"Seconds per hour of reply airtime for one node (default: {DEFAULT_NODE_AIRTIME} = no limit; try 120)."
+    )
+    parser.add_argument(
+        '--global-rate',
+        type=float,
+        default=DEFAULT_GLOBAL_RATE,
+        metavar='N',
+        help=f"Commands per minute from all nodes together (default: {DEFAULT_GLOBAL_RATE} = no limit; try 120)."
+    )
+    parser.add_argument(
+        '--global-airtime',
+        type=float,
+        default=DEFAULT_GLOBAL_AIRTIME,
+        metavar='SEC',
+        help=(
+            f"Seconds per hour of reply airtime overall (default: {DEFAULT_GLOBAL_AIRTIME} = no limit;\n"
+            "360 is a 10%% duty cycle). Sysops can change all limits with LIMIT."
+        )
+    )
+    parser.add_argument(
+        '--quiet-throttle',
+        action='store_true',
+        help="Drops throttled commands silently instead of sending one slow-down warning."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=(
+            f"Threads handling incoming packets (default: {DEFAULT_WORKERS}). Packets from\n"
+            "one node are always handled in order; 0 handles everything on the\n"
+            "radio's receive thread."
+        )
+    )
+    args = parser.parse_args()
+    try:
+        args.retention = parse_retention(args.retention, TOPIC_KEYS)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 # --- MAIN INTERFACE LOOP ---
 def main():
     """Initializes the connection and starts listening."""
+    global packet_workers, trace_recorder, MORE_PAGE_PACKETS, RESEND_DUPLICATES, THROTTLE_REPLY
     args = parse_args()
 
     if args.debug:
@@ -617,10 +1251,40 @@ def main():
 
 
     interface = None
+    metrics_exporter = None
     try:
         print("\n--- Starting Meshtastic BBS Command Server ---")
         
-        bbs_data_handler.load_data() 
+        bbs_data_handler.close()
+        games.CHIP_BANK.open(os.path.join(os.path.dirname(os.path.abspath(args.data_file)), CHIP_BANK_FILE))
+        attach_data_handler(BBSData(page_size=4, data_file=args.data_file, storage=args.storage, retention=args.retention))
+        if args.workers != packet_workers.max_workers:
+            packet_workers.shutdown()
+            packet_workers = KeyedWorkerPool(max_workers=args.workers)
+        
+        SYSOP_IDS.update(node_id.lower() for node_id in args.sysop)
+        MORE_PAGE_PACKETS = max(args.more_pages, 0)
+        RESEND_DUPLICATES = args.resend_duplicates
+        THROTTLE_REPLY = not args.quiet_throttle
+        for name, value in (('NODE_RATE', args.node_rate), ('NODE_AIR', args.node_airtime),
+                            ('GLOBAL_RATE', args.global_rate), ('GLOBAL_AIR', args.global_airtime)):
+            rate_limiter.set_limit(name, value)
+        if MORE_PAGE_PACKETS:
+            print(f"INFO: Paged delivery on, {MORE_PAGE_PACKETS} packets per page.")
+        if args.metrics_port:
+            start_http_exporter(METRICS, args.metrics_port)
+            print(f"INFO: Metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+        if args.metrics_file:
+            metrics_exporter = JsonFileExporter(METRICS, args.metrics_file)
+            print(f"INFO: Writing metrics to {args.metrics_file} every {DEFAULT_JSON_INTERVAL}s.")
+        
+        if args.record_trace:
+            trace_recorder = TraceRecorder(args.record_trace)
+            print(f"INFO: Recording received packets to {args.record_trace}.")
+        
+        if args.ack_flow:
+            outbound_scheduler.flow_control = AckFlowControl()
+            print("INFO: ACK flow control enabled for outbound chunks.")
         
         interface = meshtastic.serial_interface.SerialInterface()
         
@@ -657,6 +1321,12 @@ def main():
         print("Keyboard Interrupt Detected. Initiating shutdown...")
         print("=" * 50)
         
+        if outbound_scheduler.flow_control:
+            print(outbound_scheduler.flow_control.summary())
+        sessions = USER_STATES.summary()
+        print(f"Sessions: {sessions['live']} live (~{sessions['memory_bytes'] // 1024} KB), "
+              f"{sessions['evicted_idle']} idle / {sessions['evicted_lru']} LRU evictions")
+        
         SHUTDOWN_MESSAGES = [
             "[Service Termination Acknowledged] Disconnecting from Mesh Node. The Meshtastic BBS is now offline.",
             "[BBS OFFLINE] To restart the service, run: python3 auto_responder.py",
@@ -677,6 +1347,15 @@ def main():
         else:
              print(f"Details: {e}")
     finally:
+        # Let handlers already running finish their posts before the store closes
+        packet_workers.shutdown(wait=True)
+        outbound_scheduler.stop()
+        if trace_recorder:
+            trace_recorder.close()
+        if metrics_exporter:
+            metrics_exporter.stop()
+        bbs_data_handler.close()
+        games.CHIP_BANK.close()
         if interface:
             pass
 
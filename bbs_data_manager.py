@@ -3,10 +3,51 @@
 import json
 import time
 import os
+import sqlite3
+import threading
+
+from archive_store import ArchiveStore, describe_retention
+from bbs_sqlite_store import SQLiteMessageStore
+from board_stats import BoardStats
+from search_index import SearchIndex, SQLiteSearchIndex, search_indexes, term_weights
 
 # Define the file path for persistent message storage
 BBS_DATA_FILE = 'bbs_messages.json'
 
+# --- STORAGE MODES ---
+# 'json':    save_data() rewrites the whole file (atomically) after every post.
+# 'journal': each post is appended to <data file>.journal as one JSON line and fsync'd.
+#            Startup replays snapshot + journal; a background compaction folds the
+#            journal into a new snapshot once it holds JOURNAL_COMPACT_THRESHOLD posts.
+# 'sqlite':  messages live in <data file name>.db and are paged through an index on
+#            (topic, timestamp); nothing but the requested page is held in memory.
+#            An existing JSON board is imported the first time the database is created.
+STORAGE_MODES = ('json', 'journal', 'sqlite')
+JOURNAL_SUFFIX = '.journal'
+COMPACTING_SUFFIX = '.journal.compacting'
+JOURNAL_COMPACT_THRESHOLD = 500
+# Snapshot key recording the last journal entry already folded into the snapshot
+JOURNAL_SEQ_KEY = '_journal_seq'
+
+# The full-text search index of the hot posts (json/journal modes) is persisted next to the
+# data file and only the posts made after it was written are indexed at startup. Archived
+# posts, and every post in SQLite mode, are indexed on disk (SQLiteSearchIndex) instead, so
+# the memory held for search follows the hot set, not the board's history.
+SEARCH_SUFFIX = '.search'
+SEARCH_SAVE_THRESHOLD = 1000     # Newly indexed posts at load that are worth writing straight away
+MAX_SEARCH_RESULTS = 100
+
+# --- RETENTION ---
+# With a retention policy ({topic_id: (max posts, max age in seconds)}) the oldest posts of
+# a topic move out of the hot lists (json/journal modes) into compressed archive segments in
+# <data file>.archive/, which are read lazily when someone pages that far back. Posts are
+# moved in batches: once a topic is ARCHIVE_BATCH posts over its limit, or its oldest post
+# is ARCHIVE_AGE_SLACK seconds past the age limit. At load the limits are applied exactly.
+ARCHIVE_SUFFIX = '.archive'
+ARCHIVE_SEARCH_FILE = 'search.db'
+ARCHIVE_BATCH = 50
+ARCHIVE_AGE_SLACK = 3600
+
 # NOTE: This should match auto_responder.py, but is included here for data integrity.
 TOPIC_KEYS = ['G', 'N', 'T', 'O', 'H'] 
 
@@ -14,14 +55,48 @@ class BBSData:
     """
     Manages the message board data, including loading from and saving to a JSON file.
     It keeps the data structure in memory for fast access.
+    
+    Every message gets a permanent, monotonically increasing 'id' when it is posted.
+    Topic lists are kept in post order (oldest first, new posts are appended) with an
+    id -> message index beside them, so reading by number never shifts and is O(1).
     """
-    def __init__(self, page_size=5):
+    def __init__(self, page_size=5, data_file=BBS_DATA_FILE, storage='json', retention=None):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage}'. Use one of: {', '.join(STORAGE_MODES)}")
         # page_size defines how many messages are displayed per page when reading a topic
         self.page_size = page_size
-        self._user_id = "0000"  # Temporary placeholder for the current poster
-        self.messages = {}       # The main data structure: {'TopicID': [list of message dicts]}
+        self.data_file = data_file
+        self.storage = storage
+        self._user_id = "0000"  # Default poster when post_message is not given a user_id
+        self.messages = {}       # The main data structure: {'TopicID': [list of message dicts, oldest first]}
+        self._by_id = {}         # {message id: (topic_id, message dict)}
+        self._next_id = 1
+        self._post_listeners = [] # Callables run as callback(topic_id, message) after each post
+        self.stats = BoardStats(TOPIC_KEYS)  # Live per-topic / per-poster counters
+        self.search_index = None             # Full-text index (SearchIndex, SQLiteSearchIndex in SQLite mode), built by load_data
+        self.archive_search = None           # SQLiteSearchIndex of the archived posts
+        self.retention = retention or {}     # {topic_id: (max posts, max age in seconds)}
+        self.archive = None                  # ArchiveStore of posts moved out by retention
+        self._search_unsaved = 0             # Posts indexed since the index file was written
+        
+        # Guards the message lists, IDs, stats and journal; posts can arrive from several worker threads
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # One snapshot write at a time (they share the .tmp file)
+        
+        # Journal mode state
+        self._journal = None             # Open append handle for the journal file
+        self._journal_seq = 0            # Sequence number of the last journaled post
+        self._journal_entries = 0        # Posts in the journal since the last compaction
+        self._compaction_thread = None
+        
+        # SQLite mode state
+        self._sql = None
         self.load_data()
 
+    def add_post_listener(self, callback):
+        """Registers callback(topic_id, message), called after every successful post (e.g. cache invalidation)."""
+        self._post_listeners.append(callback)
+
     @property
     def user_id(self):
         """Getter for the user ID."""
@@ -29,7 +104,7 @@ class BBSData:
 
     @user_id.setter
     def user_id(self, new_id):
-        """Setter for the user ID (set by the auto_responder before posting)."""
+        """Setter for the default poster (posts from the BBS pass user_id to post_message instead)."""
         self._user_id = new_id
 
     def _get_welcome_message(self):
@@ -53,16 +128,48 @@ class BBSData:
         initial_data = {k: [] for k in TOPIC_KEYS}
         return initial_data
         
+    @property
+    def journal_file(self):
+        return self.data_file + JOURNAL_SUFFIX
+
+    @property
+    def compacting_file(self):
+        return self.data_file + COMPACTING_SUFFIX
+
+    @property
+    def db_file(self):
+        return os.path.splitext(self.data_file)[0] + '.db'
+
+    @property
+    def search_file(self):
+        return self.data_file + SEARCH_SUFFIX
+
+    @property
+    def archive_dir(self):
+        return self.data_file + ARCHIVE_SUFFIX
+
     def load_data(self):
         """Loads messages from the JSON persistence file, starting fresh with welcome message if not found."""
         
+        self.close()
+        self.archive = None
+        self.search_index = None
+        
+        if self.storage == 'sqlite':
+            if self.retention:
+                print("BBS Data Manager: Retention applies to json and journal storage; SQLite keeps every post on disk.")
+            self._load_sqlite()
+            self._rebuild_stats()
+            self._load_search_index()
+            return
+        
         loaded_data = None
-        if os.path.exists(BBS_DATA_FILE):
+        if os.path.exists(self.data_file):
             try:
-                with open(BBS_DATA_FILE, 'r') as f:
+                with open(self.data_file, 'r') as f:
                     loaded_data = json.load(f)
                 
-                print(f"BBS Data Manager: Loaded {sum(len(v) for v in loaded_data.values())} messages from {BBS_DATA_FILE}")
+                print(f"BBS Data Manager: Loaded {sum(len(v) for k, v in loaded_data.items() if k in TOPIC_KEYS)} messages from {self.data_file}")
             except (json.JSONDecodeError, IOError) as e:
                 print(f"BBS Data Manager: Error loading data ({e}). Starting with fresh structure and welcome message.")
                 loaded_data = None
@@ -71,31 +178,419 @@ class BBSData:
 
         # 1. Start with an empty structure for all topics
         self.messages = self._get_initial_data_structure()
+        self._journal_seq = 0
         
         # 2. Update with all messages from the file if loaded successfully
         if loaded_data:
+            self._journal_seq = loaded_data.get(JOURNAL_SEQ_KEY, 0)
             for topic_id, messages in loaded_data.items():
                 if topic_id in self.messages and messages:
                     # NOTE: This replaces the empty list with the loaded messages
                     self.messages[topic_id] = messages
         
-        # 3. CRITICAL: Add the welcome message ONLY IF 'G' is currently empty (first run or file wipe)
-        if not self.messages.get('G'):
-            self.messages['G'].append(self._get_welcome_message())
+        # 3. Assign IDs to posts from older files and build the id index
+        self._index_messages()
+        
+        # 4. Journal mode: replay the posts made since that snapshot was written
+        if self.storage == 'journal':
+            self._replay_journal()
+        
+        # 5. Move posts past the retention limits into the archive
+        self._open_archive()
+        
+        # 6. CRITICAL: Add the welcome message ONLY IF 'G' is currently empty (first run or file wipe)
+        if not self.topic_count('G'):
+            self._store_message('G', self._get_welcome_message())
             print("BBS Data Manager: Added default welcome message to General Chat.")
+        
+        self._rebuild_stats()
+        self._load_search_index()
+
+    def _load_search_index(self):
+        """
+        Opens the search index and indexes the posts made after it was written. In SQLite mode
+        the index lives in the board's database. Otherwise the persisted index of the hot set
+        is rebuilt from scratch if it is missing, unreadable, or was written for a different
+        board (its last indexed post no longer matches), and posts archived since it was
+        written are dropped from it.
+        """
+        started = time.time()
+        if self._sql:
+            index = SQLiteSearchIndex(self.db_file)
+            indexed = index.add_many(self._sql.since(index.last_id))
+        else:
+            index = SearchIndex.load(self.search_file)
+            if index is not None and index.last_id:
+                entry = self._find_message(index.last_id)
+                if entry is None or entry[1]['timestamp'] != index.last_timestamp:
+                    index = None
+            if index is None:
+                index = SearchIndex()
+            indexed = 0
+            archived = [msg_id for msg_id in index.ids() if msg_id not in self._by_id]
+            if archived:
+                index.remove(archived)
+                indexed += len(archived)
+            for msg_id in sorted(self._by_id):
+                if msg_id > index.last_id:
+                    index.add(*self._by_id[msg_id])
+                    indexed += 1
+        self.search_index = index
+        self._search_unsaved = indexed
+        if indexed:
+            print(f"BBS Data Manager: Indexed {indexed} posts for search in {time.time() - started:.2f}s")
+        if indexed >= SEARCH_SAVE_THRESHOLD:
+            self._save_search_index()
+
+    def _save_search_index(self):
+        if not isinstance(self.search_index, SearchIndex) or not self._search_unsaved:
+            return
+        try:
+            self.search_index.save(self.search_file)
+            self._search_unsaved = 0
+        except OSError as e:
+            print(f"BBS Data Manager: Error saving search index: {e}")
+
+    def _rebuild_stats(self):
+        """Counts the whole board once; post_message keeps the counters current afterwards."""
+        self.stats = BoardStats(TOPIC_KEYS)
+        if self._sql:
+            for topic_id, user_id, count, first_post, last_post in self._sql.aggregate_counts():
+                self.stats.record_aggregate(topic_id, user_id, count, first_post, last_post)
+            newest = self._sql.newest()
+            if newest:
+                self.stats.newest = newest
+            return
+        if self.archive:
+            for topic_id, user_id, count, first_post, last_post in self.archive.poster_counts():
+                self.stats.record_aggregate(topic_id, user_id, count, first_post, last_post)
+        for topic_id, messages in self.messages.items():
+            for message in messages:
+                self.stats.record(topic_id, message)
+
+    def _index_messages(self):
+        """
+        Puts every topic list in post order and builds the id index. Files written before
+        message IDs existed stored each topic newest first and had no 'id' field; those posts
+        are reversed and numbered in timestamp order.
+        """
+        legacy = []
+        for topic_id, messages in self.messages.items():
+            if messages and 'id' not in messages[0]:
+                messages.reverse()
+                legacy.extend(messages)
+        
+        self._next_id = 1 + max((m['id'] for messages in self.messages.values() for m in messages if 'id' in m), default=0)
+        for message in sorted(legacy, key=lambda m: m['timestamp']):
+            message['id'] = self._next_id
+            self._next_id += 1
+        if legacy:
+            print(f"BBS Data Manager: Assigned message IDs to {len(legacy)} older posts.")
+        
+        self._by_id = {m['id']: (topic_id, m) for topic_id, messages in self.messages.items() for m in messages}
+
+    def _open_archive(self):
+        """
+        Opens the archive (if there is one or retention is on), drops hot posts that were
+        already archived before a restart and applies the retention limits exactly.
+        """
+        if not self.retention and not os.path.exists(self.archive_dir):
+            return
+        self.archive = ArchiveStore(self.archive_dir, TOPIC_KEYS)
+        self._next_id = max(self._next_id, self.archive.max_id() + 1)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.archive_search = SQLiteSearchIndex(os.path.join(self.archive_dir, ARCHIVE_SEARCH_FILE))
+        for topic_id in TOPIC_KEYS:
+            # Behind the archive after a crash between the two writes, or on the first start with it
+            if self.archive_search.count(topic_id) < self.archive.count(topic_id):
+                self.archive_search.add_many((topic_id, m) for m in self.archive.messages(topic_id))
+        archived_before = 0
+        for topic_id, messages in self.messages.items():
+            last_archived = self.archive.last_id(topic_id)
+            kept = [m for m in messages if m['id'] > last_archived]
+            if len(kept) < len(messages):
+                archived_before += len(messages) - len(kept)
+                for message in messages[:len(messages) - len(kept)]:
+                    self._by_id.pop(message['id'], None)
+                messages[:] = kept
+        if archived_before:
+            print(f"BBS Data Manager: Dropped {archived_before} posts already in the archive from the hot set.")
+        
+        now = time.time()
+        moved_total = 0
+        for topic_id in TOPIC_KEYS:
+            moved = self._apply_retention(topic_id, now, exact=True)
+            if moved:
+                moved_total += moved
+                print(f"BBS Data Manager: Archived {moved} posts from topic {topic_id} "
+                      f"(keeping {describe_retention(self.retention[topic_id])}).")
+        if moved_total or archived_before:
+            # Rewrite the snapshot now so the next start only reads the hot set
+            snapshot = {topic_id: list(messages) for topic_id, messages in self.messages.items()}
+            if self.storage == 'journal':
+                snapshot[JOURNAL_SEQ_KEY] = self._journal_seq
+            try:
+                self._write_snapshot(snapshot)
+            except (IOError, OSError) as e:
+                print(f"BBS Data Manager: Error saving data: {e}")
+        print(f"BBS Data Manager: {sum(len(v) for v in self.messages.values())} posts in memory, "
+              f"{sum(self.archive.count(k) for k in TOPIC_KEYS)} archived in {self.archive_dir}")
+
+    def _apply_retention(self, topic_id, now, exact=False):
+        """
+        Moves a topic's oldest posts past its retention limits into the archive. Returns how
+        many were moved. Unless exact, nothing moves until a whole batch is due.
+        """
+        limits = self.retention.get(topic_id)
+        if not limits:
+            return 0
+        max_posts, max_age = limits
+        messages = self.messages[topic_id]
+        expired = 0
+        if max_posts is not None and len(messages) > max_posts + (0 if exact else ARCHIVE_BATCH - 1):
+            expired = len(messages) - max_posts
+        if max_age is not None and messages and messages[0]['timestamp'] < now - max_age - (0 if exact else ARCHIVE_AGE_SLACK):
+            cutoff = now - max_age
+            while expired < len(messages) and messages[expired]['timestamp'] < cutoff:
+                expired += 1
+        if not expired:
+            return 0
+        try:
+            self.archive.append(topic_id, messages[:expired])
+        except OSError as e:
+            # The posts stay in the hot set and are archived on a later attempt
+            print(f"BBS Data Manager: Error archiving posts: {e}")
+            return 0
+        moved = messages[:expired]
+        try:
+            self.archive_search.add_many((topic_id, m) for m in moved)
+        except sqlite3.Error as e:
+            # The archive index is caught up from the segments on the next start
+            print(f"BBS Data Manager: Error indexing archived posts: {e}")
+        if self.search_index is not None:
+            self.search_index.remove([m['id'] for m in moved], {term for m in moved for term in term_weights(m)})
+            self._search_unsaved += expired
+        for message in moved:
+            self._by_id.pop(message['id'], None)
+        del messages[:expired]
+        return expired
+
+    def _store_message(self, topic_id, message):
+        """Appends a message to its topic, giving it the next ID if it has none yet."""
+        if 'id' not in message:
+            message['id'] = self._next_id
+        self._next_id = max(self._next_id, message['id'] + 1)
+        self.messages[topic_id].append(message)
+        self._by_id[message['id']] = (topic_id, message)
 
     def save_data(self):
-        """Saves the current messages to the JSON persistence file."""
+        """
+        Saves the current messages to the JSON persistence file.
+        In journal and SQLite mode every post is already on disk; journal mode only kicks off a
+        background compaction once the journal has grown past the threshold.
+        """
+        if self.storage == 'journal':
+            if self._journal_entries >= JOURNAL_COMPACT_THRESHOLD:
+                self.compact(background=True)
+            return
+        if self.storage == 'sqlite':
+            # Every post is committed by post_message
+            return
+        
         try:
-            with open(BBS_DATA_FILE, 'w') as f:
-                json.dump(self.messages, f, indent=4)
+            with self._save_lock:
+                # Copy under the post lock so a concurrent post can't change a list mid-dump
+                with self._lock:
+                    snapshot = {topic_id: list(messages) for topic_id, messages in self.messages.items()}
+                self._write_snapshot(snapshot)
         except IOError as e:
             print(f"BBS Data Manager: Error saving data: {e}")
 
+    def compact(self, background=False):
+        """
+        Folds the journal into a new snapshot. The journal is rotated under the lock, the
+        snapshot is written to a temporary file and atomically renamed over the data file,
+        and only then is the rotated journal deleted.
+        """
+        with self._lock:
+            if self._compaction_thread and self._compaction_thread.is_alive():
+                return
+            if os.path.exists(self.compacting_file):
+                # A previous compaction never finished; fold everything synchronously
+                background = False
+            elif self._journal_entries == 0:
+                return
+            
+            if self._journal:
+                self._journal.close()
+            if os.path.exists(self.journal_file):
+                if os.path.exists(self.compacting_file):
+                    with open(self.journal_file, 'r') as src, open(self.compacting_file, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_file)
+                else:
+                    os.replace(self.journal_file, self.compacting_file)
+            self._journal = open(self.journal_file, 'a')
+            self._journal_entries = 0
+            
+            # Messages are never edited after posting, so copying the lists is enough
+            snapshot = {topic_id: list(messages) for topic_id, messages in self.messages.items()}
+            snapshot[JOURNAL_SEQ_KEY] = self._journal_seq
+            
+            if background:
+                self._compaction_thread = threading.Thread(
+                    target=self._finish_compaction, args=(snapshot,), name="bbs-compaction", daemon=True)
+                self._compaction_thread.start()
+                return
+        self._finish_compaction(snapshot)
+
+    def close(self):
+        """Waits for a running compaction, writes the search index (if it has new posts) and closes the journal file and databases."""
+        thread = self._compaction_thread
+        if thread and thread.is_alive():
+            thread.join()
+        with self._lock:
+            self._save_search_index()
+            for index in (self.search_index, self.archive_search):
+                if isinstance(index, SQLiteSearchIndex):
+                    index.close()
+            if isinstance(self.search_index, SQLiteSearchIndex):
+                self.search_index = None
+            self.archive_search = None
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+            if self._sql:
+                self._sql.close()
+                self._sql = None
+
+    def _load_sqlite(self):
+        """Opens the SQLite store, importing the JSON board the first time the database is created."""
+        is_new = not os.path.exists(self.db_file)
+        self._sql = SQLiteMessageStore(self.db_file, TOPIC_KEYS)
+        # In SQLite mode the topic lists stay empty; rows are read a page at a time
+        self.messages = self._get_initial_data_structure()
+        
+        if is_new and os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r') as f:
+                    loaded_data = json.load(f)
+                # Insert in post order so the database IDs follow the board's history
+                rows = [(topic_id, m) for topic_id in TOPIC_KEYS for m in loaded_data.get(topic_id) or []]
+                rows.sort(key=lambda row: (row[1].get('id', 0), row[1]['timestamp']))
+                self._sql.insert_many(rows)
+                print(f"BBS Data Manager: Imported {self.data_file} into {self.db_file}")
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"BBS Data Manager: Error importing {self.data_file} ({e}). Starting with an empty database.")
+        
+        print(f"BBS Data Manager: Opened {self.db_file} ({sum(self._sql.count(k) for k in TOPIC_KEYS)} messages)")
+        if not self._sql.count('G'):
+            self._sql.insert('G', self._get_welcome_message())
+            print("BBS Data Manager: Added default welcome message to General Chat.")
+
+    def _finish_compaction(self, snapshot):
+        try:
+            self._write_snapshot(snapshot)
+            os.remove(self.compacting_file)
+            print(f"BBS Data Manager: Compacted journal into {self.data_file} (seq {snapshot[JOURNAL_SEQ_KEY]}).")
+        except (IOError, OSError) as e:
+            # The rotated journal is kept and replayed (then folded again) on the next start
+            print(f"BBS Data Manager: Error compacting journal: {e}")
+
+    def _write_snapshot(self, data):
+        """Writes the data file through a temporary file and an atomic rename."""
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+
+    def _replay_journal(self):
+        """Applies journal entries newer than the snapshot, then opens the journal for appending."""
+        replayed = 0
+        for path in (self.compacting_file, self.journal_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-append leaves at most one torn line at the end
+                        print(f"BBS Data Manager: Skipping unreadable journal line in {path}.")
+                        continue
+                    if entry['seq'] <= self._journal_seq or entry['topic'] not in self.messages:
+                        continue
+                    self._store_message(entry['topic'], entry['message'])
+                    self._journal_seq = entry['seq']
+                    replayed += 1
+        
+        if replayed:
+            print(f"BBS Data Manager: Replayed {replayed} journaled posts.")
+        self._journal_entries = replayed
+        self._truncate_torn_tail(self.journal_file)
+        self._journal = open(self.journal_file, 'a')
+        if os.path.exists(self.compacting_file):
+            self.compact()
+
+    def _truncate_torn_tail(self, path):
+        """Cuts an unterminated last line off the journal so new entries start on a fresh line."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
 
-    def post_message(self, topic_id: str, subject: str, body: str):
+    def _append_journal(self, topic_id, message):
         """
-        Creates a new message and prepends it to the specified topic list.
+        Appends one post to the journal and fsyncs it before returning.
+        Returns False (with the journal cut back to where it was) if the write fails.
+        """
+        with self._lock:
+            entry = {'seq': self._journal_seq + 1, 'topic': topic_id, 'message': message}
+            position = None
+            try:
+                if self._journal is None:
+                    self._journal = open(self.journal_file, 'a')
+                position = self._journal.tell()
+                self._journal.write(json.dumps(entry) + "\n")
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            except OSError as e:
+                print(f"BBS Data Manager: Error writing journal: {e}")
+                self._reset_journal(position)
+                return False
+            self._journal_seq += 1
+            self._journal_entries += 1
+            return True
+
+    def _reset_journal(self, position):
+        """
+        Drops whatever a failed append left behind: the handle (with any unflushed buffer) is
+        discarded and the file is cut back to `position`, so a torn line never reaches replay.
+        """
+        try:
+            self._journal.close()
+        except (OSError, AttributeError):
+            pass
+        self._journal = None
+        try:
+            if position is not None:
+                os.truncate(self.journal_file, position)
+            self._journal = open(self.journal_file, 'a')
+        except OSError as e:
+            # The next append retries the open
+            print(f"BBS Data Manager: Error reopening journal: {e}")
+
+
+    def post_message(self, topic_id: str, subject: str, body: str, user_id: str = None):
+        """
+        Creates a new message by user_id (default: the user_id property), gives it the next
+        message ID and appends it to the specified topic.
+        Returns the new message ID (None if the topic does not exist or the post could not be
+        written, in which case nothing was stored).
         """
         if topic_id not in self.messages:
             print(f"BBS Data Manager: Error: Invalid topic ID {topic_id}")
@@ -103,14 +598,98 @@ class BBSData:
 
         new_message = {
             'timestamp': time.time(),
-            'user_id': self._user_id,
+            'user_id': user_id or self._user_id,
             'subject': subject,
             'body': body
         }
 
-        # Prepend the message to the list so the newest messages are read first
-        self.messages[topic_id].insert(0, new_message)
-        print(f"BBS Data Manager: New message posted to topic {topic_id} by {self._user_id[-4:]}")
+        # Append in post order; readers walk the list backwards for newest-first views.
+        # The lock keeps IDs, a compaction snapshot and the journal sequence in step.
+        with self._lock:
+            if self._sql:
+                try:
+                    new_message['id'] = self._sql.insert(topic_id, new_message)
+                except sqlite3.Error as e:
+                    print(f"BBS Data Manager: Error storing message: {e}")
+                    return None
+            else:
+                # Durable before visible: a post the journal could not take is never shown
+                new_message['id'] = self._next_id
+                if self.storage == 'journal' and not self._append_journal(topic_id, new_message):
+                    return None
+                self._store_message(topic_id, new_message)
+            self.stats.record(topic_id, new_message)
+            if self.search_index is not None:
+                self.search_index.add(topic_id, new_message)
+                self._search_unsaved += 1
+            if self.archive:
+                self._apply_retention(topic_id, new_message['timestamp'])
+        print(f"BBS Data Manager: New message {new_message['id']} posted to topic {topic_id} by {new_message['user_id'][-4:]}")
+        for callback in self._post_listeners:
+            callback(topic_id, new_message)
+        return new_message['id']
+
+    # --- READ ACCESS (same for every storage mode) ---
+
+    def topic_count(self, topic_id):
+        """Returns the number of messages in a topic."""
+        if self._sql:
+            return self._sql.count(topic_id)
+        # Under the lock, so a retention pass moving posts to the archive is never half counted
+        with self._lock:
+            archived = self.archive.count(topic_id) if self.archive else 0
+            return len(self.messages.get(topic_id, [])) + archived
+
+    def get_page(self, topic_id, page_num, page_size=None):
+        """Returns the messages on one page of a topic, newest first (page_num starts at 0)."""
+        page_size = page_size or self.page_size
+        start_index = page_num * page_size
+        if self._sql:
+            return self._sql.page(topic_id, start_index, page_size)
+        
+        # Walk the post-ordered list backwards instead of reversing or copying it. The slice and
+        # the archive size are taken under the lock, since retention trims the list in place.
+        with self._lock:
+            messages = self.messages.get(topic_id, [])
+            first = len(messages) - 1 - start_index
+            last = max(first - page_size, -1)
+            page = [messages[i] for i in range(first, last, -1)]
+            offset = max(start_index - len(messages), 0)
+            archived = self.archive.count(topic_id) if self.archive else 0
+        if len(page) < page_size and archived:
+            # The rest of the page is older than the hot set; segments are read outside the lock
+            page.extend(self.archive.page(topic_id, offset, page_size - len(page), total=archived))
+        return page
+
+    def search(self, query, limit=MAX_SEARCH_RESULTS):
+        """Returns up to `limit` (topic_id, msg_id) pairs matching query, best match first."""
+        if self.search_index is None:
+            return []
+        if self.archive_search is not None:
+            return search_indexes([self.search_index, self.archive_search], query, limit)
+        return self.search_index.search(query, limit)
+
+    def _find_message(self, msg_id):
+        """Returns (topic_id, message) for a message ID in any topic, or None."""
+        if self._sql:
+            return self._sql.find(msg_id)
+        entry = self._by_id.get(msg_id)
+        if entry is None and self.archive:
+            return self.archive.find(msg_id)
+        return entry
+
+    def get_message(self, topic_id, msg_id):
+        """Returns the message with ID msg_id if it belongs to the topic, otherwise None."""
+        if self._sql:
+            return self._sql.get(topic_id, msg_id)
+        entry = self._by_id.get(msg_id)
+        if entry is None:
+            if self.archive and msg_id <= self.archive.last_id(topic_id):
+                return self.archive.get(topic_id, msg_id)
+            return None
+        if entry[0] != topic_id:
+            return None
+        return entry[1]
 
 
 # The unused get_topic_messages method has been REMOVED.
@@ -125,11 +704,10 @@ if __name__ == '__main__':
     bbs = BBSData()
     
     # Check if the welcome message is present
-    welcome_msg = bbs.messages.get('G', [])[-1] # Welcome is now at the END
-    print(f"\nWelcome Message Check: Subject='{welcome_msg['subject']}'")
+    welcome_msg = bbs.messages.get('G', [])[0] # Lists are in post order, so the welcome is FIRST
+    print(f"\nWelcome Message Check: Subject='{welcome_msg['subject']}' (ID {welcome_msg['id']})")
     
-    bbs.user_id = "f00b299e"
-    bbs.post_message('G', 'User Test Post 1', 'This message should appear before the welcome message.')
+    bbs.post_message('G', 'User Test Post 1', 'This message should appear before the welcome message.', user_id="f00b299e")
     
     # Save the data to disk
     bbs.save_data()
@@ -138,6 +716,7 @@ if __name__ == '__main__':
     new_bbs = BBSData()
     print(f"\nReload check: Total messages in 'G': {len(new_bbs.messages.get('G', []))}")
     
-    # Check the order: New post (index 0) should be before welcome (index 1)
-    print(f"Message 1 (newest): {new_bbs.messages.get('G', [])[0]['subject']}")
-    print(f"Message 2 (oldest): {new_bbs.messages.get('G', [])[1]['subject']}")
+    # Check the order: newest-first pages show the new post before the welcome message
+    newest, oldest = new_bbs.get_page('G', 0)[:2]
+    print(f"Message {newest['id']} (newest): {newest['subject']}")
+    print(f"Message {oldest['id']} (oldest): {oldest['subject']}")
@@ -0,0 +1,128 @@
+# bbs_sqlite_store.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic     TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    user_id   TEXT NOT NULL,
+    subject   TEXT NOT NULL,
+    body      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_topic_time ON messages (topic, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_topic_id ON messages (topic, id);
+"""
+
+# The id column is the message ID; newest first is simply descending id
+_PAGE_QUERY = (
+    "SELECT id, timestamp, user_id, subject, body FROM messages "
+    "WHERE topic = ? ORDER BY id DESC LIMIT ? OFFSET ?"
+)
+_GET_QUERY = "SELECT id, timestamp, user_id, subject, body FROM messages WHERE id = ? AND topic = ?"
+_INSERT_QUERY = "INSERT INTO messages (id, topic, timestamp, user_id, subject, body) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+class SQLiteMessageStore:
+    """
+    SQLite-backed message store used by BBSData when storage='sqlite'.
+
+    Messages stay on disk; only the rows of the requested page are read, through the
+    (topic, id) index, so resident memory no longer grows with the archive. The INTEGER
+    PRIMARY KEY doubles as the permanent message ID, so reading by ID is a key lookup.
+    Per-topic counts are read once at open and kept up to date on insert.
+    """
+    def __init__(self, db_file, topics):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._counts = {topic_id: 0 for topic_id in topics}
+        for topic_id, count in self._conn.execute("SELECT topic, COUNT(*) FROM messages GROUP BY topic"):
+            if topic_id in self._counts:
+                self._counts[topic_id] = count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self, topic_id):
+        return self._counts.get(topic_id, 0)
+
+    def insert(self, topic_id, message):
+        """Inserts one message and returns its ID."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(_INSERT_QUERY, _message_to_row(topic_id, message))
+            self._counts[topic_id] = self._counts.get(topic_id, 0) + 1
+        return cursor.lastrowid
+
+    def insert_many(self, rows):
+        """Bulk import of (topic_id, message) pairs, in post order (used when migrating a JSON board)."""
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT_QUERY, (_message_to_row(topic_id, m) for topic_id, m in rows))
+            for topic_id, _ in rows:
+                self._counts[topic_id] = self._counts.get(topic_id, 0) + 1
+
+    def get(self, topic_id, msg_id):
+        """Returns the message with this ID if it belongs to the topic (primary key lookup)."""
+        with self._lock:
+            row = self._conn.execute(_GET_QUERY, (msg_id, topic_id)).fetchone()
+        return _row_to_message(row) if row else None
+
+    def aggregate_counts(self):
+        """Returns (topic, user_id, count, first timestamp, last timestamp) rows for the stats rebuild."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT topic, user_id, COUNT(*), MIN(timestamp), MAX(timestamp) FROM messages GROUP BY topic, user_id"
+            ).fetchall()
+
+    def newest(self):
+        """Returns (topic_id, message) for the most recent post, or None on an empty board."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT topic, id, timestamp, user_id, subject, body FROM messages ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return (row[0], _row_to_message(row[1:])) if row else None
+
+    def find(self, msg_id):
+        """Returns (topic_id, message) for a message ID in any topic, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT topic, id, timestamp, user_id, subject, body FROM messages WHERE id = ?", (msg_id,)
+            ).fetchone()
+        return (row[0], _row_to_message(row[1:])) if row else None
+
+    def since(self, msg_id, batch=5000):
+        """Yields (topic_id, message) for every message with an ID above msg_id, in ID order."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT topic, id, timestamp, user_id, subject, body FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+                    (msg_id, batch)
+                ).fetchall()
+            for row in rows:
+                yield row[0], _row_to_message(row[1:])
+            if len(rows) < batch:
+                return
+            msg_id = rows[-1][1]
+
+    def page(self, topic_id, offset, limit):
+        """Returns up to `limit` messages starting at position `offset` (0 = newest)."""
+        with self._lock:
+            rows = self._conn.execute(_PAGE_QUERY, (topic_id, limit, offset)).fetchall()
+        return [_row_to_message(row) for row in rows]
+
+
+def _message_to_row(topic_id, message):
+    # id None lets SQLite assign the next one
+    return (message.get('id'), topic_id, message['timestamp'], message['user_id'], message['subject'], message['body'])
+
+
+def _row_to_message(row):
+    msg_id, timestamp, user_id, subject, body = row
+    return {'id': msg_id, 'timestamp': timestamp, 'user_id': user_id, 'subject': subject, 'body': body}
@@ -0,0 +1,981 @@
+# benchmarks.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+#
+# Micro-benchmarks for the Mesh-BBS hot paths. Nothing here touches the radio or the
+# live bbs_messages.json: every benchmark works in its own temporary directory.
+#
+# Usage: python3 benchmarks.py journal [--sizes 1000 10000 100000 500000]
+#        python3 benchmarks.py storage [--sizes 1000 10000 100000]
+#        python3 benchmarks.py archive [--sizes 10000 100000 500000] [--keep 200]
+#        python3 benchmarks.py dispatch [--packets 20000]
+#        python3 benchmarks.py search [--sizes 1000 10000 100000]
+#        python3 benchmarks.py concurrency [--nodes 50] [--posts 10] [--workers 0 4 8]
+#        python3 benchmarks.py blackjack [--sessions 1000] [--rounds 20000]
+#        python3 benchmarks.py poker [--reference-hands 200000]
+#        python3 benchmarks.py minesweeper [--sides 16 64 256 1024] [--density 0.1]
+#        python3 benchmarks.py suite [--quick] [--json results.json] [--compare baseline.json]
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import bbs_data_manager
+from archive_store import parse_retention
+from bbs_data_manager import BBSData, TOPIC_KEYS
+
+
+# --- HELPERS ---
+
+def make_board(count, topics=TOPIC_KEYS):
+    """Builds a synthetic board of `count` messages spread over all topics (post order, with IDs)."""
+    board = {topic_id: [] for topic_id in topics}
+    now = time.time() - count * 60
+    for i in range(count):
+        topic_id = topics[i % len(topics)]
+        board[topic_id].append({
+            'id': i + 1,
+            'timestamp': now + i * 60,
+            'user_id': f"!{i % 500:08x}",
+            'subject': f"Subject line number {i}",
+            'body': f"Message body {i}. " * 8,
+        })
+    return board
+
+
+def write_board(path, count):
+    with open(path, 'w') as f:
+        json.dump(make_board(count), f)
+
+
+def quiet():
+    """Swallows the BBS print() logging so it does not end up in the timings."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    """Returns mean/p50/p99 in milliseconds."""
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+# --- STORAGE BENCHMARKS ---
+
+def bench_post_latency(sizes, storage='journal', posts=200):
+    """
+    Measures post_message + save_data (the work handle_post_body_final does per post)
+    on boards that already hold `size` messages.
+    """
+    results = {}
+    # Keep compaction out of the measured window; it runs in the background in production
+    saved_threshold = bbs_data_manager.JOURNAL_COMPACT_THRESHOLD
+    bbs_data_manager.JOURNAL_COMPACT_THRESHOLD = posts + 1
+    try:
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                data_file = os.path.join(tmp, 'bbs_messages.json')
+                write_board(data_file, size)
+                samples = []
+                with quiet():
+                    bbs = BBSData(page_size=4, data_file=data_file, storage=storage)
+                    bbs.user_id = '!bench001'
+                    for i in range(posts):
+                        started = time.perf_counter()
+                        bbs.post_message(TOPIC_KEYS[i % len(TOPIC_KEYS)], f"Bench {i}", "Benchmark body text.")
+                        bbs.save_data()
+                        samples.append(time.perf_counter() - started)
+                    bbs.close()
+                results[size] = summarize(samples)
+    finally:
+        bbs_data_manager.JOURNAL_COMPACT_THRESHOLD = saved_threshold
+    return results
+
+
+def bench_open_and_page(sizes, storage, reads=500):
+    """
+    Opens a board of each size and reads random pages. Reports open time, the memory
+    the open board keeps allocated (tracemalloc) and per-page read latency.
+    """
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = os.path.join(tmp, 'bbs_messages.json')
+            write_board(data_file, size)
+            with quiet():
+                if storage == 'sqlite':
+                    # Import once so the measurement below is a normal restart
+                    BBSData(page_size=4, data_file=data_file, storage=storage).close()
+                tracemalloc.start()
+                started = time.perf_counter()
+                bbs = BBSData(page_size=4, data_file=data_file, storage=storage)
+                open_s = time.perf_counter() - started
+                resident, _ = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                pages = max(1, bbs.topic_count('G') // bbs.page_size)
+                samples = []
+                for i in range(reads):
+                    started = time.perf_counter()
+                    bbs.get_page('G', (i * 7919) % pages)
+                    samples.append(time.perf_counter() - started)
+                bbs.close()
+            row = summarize(samples)
+            row.update({'open_s': open_s, 'resident_mb': resident / 1e6})
+            results[size] = row
+    return results
+
+
+def print_table(title, results):
+    print(f"\n{title}")
+    print(f"{'messages':>10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for size, row in results.items():
+        print(f"{size:>10} {row['mean_ms']:>10.3f} {row['p50_ms']:>10.3f} {row['p99_ms']:>10.3f}")
+
+
+def run_journal(args):
+    print_table("Post latency, journal storage", bench_post_latency(args.sizes, 'journal', args.posts))
+    # The full-rewrite mode gets slow quickly, so only compare it on the smaller boards
+    json_sizes = [size for size in args.sizes if size <= 10000]
+    if json_sizes:
+        print_table("Post latency, json storage (full rewrite)", bench_post_latency(json_sizes, 'json', min(args.posts, 20)))
+
+
+def run_storage(args):
+    for storage in ('json', 'sqlite'):
+        results = bench_open_and_page(args.sizes, storage)
+        print(f"\nOpen + page reads, {storage} storage")
+        print(f"{'messages':>10} {'open s':>10} {'held MB':>10} {'page p50 ms':>12} {'page p99 ms':>12}")
+        for size, row in results.items():
+            print(f"{size:>10} {row['open_s']:>10.3f} {row['resident_mb']:>10.2f} {row['p50_ms']:>12.3f} {row['p99_ms']:>12.3f}")
+
+
+def bench_archive(sizes, keep=200, reads=200):
+    """
+    Opens boards of each size with every post in memory and with a retention of `keep`
+    posts per topic (the move into the archive happens on a first, unmeasured open).
+    Reports open time, held memory, data file size and page reads from the hot set, from
+    the archive with its segment cache cold, and from the archive once cached.
+    """
+    results = {}
+    retention = parse_retention([str(keep)], TOPIC_KEYS)
+    for size in sizes:
+        for label, policy in (('all', None), (f'keep {keep}', retention)):
+            with tempfile.TemporaryDirectory() as tmp:
+                data_file = os.path.join(tmp, 'bbs_messages.json')
+                write_board(data_file, size)
+                with quiet():
+                    BBSData(page_size=4, data_file=data_file, retention=policy).close()
+                    gc.collect()
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    bbs = BBSData(page_size=4, data_file=data_file, retention=policy)
+                    open_s = time.perf_counter() - started
+                    resident, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                    hot_pages = keep // bbs.page_size
+                    pages = bbs.topic_count('G') // bbs.page_size
+                    rng = random.Random(size)
+                    row = {'open_s': open_s, 'resident_mb': resident / 1e6,
+                           'file_mb': os.path.getsize(data_file) / 1e6}
+                    for name, page_numbers in (
+                            ('hot', [rng.randrange(hot_pages) for _ in range(reads)]),
+                            # Far apart, so nearly every read decodes a segment
+                            ('cold', [rng.randrange(hot_pages, pages) for _ in range(reads // 10)]),
+                            ('cached', [pages - 1 - rng.randrange(4) for _ in range(reads)])):
+                        samples = []
+                        for page_num in page_numbers:
+                            started = time.perf_counter()
+                            bbs.get_page('G', page_num)
+                            samples.append(time.perf_counter() - started)
+                        row[name + '_p50_ms'] = percentile(samples, 50) * 1000
+                    bbs.close()
+                    # Otherwise the previous board is still alive while the next one opens
+                    del bbs
+            results[(size, label)] = row
+    return results
+
+
+def run_archive(args):
+    print(f"{'messages':>10} {'hot set':>10} {'open s':>8} {'held MB':>8} {'file MB':>8} "
+          f"{'hot p50 ms':>11} {'cold p50 ms':>12} {'cached p50 ms':>14}")
+    for (size, label), row in bench_archive(args.sizes, args.keep).items():
+        print(f"{size:>10} {label:>10} {row['open_s']:>8.3f} {row['resident_mb']:>8.2f} {row['file_mb']:>8.2f} "
+              f"{row['hot_p50_ms']:>11.3f} {row['cold_p50_ms']:>12.3f} {row['cached_p50_ms']:>14.3f}")
+
+
+# --- COMMAND ROUTING BENCHMARKS ---
+
+class _NullScheduler:
+    """Drops outbound packets so only command handling is measured."""
+    flow_control = None
+
+    def enqueue(self, interface, destId, packets, priority=None):
+        pass
+
+    def pending(self, destId=None):
+        return 0
+
+
+# name: (commands sent once to reach the context, commands cycled through while timing)
+DISPATCH_SCENARIOS = {
+    'main_menu':    ([], ['M']),
+    'fallback':     ([], ['HELLO']),
+    'bbs_menu':     ([], ['B']),
+    'read_topic':   (['B'], ['R']),
+    'subject_list': (['B'], ['R G']),
+    'read_message': (['B', 'R G'], ['1']),
+    'next_page':    (['B'], ['R G', 'N']),
+    'activity':     (['B'], ['A']),
+    'games_menu':   ([], ['M', 'G']),
+    'post_body':    (['P', 'G', 'Bench subject'], ['a line of body text']),
+    'blackjack':    (['M', 'G', 'B'], ['1', 'S', 'N']),
+}
+
+
+def bench_dispatch(packets=20000, scenarios=None, repeats=5):
+    """Measures handle_packet cost per packet for each command type (best of `repeats`), with sending stubbed out."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, quiet():
+        import auto_responder
+        auto_responder.attach_data_handler(BBSData(page_size=4, data_file=os.path.join(tmp, 'bbs_messages.json')))
+        for i in range(20):
+            auto_responder.bbs_data_handler.post_message('G', f"Bench post {i}", "Benchmark body text.")
+        saved_scheduler = auto_responder.outbound_scheduler
+        auto_responder.outbound_scheduler = _NullScheduler()
+        # Shadow print() in the router so the console logging does not swamp the routing cost
+        auto_responder.print = _no_print
+        try:
+            for name, (setup, cycle) in (scenarios or DISPATCH_SCENARIOS).items():
+                fromId = f"!bench-{name}"
+                auto_responder.USER_STATES.pop(fromId, None)
+                for text in ['HI'] + setup:
+                    auto_responder.handle_packet(_text_packet(fromId, text), None)
+                game_data = auto_responder.USER_STATES[fromId].get('game_data')
+                if game_data:
+                    game_data['chips'] = 10 ** 9
+
+                cycle_packets = [_text_packet(fromId, text) for text in cycle]
+                rounds = max(1, packets // len(cycle_packets) // repeats)
+                best = None
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    for _ in range(rounds):
+                        for packet in cycle_packets:
+                            auto_responder.handle_packet(packet, None)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                results[name] = {'us_per_packet': best / (rounds * len(cycle_packets)) * 1e6}
+        finally:
+            auto_responder.outbound_scheduler = saved_scheduler
+            del auto_responder.print
+    return results
+
+
+def _no_print(*args, **kwargs):
+    pass
+
+
+def _text_packet(fromId, text, packet_id=None):
+    return {'fromId': fromId, 'id': packet_id, 'decoded': {'portnum': 'TEXT_MESSAGE_APP', 'text': text}}
+
+
+def run_dispatch(args):
+    results = bench_dispatch(args.packets)
+    print(f"\n{'command':<14} {'us/packet':>10}")
+    for name, row in results.items():
+        print(f"{name:<14} {row['us_per_packet']:>10.1f}")
+
+
+# --- SEARCH INDEX ---
+
+def make_text_board(count, vocabulary=5000, seed=7):
+    """Like make_board, but subjects and bodies are drawn from a Zipf-like vocabulary so term frequencies look like real text."""
+    rng = random.Random(seed)
+    words = [f"word{n}" for n in range(vocabulary)]
+    def pick(n):
+        return " ".join(words[min(int(rng.paretovariate(1.1)) - 1, vocabulary - 1)] for _ in range(n))
+    board = make_board(count)
+    for messages in board.values():
+        for message in messages:
+            message['subject'] = pick(4)
+            message['body'] = pick(30)
+    return board
+
+
+def bench_search(count, queries=200):
+    """Index build at load, reopen with the persisted index, query latency and index memory."""
+    from search_index import SearchIndex
+    rng = random.Random(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bbs_messages.json')
+        with open(path, 'w') as f:
+            json.dump(make_text_board(count), f)
+        with quiet():
+            started = time.perf_counter()
+            bbs = BBSData(data_file=path)          # no index file yet: full build
+            build = time.perf_counter() - started
+            bbs.close()
+            started = time.perf_counter()
+            bbs = BBSData(data_file=path)          # persisted index, nothing new to add
+            reopen = time.perf_counter() - started
+        started = time.perf_counter()
+        SearchIndex.load(bbs.search_file)
+        index_load = time.perf_counter() - started
+
+        samples = {'1 word': [], '2 words': [], '3 words': []}
+        for _ in range(queries):
+            for n, name in enumerate(samples, 1):
+                query = " ".join(f"word{int(rng.paretovariate(1.1)) + 2}" for _ in range(n))
+                started = time.perf_counter()
+                bbs.search(query)
+                samples[name].append(time.perf_counter() - started)
+        result = {
+            'build_s': build,
+            'reopen_s': reopen,
+            'index_load_s': index_load,
+            'index_mb': bbs.search_index.memory_estimate() / 1e6,
+            'file_mb': os.path.getsize(bbs.search_file) / 1e6,
+            'query': {name: summarize(s) for name, s in samples.items()},
+        }
+        bbs.close()
+    return result
+
+
+def run_search(args):
+    print(f"{'messages':>9} {'build s':>8} {'reopen s':>9} {'idx load s':>10} {'index MB':>9} {'file MB':>8}  query p50/p99 ms (1/2/3 words)")
+    for count in args.sizes:
+        r = bench_search(count)
+        queries = "  ".join(f"{q['p50_ms']:.2f}/{q['p99_ms']:.2f}" for q in r['query'].values())
+        print(f"{count:>9} {r['build_s']:>8.2f} {r['reopen_s']:>9.2f} {r['index_load_s']:>10.2f} "
+              f"{r['index_mb']:>9.1f} {r['file_mb']:>8.1f}  {queries}")
+
+
+# --- CONCURRENT HANDLING (worker pool stress test) ---
+
+def _post_script(fromId, posts):
+    """Commands one node sends to make `posts` posts; subjects carry the node and post number."""
+    script = ['HI', 'B']
+    for k in range(posts):
+        script += ['P', 'G', f"{fromId} #{k}", f"Body of post {k} from {fromId}.", 'END', 'B']
+    return script
+
+
+def stress_concurrency(nodes=50, posts=10, workers=4, storage='json', seed=1):
+    """
+    Replays randomly interleaved posting sessions from many nodes through onReceive on a
+    worker pool of `workers` threads, then checks that every node's packets were handled
+    in the order they were sent and that every post is attributed to the node that wrote it.
+    Returns timing and a list of problems (empty when everything checks out).
+    """
+    import auto_responder
+    from rate_limiter import RateLimiter, LIMIT_SETTINGS
+    from worker_pool import KeyedWorkerPool
+
+    rng = random.Random(seed)
+    node_ids = [f"!{0x10000000 + n:08x}" for n in range(nodes)]
+    scripts = {fromId: _post_script(fromId, posts) for fromId in node_ids}
+    traffic = []
+    cursors = {fromId: 0 for fromId in node_ids}
+    while cursors:
+        fromId = rng.choice(list(cursors))
+        traffic.append(_text_packet(fromId, scripts[fromId][cursors[fromId]], packet_id=cursors[fromId]))
+        cursors[fromId] += 1
+        if cursors[fromId] == len(scripts[fromId]):
+            del cursors[fromId]
+
+    handled = {fromId: [] for fromId in node_ids}   # packet ids in the order handlers ran
+    handle_packet = auto_responder.handle_packet
+
+    def recording_handle_packet(packet, interface):
+        handled[packet['fromId']].append(packet['id'])
+        handle_packet(packet, interface)
+
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp, quiet():
+        store = BBSData(page_size=4, data_file=os.path.join(tmp, 'bbs_messages.json'), storage=storage)
+        auto_responder.attach_data_handler(store)
+        saved = (auto_responder.outbound_scheduler, auto_responder.packet_workers, auto_responder.rate_limiter)
+        auto_responder.outbound_scheduler = _NullScheduler()
+        auto_responder.packet_workers = pool = KeyedWorkerPool(max_workers=workers)
+        # The scripted sessions post far faster than a person types; if a sysop's limits were
+        # on, throttled packets would show up as missing posts
+        auto_responder.rate_limiter = limiter = RateLimiter()
+        for name in LIMIT_SETTINGS:
+            limiter.set_limit(name, 0)
+        auto_responder.handle_packet = recording_handle_packet
+        auto_responder.print = _no_print
+        for fromId in node_ids:
+            auto_responder.USER_STATES.pop(fromId, None)
+        try:
+            started = time.perf_counter()
+            for packet in traffic:
+                auto_responder.onReceive(packet, None)
+            pool.wait_idle()
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+            auto_responder.outbound_scheduler, auto_responder.packet_workers, auto_responder.rate_limiter = saved
+            auto_responder.handle_packet = handle_packet
+            del auto_responder.print
+
+        for fromId in node_ids:
+            if handled[fromId] != list(range(len(scripts[fromId]))):
+                problems.append(f"{fromId}: packets handled out of order")
+        posted = [m for topic_id in TOPIC_KEYS for m in store.get_page(topic_id, 0, page_size=nodes * posts + 1)]
+        by_node = {}
+        for msg in sorted(posted, key=lambda m: m['id']):
+            if msg['user_id'] == 'SYSOP':
+                continue
+            author, _, number = msg['subject'].partition(' #')
+            if msg['user_id'] != author:
+                problems.append(f"post '{msg['subject']}' attributed to {msg['user_id']}")
+            by_node.setdefault(author, []).append(int(number))
+        for fromId in node_ids:
+            if by_node.get(fromId) != list(range(posts)):
+                problems.append(f"{fromId}: posts missing or out of order ({by_node.get(fromId)})")
+        store.close()
+
+    return {'packets': len(traffic), 'seconds': elapsed, 'problems': problems}
+
+
+def run_concurrency(args):
+    print(f"{args.nodes} nodes x {args.posts} posts, {args.storage} storage\n")
+    print(f"{'workers':>7} {'packets':>8} {'seconds':>8} {'pkt/s':>8}  result")
+    failed = False
+    for workers in args.workers:
+        row = stress_concurrency(args.nodes, args.posts, workers, args.storage)
+        result = 'OK' if not row['problems'] else f"{len(row['problems'])} problems"
+        print(f"{workers:>7} {row['packets']:>8} {row['seconds']:>8.2f} {row['packets'] / row['seconds']:>8.0f}  {result}")
+        for problem in row['problems'][:10]:
+            print(f"        {problem}")
+        failed = failed or bool(row['problems'])
+    if failed:
+        raise SystemExit(1)
+
+
+# --- GAMES ---
+
+def bench_blackjack(sessions=1000, rounds=20000):
+    """
+    Deals a hand to `sessions` players and reports the memory their game state holds
+    (tracemalloc, per session), then plays `rounds` rounds of bet / stand / new game
+    through handle_game_command and reports rounds per second.
+    """
+    import games
+    states = {}
+    games.print = _no_print
+    try:
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        for i in range(sessions):
+            fromId = f"!{i:08x}"
+            states[fromId] = {}
+            games.start_blackjack(fromId, states, games.GAMES_MENU_ASCII, '', '')
+            games.handle_game_command(fromId, '10', states, games.GAMES_MENU_ASCII, '', '')
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        fromId = '!00000000'
+        commands = ('10', 'S', 'N')
+        started = time.perf_counter()
+        for i in range(rounds):
+            states[fromId]['game_data']['chips'] = 10 ** 9
+            for command in commands:
+                games.handle_game_command(fromId, command, states, games.GAMES_MENU_ASCII, '', '')
+        elapsed = time.perf_counter() - started
+    finally:
+        del games.print
+    return {'bytes_per_session': (held - before) / sessions, 'rounds_per_s': rounds / elapsed}
+
+
+def run_blackjack(args):
+    row = bench_blackjack(args.sessions, args.rounds)
+    print(f"Game state per dealt session: {row['bytes_per_session']:.0f} bytes ({args.sessions} sessions)")
+    print(f"Rounds per second (bet, stand, new game): {row['rounds_per_s']:.0f}")
+
+
+# Frequency of each Jacks or Better hand among all 2,598,960 five-card hands
+# (No Win is the 1,302,540 high-card hands plus the 760,320 pairs below jacks)
+POKER_HAND_COUNTS = (1302540 + 760320, 337920, 123552, 54912, 10200, 5108, 3744, 624, 36, 4)
+
+
+def _sort_and_compare_poker_hand(hand):
+    """Reference classifier: sort the ranks, count repeats and compare, as a hand evaluator would without tables."""
+    import games
+    ranks = sorted((card >> 2 for card in hand), reverse=True)
+    counts = sorted((ranks.count(rank) for rank in set(ranks)), reverse=True)
+    flush = len({card & 3 for card in hand}) == 1
+    straight = counts[0] == 1 and (ranks[0] - ranks[4] == 4 or ranks == [12, 3, 2, 1, 0])
+    if straight and flush:
+        return games.ROYAL_FLUSH if ranks[4] == games.CARDS.index('10') else games.STRAIGHT_FLUSH
+    if counts[0] == 4:
+        return games.FOUR_OF_A_KIND
+    if counts[:2] == [3, 2]:
+        return games.FULL_HOUSE
+    if flush:
+        return games.FLUSH
+    if straight:
+        return games.STRAIGHT
+    if counts[0] == 3:
+        return games.THREE_OF_A_KIND
+    if counts[:2] == [2, 2]:
+        return games.TWO_PAIR
+    if counts[0] == 2 and max(rank for rank in ranks if ranks.count(rank) == 2) >= games.CARDS.index('J'):
+        return games.JACKS_OR_BETTER
+    return games.NO_WIN
+
+
+def bench_poker(reference_hands=200000):
+    """
+    Evaluates every five-card hand with the lookup evaluator and checks the count of each
+    hand against the known distribution, then times the sort-and-compare reference on
+    the first `reference_hands` hands for comparison.
+    """
+    import games
+    from itertools import combinations, islice
+    counts = [0] * len(games.POKER_HANDS)
+    evaluate = games.evaluate_poker_hand
+    started = time.perf_counter()
+    for hand in combinations(range(len(games.CARD_NAMES)), 5):
+        counts[evaluate(hand)] += 1
+    elapsed = time.perf_counter() - started
+    total = sum(counts)
+    assert total == 2598960 and tuple(counts) == POKER_HAND_COUNTS, counts
+
+    started = time.perf_counter()
+    for hand in islice(combinations(range(len(games.CARD_NAMES)), 5), reference_hands):
+        _sort_and_compare_poker_hand(hand)
+    reference_elapsed = time.perf_counter() - started
+    payback = sum(count * pay for count, pay in zip(counts, games.POKER_PAYOUTS)) / total
+    return {'hands': total, 'seconds': elapsed, 'hands_per_s': total / elapsed,
+            'reference_hands_per_s': reference_hands / reference_elapsed, 'counts': counts, 'deal_payback': payback}
+
+
+def run_poker(args):
+    import games
+    row = bench_poker(args.reference_hands)
+    print(f"Evaluated all {row['hands']:,} hands in {row['seconds']:.2f} s ({row['hands_per_s']:,.0f} hands/s); "
+          f"sort-and-compare reference: {row['reference_hands_per_s']:,.0f} hands/s")
+    for name, count in zip(games.POKER_HANDS, row['counts']):
+        print(f"{name:>16} {count:>9,}")
+    print(f"Counts match the known distribution. Return on the dealt hand alone (no draw): {row['deal_payback']:.1%}")
+
+
+def _cell_by_cell_reveal(cell, mines, width, height):
+    """Reference flood fill over a list of cells (breadth first, one neighbour at a time)."""
+    from collections import deque
+    is_mine = [mines >> i & 1 for i in range(width * height)] if width * height <= 4096 else \
+        [bit == '1' for bit in format(mines, f'0{width * height}b')[::-1]]
+    opened = bytearray(width * height)
+    queue = deque([cell])
+    while queue:
+        i = queue.popleft()
+        if opened[i]:
+            continue
+        opened[i] = 1
+        x, y = i % width, i // width
+        around = [(y + dy) * width + x + dx for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                  if (dx or dy) and 0 <= x + dx < width and 0 <= y + dy < height]
+        if not any(is_mine[j] for j in around):
+            queue.extend(j for j in around if not opened[j])
+    return sum(opened)
+
+
+def bench_minesweeper(sides, density=0.1, moves=100, seed=23):
+    """
+    For square boards of each side: mine placement, the first reveal (bitboard flood fill
+    vs a cell-by-cell reference), the neighbour counts of the whole board, and later
+    reveals of random safe cells.
+    """
+    import minesweeper
+    rng = random.Random(seed)
+    results = []
+    for side in sides:
+        cells = side * side
+        start = cells // 2 + side // 2
+        started = time.perf_counter()
+        mines = minesweeper.place_mines(side, side, int(cells * density), start, rng)
+        place_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        revealed = minesweeper.reveal(start, mines, 0, 0, side, side)
+        first_s = time.perf_counter() - started
+        started = time.perf_counter()
+        reference_opened = _cell_by_cell_reveal(start, mines, side, side)
+        reference_s = time.perf_counter() - started
+        opened = bin(revealed).count('1')
+        assert opened == reference_opened, "bitboard and reference flood fills disagree"
+
+        started = time.perf_counter()
+        minesweeper.neighbour_counts(mines, side, side)
+        counts_s = time.perf_counter() - started
+
+        samples = []
+        for _ in range(moves):
+            cell = rng.randrange(cells)
+            if (mines | revealed) >> cell & 1:
+                continue
+            started = time.perf_counter()
+            revealed = minesweeper.reveal(cell, mines, revealed, 0, side, side)
+            samples.append(time.perf_counter() - started)
+        results.append({'side': side, 'mines': int(cells * density), 'opened': opened,
+                        'place_ms': place_s * 1000, 'first_ms': first_s * 1000, 'reference_ms': reference_s * 1000,
+                        'counts_ms': counts_s * 1000,
+                        'move_p50_ms': percentile(samples, 50) * 1000 if samples else 0.0})
+    return results
+
+
+def bench_minesweeper_replies(games_played=200, seed=23):
+    """
+    Plays random games of the largest offered level through handle_game_command and reports
+    reply sizes: the changed-rows replies sent against a full board after every move.
+    """
+    import games
+    from packet_packer import pack_message
+    rng = random.Random(seed)
+    random.seed(seed)
+    level = max(games.minesweeper.LEVELS, key=lambda key: games.minesweeper.LEVELS[key][0])
+    states = {'!bench': {}}
+    sent, full, packets = [], [], []
+    for _ in range(games_played):
+        games.start_minesweeper('!bench', states)
+        games.handle_game_command('!bench', level, states, games.GAMES_MENU_ASCII, '', '')
+        while states['!bench'].get('state') == 'game_minesweeper_play':
+            game_data = states['!bench']['game_data']
+            width, height = game_data['width'], game_data['height']
+            hidden = [i for i in range(width * height) if not game_data['revealed'] >> i & 1]
+            cell = rng.choice(hidden)
+            reply = games.handle_game_command('!bench', f"{games.minesweeper.COLUMN_LETTERS[cell % width]}{cell // width + 1}",
+                                              states, games.GAMES_MENU_ASCII, '', '')
+            if states['!bench'].get('state') != 'game_minesweeper_play':
+                break   # The end-of-game reply always shows the whole board
+            sent.append(len(reply.encode('utf-8')))
+            packets.append(len(pack_message(reply)))
+            full.append(len(games._minesweeper_board(game_data).encode('utf-8')))
+    return {'level': f"{width}x{height}", 'moves': len(sent), 'sent_mean': statistics.mean(sent),
+            'sent_max': max(sent), 'full_mean': statistics.mean(full),
+            'single_packet': sum(1 for count in packets if count == 1) / len(packets), 'max_packets': max(packets)}
+
+
+def run_minesweeper(args):
+    print(f"Minesweeper reveals, mine density {args.density}")
+    print(f"{'board':>11} {'mines':>8} {'opened':>8} {'place ms':>9} {'first ms':>9} "
+          f"{'per-cell ms':>12} {'counts ms':>10} {'move p50 ms':>12}")
+    for row in bench_minesweeper(args.sides, args.density, args.moves):
+        print(f"{row['side']:>5}x{row['side']:<5} {row['mines']:>8} {row['opened']:>8} {row['place_ms']:>9.2f} "
+              f"{row['first_ms']:>9.2f} {row['reference_ms']:>12.2f} {row['counts_ms']:>10.2f} {row['move_p50_ms']:>12.3f}")
+    replies = bench_minesweeper_replies(args.games)
+    print(f"\nReplies while playing {replies['level']} ({replies['moves']} moves): "
+          f"{replies['sent_mean']:.0f} bytes on average (max {replies['sent_max']}), "
+          f"full board {replies['full_mean']:.0f} bytes; "
+          f"{replies['single_packet']:.0%} fit one packet, never more than {replies['max_packets']}")
+
+
+# --- REGRESSION SUITE ---
+#
+# Fixed set of hot-path timings, reported as microseconds per operation (lower is better)
+# and written as JSON so runs can be compared against a saved baseline:
+#
+#   python3 benchmarks.py suite --json baseline.json      (before a change)
+#   python3 benchmarks.py suite --compare baseline.json   (after it)
+
+SUITE = []   # [(group, function(args) -> {name: us per op})]
+SUITE_LONG_MESSAGE = "\n".join(f"Line {i}: " + "lorem ipsum dolor sit amet " * (1 + i % 4) for i in range(40))
+
+
+def suite_benchmark(group):
+    """Registers a suite function under `group` (its results are named group.<name>)."""
+    def register(func):
+        SUITE.append((group, func))
+        return func
+    return register
+
+
+def time_per_op(func, number, repeats=5):
+    """Best of `repeats` runs of `number` calls, in microseconds per call (GC paused, like timeit)."""
+    best = None
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best / number * 1e6
+
+
+@contextlib.contextmanager
+def bbs_under_test(tmp, board_size=20):
+    """Points auto_responder at a fresh board in tmp, with sending and console logging stubbed out."""
+    import auto_responder
+    saved = (auto_responder.outbound_scheduler, auto_responder.bbs_data_handler, auto_responder.page_cache)
+    with quiet():
+        bbs = BBSData(page_size=4, data_file=os.path.join(tmp, 'bbs_messages.json'))
+        for i in range(board_size):
+            bbs.post_message(TOPIC_KEYS[i % len(TOPIC_KEYS)], f"Bench post {i}", "Benchmark body text. " * 10, user_id='!bench001')
+    auto_responder.attach_data_handler(bbs)
+    auto_responder.outbound_scheduler = _NullScheduler()
+    auto_responder.print = _no_print
+    try:
+        yield auto_responder
+    finally:
+        auto_responder.outbound_scheduler, auto_responder.bbs_data_handler, auto_responder.page_cache = saved
+        del auto_responder.print
+        bbs.close()
+
+
+@suite_benchmark('chunking')
+def suite_chunking(args):
+    from render_cache import RenderCache
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, bbs_under_test(tmp) as ar:
+        menu = ar.BBS_SECTION_MENU_ASCII
+        results['split_menu'] = time_per_op(lambda: ar.split_into_chunks(menu), 2000)
+        results['split_long_message'] = time_per_op(lambda: ar.split_into_chunks(SUITE_LONG_MESSAGE), 500)
+        # A zero-byte cache never stores anything, so every call splits (cold path)
+        ar.page_cache = RenderCache(max_bytes=0)
+        results['chunk_and_send_cold'] = time_per_op(lambda: ar.chunk_and_send(None, '!bench', SUITE_LONG_MESSAGE), 500)
+        ar.page_cache = RenderCache()
+        results['chunk_and_send_cached'] = time_per_op(lambda: ar.chunk_and_send(None, '!bench', SUITE_LONG_MESSAGE), 2000)
+    return results
+
+
+@suite_benchmark('dispatch')
+def suite_dispatch(args):
+    packets = 2000 if args.quick else 10000
+    return {name: row['us_per_packet'] for name, row in bench_dispatch(packets, repeats=3).items()}
+
+
+@suite_benchmark('render')
+def suite_render(args):
+    from render_cache import RenderCache
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, bbs_under_test(tmp, board_size=200) as ar:
+        ar.USER_STATES.create('!bench')
+        msg_id = ar.bbs_data_handler.get_page('G', 0)[0]['id']
+        ar.page_cache = RenderCache(max_bytes=0)
+        results['subject_list_cold'] = time_per_op(lambda: ar.handle_read_subject_list('!bench', 'G', 3), 2000)
+        results['full_message_cold'] = time_per_op(lambda: ar.handle_read_full_message('G', msg_id), 2000)
+        results['activity_summary_cold'] = time_per_op(ar.handle_activity_summary, 2000)
+        ar.page_cache = RenderCache()
+        results['subject_list_cached'] = time_per_op(lambda: ar.handle_read_subject_list('!bench', 'G', 3), 5000)
+        results['full_message_cached'] = time_per_op(lambda: ar.handle_read_full_message('G', msg_id), 5000)
+        ar.USER_STATES.pop('!bench', None)
+    return results
+
+
+@suite_benchmark('storage')
+def suite_storage(args):
+    """json storage: reopening an existing board (load_data) and save_data, per board size."""
+    results = {}
+    sizes = [size for size in args.sizes if size <= 10000] if args.quick else args.sizes
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp, quiet():
+            data_file = os.path.join(tmp, 'bbs_messages.json')
+            write_board(data_file, size)
+            BBSData(data_file=data_file).close()   # First open builds and saves the search index
+            repeats = 3 if size >= 100000 else 5
+            bbs = BBSData(data_file=data_file)
+            results[f'load_{size}'] = time_per_op(bbs.load_data, 1, repeats)
+            results[f'save_{size}'] = time_per_op(bbs.save_data, 1, repeats)
+            bbs.close()
+    return results
+
+
+@suite_benchmark('games')
+def suite_games(args):
+    import games
+    rng = random.Random(5)
+    deck = games.create_and_shuffle_deck()
+    hands = [bytearray(rng.choice(deck) for _ in range(rng.randint(2, 5))) for _ in range(1000)]
+    results = {
+        'get_hand_value': time_per_op(lambda: [games.get_hand_value(hand) for hand in hands], 20) / len(hands),
+        'shuffle_deck': time_per_op(games.create_and_shuffle_deck, 2000),
+    }
+
+    # One full round per call: bet, stand, then New Game back to the betting prompt
+    states = {'!bench': {}}
+    games.print = _no_print
+    try:
+        games.start_blackjack('!bench', states, games.GAMES_MENU_ASCII, '', '')
+        def play_round():
+            states['!bench']['game_data']['chips'] = 10 ** 9
+            for command in ('10', 'S', 'N'):
+                games.handle_game_command('!bench', command, states, games.GAMES_MENU_ASCII, '', '')
+        results['blackjack_round'] = time_per_op(play_round, 2000)
+    finally:
+        del games.print
+
+    poker_hands = [bytes(rng.sample(range(len(games.CARD_NAMES)), 5)) for _ in range(1000)]
+    results['poker_evaluate'] = time_per_op(lambda: [games.evaluate_poker_hand(hand) for hand in poker_hands], 20) / len(poker_hands)
+
+    # First reveal (flood fill) on the largest offered board
+    width, height, mine_count = games.minesweeper.LEVELS['3']
+    start = width * height // 2 + width // 2
+    mines = games.minesweeper.place_mines(width, height, mine_count, start, rng)
+    results['minesweeper_reveal'] = time_per_op(lambda: games.minesweeper.reveal(start, mines, 0, 0, width, height), 2000)
+    return results
+
+
+def run_suite_benchmarks(args):
+    results = {}
+    for group, func in SUITE:
+        if args.only and not any(group.startswith(prefix) for prefix in args.only):
+            continue
+        print(f"Running {group}...", file=sys.stderr)
+        for name, value in func(args).items():
+            results[f"{group}.{name}"] = value
+    return results
+
+
+def suite_metadata():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'git_revision': revision,
+        'unit': 'us_per_op',
+    }
+
+
+def compare_results(baseline, results, threshold):
+    """Returns rows of (name, baseline, current, ratio, verdict) for every benchmark in either run."""
+    rows = []
+    for name in sorted(set(baseline) | set(results)):
+        old, new = baseline.get(name), results.get(name)
+        if old is None or new is None:
+            rows.append((name, old, new, None, 'new' if old is None else 'missing'))
+            continue
+        ratio = new / old if old else float('inf')
+        verdict = 'REGRESSION' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else 'same'
+        rows.append((name, old, new, ratio, verdict))
+    return rows
+
+
+def run_suite(args):
+    results = run_suite_benchmarks(args)
+    report = {'meta': suite_metadata(), 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {len(results)} results to {args.json}", file=sys.stderr)
+
+    if not args.compare:
+        if not args.json:
+            print(json.dumps(report, indent=2, sort_keys=True))
+        return
+
+    with open(args.compare) as f:
+        baseline = json.load(f)['results']
+    rows = compare_results(baseline, results, args.threshold)
+    print(f"\n{'benchmark':<40} {'baseline us':>12} {'current us':>12} {'ratio':>7}  verdict")
+    for name, old, new, ratio, verdict in rows:
+        old_text = f"{old:.2f}" if old is not None else "-"
+        new_text = f"{new:.2f}" if new is not None else "-"
+        ratio_text = f"{ratio:.2f}" if ratio is not None else "-"
+        print(f"{name:<40} {old_text:>12} {new_text:>12} {ratio_text:>7}  {verdict}")
+    regressions = [row[0] for row in rows if row[4] == 'REGRESSION']
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}.")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+# --- COMMAND LINE ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesh-BBS micro-benchmarks.")
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    journal = sub.add_parser('journal', help="Post latency of journal vs json storage as the board grows.")
+    journal.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 500000])
+    journal.add_argument('--posts', type=int, default=200)
+    journal.set_defaults(func=run_journal)
+
+    storage = sub.add_parser('storage', help="Open time, held memory and page reads of json vs sqlite storage.")
+    storage.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    storage.set_defaults(func=run_storage)
+
+    archive = sub.add_parser('archive', help="Open time, held memory and page reads with and without a retention policy.")
+    archive.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    archive.add_argument('--keep', type=int, default=200, help="Posts kept in memory per topic.")
+    archive.set_defaults(func=run_archive)
+
+    dispatch = sub.add_parser('dispatch', help="onReceive routing cost per packet, by command type.")
+    dispatch.add_argument('--packets', type=int, default=20000)
+    dispatch.set_defaults(func=run_dispatch)
+
+    search = sub.add_parser('search', help="Search index build, reopen and query time as the board grows.")
+    search.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    search.set_defaults(func=run_search)
+
+    concurrency = sub.add_parser('concurrency', help="Interleaved posting from many nodes on the worker pool; checks order and authorship.")
+    concurrency.add_argument('--nodes', type=int, default=50)
+    concurrency.add_argument('--posts', type=int, default=10)
+    concurrency.add_argument('--workers', type=int, nargs='+', default=[0, 4, 8])
+    concurrency.add_argument('--storage', choices=bbs_data_manager.STORAGE_MODES, default='json')
+    concurrency.set_defaults(func=run_concurrency)
+
+    blackjack = sub.add_parser('blackjack', help="Blackjack game state memory per session and rounds per second.")
+    blackjack.add_argument('--sessions', type=int, default=1000)
+    blackjack.add_argument('--rounds', type=int, default=20000)
+    blackjack.set_defaults(func=run_blackjack)
+
+    poker = sub.add_parser('poker', help="Video Poker evaluator over all 2,598,960 hands, checked against the known counts.")
+    poker.add_argument('--reference-hands', type=int, default=200000, help="Hands timed with the sort-and-compare reference.")
+    poker.set_defaults(func=run_poker)
+
+    mines = sub.add_parser('minesweeper', help="Minesweeper reveal and flood-fill time on large boards, and reply sizes in play.")
+    mines.add_argument('--sides', type=int, nargs='+', default=[16, 64, 256, 1024], help="Board side lengths.")
+    mines.add_argument('--density', type=float, default=0.1, help="Share of cells that are mines.")
+    mines.add_argument('--moves', type=int, default=100, help="Random reveals timed after the first one.")
+    mines.add_argument('--games', type=int, default=200, help="Games played for the reply sizes.")
+    mines.set_defaults(func=run_minesweeper)
+
+    suite = sub.add_parser('suite', help="Hot-path regression suite with JSON output and baseline comparison.")
+    suite.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Board sizes for load/save.")
+    suite.add_argument('--quick', action='store_true', help="Fewer iterations and no 100k board.")
+    suite.add_argument('--only', nargs='+', metavar='GROUP', help="Run only these groups (chunking, dispatch, render, storage, games).")
+    suite.add_argument('--json', metavar='PATH', help="Write the results to PATH.")
+    suite.add_argument('--compare', metavar='BASELINE', help="Compare against a JSON file written by --json.")
+    suite.add_argument('--threshold', type=float, default=0.10, help="Slowdown ratio reported as a regression (default 0.10).")
+    suite.add_argument('--fail-on-regression', action='store_true', help="Exit with status 1 if any benchmark regressed.")
+    suite.set_defaults(func=run_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
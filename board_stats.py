@@ -0,0 +1,67 @@
+# board_stats.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import time
+
+SECONDS_PER_DAY = 86400
+
+
+class PostCounter:
+    """Running totals for one topic or one poster."""
+    __slots__ = ('total', 'first_post', 'last_post')
+
+    def __init__(self):
+        self.total = 0
+        self.first_post = None
+        self.last_post = None
+
+    def add(self, timestamp, count=1, first_post=None):
+        self.total += count
+        first_post = timestamp if first_post is None else first_post
+        if self.first_post is None or first_post < self.first_post:
+            self.first_post = first_post
+        if self.last_post is None or timestamp > self.last_post:
+            self.last_post = timestamp
+
+    def posts_per_day(self, now=None):
+        """Average posts per day since the first post (at least one day)."""
+        if not self.total:
+            return 0.0
+        now = time.time() if now is None else now
+        days = max(1.0, (now - self.first_post) / SECONDS_PER_DAY)
+        return self.total / days
+
+
+class BoardStats:
+    """
+    Live board counters kept by BBSData: totals per topic and per poster, the newest post
+    and the most active poster. Rebuilt once at load and updated on every post, so the
+    Activity Summary never has to walk the message lists.
+    """
+    def __init__(self, topics):
+        self.topics = {topic_id: PostCounter() for topic_id in topics}
+        self.posters = {}
+        self.total = 0
+        self.newest = None        # (topic_id, message) of the most recent post
+        self.most_active = None   # user_id with the most posts
+
+    def record(self, topic_id, message):
+        """Counts one new post."""
+        self._add(topic_id, message['user_id'], message['timestamp'])
+        if self.newest is None or message['id'] >= self.newest[1]['id']:
+            self.newest = (topic_id, message)
+
+    def record_aggregate(self, topic_id, user_id, count, first_post, last_post):
+        """Adds pre-aggregated counts (used by the SQLite rebuild)."""
+        self._add(topic_id, user_id, last_post, count, first_post)
+
+    def _add(self, topic_id, user_id, timestamp, count=1, first_post=None):
+        self.topics.setdefault(topic_id, PostCounter()).add(timestamp, count, first_post)
+        poster = self.posters.get(user_id)
+        if poster is None:
+            poster = self.posters[user_id] = PostCounter()
+        poster.add(timestamp, count, first_post)
+        self.total += count
+        # Counts only ever grow, so the leader can be tracked without a scan
+        if self.most_active is None or poster.total > self.posters[self.most_active].total:
+            self.most_active = user_id
@@ -0,0 +1,229 @@
+# chip_bank.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import heapq
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+
+# --- CONFIGURATION & CONSTANTS ---
+CHIP_BANK_FILE = 'bbs_chips.json'
+DEFAULT_STARTING_CHIPS = 100
+FLUSH_INTERVAL = 30      # Seconds a changed balance may wait before it is written
+FLUSH_BATCH = 25         # Changed balances that trigger a write straight away
+LEADERBOARD_SIZE = 10
+LEADERBOARD_SLACK = 10   # Extra ranked players kept so someone dropping out rarely forces a rescan
+
+
+class Leaderboard:
+    """
+    The best balances in order, updated on every change instead of sorted on every view.
+
+    Holds the top size + slack players as a sorted list of (-chips, node_id); a change is
+    a bisect delete and insort. Only when enough listed players fall below the untracked
+    ones that fewer than `size` are left is the list refilled from all balances.
+    """
+    def __init__(self, size=LEADERBOARD_SIZE, slack=LEADERBOARD_SLACK):
+        self.size = size
+        self.capacity = size + slack
+        self._entries = []      # Sorted (-chips, node_id), best first
+        self._listed = {}       # {node_id: chips} of the listed players
+        self._complete = True   # Every player with a balance is listed
+        self.rebuilds = 0
+
+    def update(self, node_id, chips, balances):
+        """Moves node_id to its new place. balances is the full {node_id: chips} (already updated)."""
+        old = self._listed.pop(node_id, None)
+        if old is not None:
+            del self._entries[bisect_left(self._entries, (-old, node_id))]
+        key = (-chips, node_id)
+        if self._complete or (self._entries and key < self._entries[-1]):
+            insort(self._entries, key)
+            self._listed[node_id] = chips
+            while len(self._entries) > self.capacity:
+                _, dropped = self._entries.pop()
+                del self._listed[dropped]
+                self._complete = False
+        if len(self._entries) < self.size and not self._complete:
+            self.rebuild(balances)
+
+    def rebuild(self, balances):
+        self._entries = heapq.nsmallest(self.capacity, ((-chips, node_id) for node_id, chips in balances.items()))
+        self._listed = {node_id: -negative for negative, node_id in self._entries}
+        self._complete = len(balances) <= self.capacity
+        self.rebuilds += 1
+
+    def top(self, count=None):
+        """Returns [(node_id, chips)] of the best `count` (default size) players."""
+        return [(node_id, -negative) for negative, node_id in self._entries[:count or self.size]]
+
+    def rank(self, node_id):
+        """1-based place of a listed player, or None if they are outside the tracked top."""
+        chips = self._listed.get(node_id)
+        if chips is None:
+            return None
+        return bisect_left(self._entries, (-chips, node_id)) + 1
+
+
+class ChipBank:
+    """
+    Per-node chip balances that outlive sessions and restarts.
+
+    Balances are kept in memory and written behind: a background thread rewrites the file
+    (atomically) once FLUSH_BATCH balances have changed, or every FLUSH_INTERVAL seconds
+    while there are unsaved changes, and close() writes whatever is left. A crash loses
+    at most that window of hands. Without a path the bank is memory only.
+    """
+    def __init__(self, path=None, starting_chips=DEFAULT_STARTING_CHIPS,
+                 flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        self.starting_chips = starting_chips
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.path = None
+        self._lock = threading.Lock()
+        self._balances = {}     # {node_id: chips}
+        self._dirty = 0         # Changes since the last write
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.leaderboard = Leaderboard()
+        self.stats = {'updates': 0, 'writes': 0}
+        if path:
+            self.open(path)
+
+    def open(self, path):
+        """Loads the balances saved at path (keeping any already held) and writes there from now on."""
+        loaded = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    loaded = json.load(f).get('balances', {})
+                print(f"Chip Bank: Loaded {len(loaded)} balances from {path}")
+            except (json.JSONDecodeError, IOError, AttributeError) as e:
+                print(f"Chip Bank: Error loading {path} ({e}). Starting with an empty bank.")
+                loaded = {}
+        with self._lock:
+            self.path = path
+            for node_id, chips in loaded.items():
+                self._balances.setdefault(node_id, int(chips))
+            self._dirty = sum(1 for node_id, chips in self._balances.items() if loaded.get(node_id) != chips)
+            self.leaderboard.rebuild(self._balances)
+
+    def get(self, node_id):
+        """Returns the node's balance (starting_chips for a new player)."""
+        with self._lock:
+            return self._balances.get(node_id, self.starting_chips)
+
+    def set(self, node_id, chips):
+        """Records a new balance; it reaches the file with the next batch."""
+        with self._lock:
+            if self._balances.get(node_id) == chips:
+                return
+            self._balances[node_id] = chips
+            self.leaderboard.update(node_id, chips, self._balances)
+            self.stats['updates'] += 1
+            self._dirty += 1
+            if self.path:
+                self._start_locked()
+                if self._dirty >= self.flush_batch:
+                    self._wake.set()
+
+    def top(self, count=None):
+        with self._lock:
+            return self.leaderboard.top(count)
+
+    def rank(self, node_id):
+        with self._lock:
+            return self.leaderboard.rank(node_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._balances)
+
+    def unsaved(self):
+        with self._lock:
+            return self._dirty if self.path else 0
+
+    # --- WRITE-BEHIND ---
+
+    def _start_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="bbs-chip-bank", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Sleep until a batch is full or the interval has passed
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes the balances if any changed, through a temporary file and an atomic rename."""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            snapshot = dict(self._balances)
+            dirty, self._dirty = self._dirty, 0
+        tmp_file = self.path + '.tmp'
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump({'balances': snapshot}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.path)
+            with self._lock:
+                self.stats['writes'] += 1
+        except OSError as e:
+            print(f"Chip Bank: Error saving {self.path}: {e}")
+            with self._lock:
+                self._dirty += dirty   # Retried with the next batch
+
+    def close(self):
+        """Stops the writer thread and writes any unsaved balances."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    import random
+    import tempfile
+
+    rng = random.Random(22)
+    board = Leaderboard(size=5, slack=3)
+    balances = {}
+    for step in range(20000):
+        node_id = f"!{rng.randrange(60):08x}"
+        balances[node_id] = max(0, balances.get(node_id, 100) + rng.randint(-40, 40))
+        board.update(node_id, balances[node_id], balances)
+        if step % 97 == 0:
+            expected = sorted(balances.items(), key=lambda item: (-item[1], item[0]))[:5]
+            assert board.top() == expected, (step, board.top(), expected)
+    print(f"Leaderboard matches a full sort through 20000 updates ({board.rebuilds} rescans)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, CHIP_BANK_FILE)
+        bank = ChipBank(path, flush_interval=60, flush_batch=3)
+        assert bank.get('!a') == DEFAULT_STARTING_CHIPS
+        bank.set('!a', 150)
+        bank.set('!b', 90)
+        assert not os.path.exists(path), "nothing written before a batch is full"
+        bank.set('!c', 400)
+        for _ in range(50):
+            if bank.stats['writes']:
+                break
+            threading.Event().wait(0.01)
+        assert bank.stats['writes'] == 1 and os.path.exists(path)
+        bank.set('!a', 10)
+        bank.close()
+        reopened = ChipBank(path)
+        assert reopened.get('!a') == 10 and reopened.top() == [('!c', 400), ('!b', 90), ('!a', 10)]
+        assert reopened.rank('!b') == 2
+        print(f"ChipBank OK: {bank.stats}")
@@ -0,0 +1,90 @@
+# dedupe_cache.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import threading
+import time
+from collections import OrderedDict
+
+# --- CONFIGURATION & CONSTANTS ---
+# How long a handled packet is remembered. Rebroadcasts arrive within seconds and client
+# retries within a minute or two, so ten minutes covers both with room to spare.
+DEFAULT_DEDUPE_WINDOW = 600
+DEFAULT_DEDUPE_ENTRIES = 2048   # Oldest packets are forgotten first beyond this
+
+
+class DedupeCache:
+    """
+    Remembers recently handled text packets by (packet id, sender) for a time window.
+
+    claim() is called as each packet arrives and tells a first copy from a duplicate
+    (rebroadcasts and client retries reuse the packet id). The reply sent for a packet is
+    attached later with store_reply(), so a duplicate can be answered from the cache
+    without running its handler again. Entries expire after `window` seconds and the
+    oldest are dropped once `max_entries` are held.
+    """
+    def __init__(self, window=DEFAULT_DEDUPE_WINDOW, max_entries=DEFAULT_DEDUPE_ENTRIES, clock=time.monotonic):
+        self.window = window
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {(packet id, fromId): [first seen, reply packets or None]}
+        self.stats = {'packets': 0, 'duplicates': 0, 'expired': 0, 'evicted': 0}
+
+    def claim(self, packet_id, fromId):
+        """Records a packet. Returns True for its first copy, False for a duplicate."""
+        now = self.clock()
+        key = (packet_id, fromId)
+        with self._lock:
+            self._expire_locked(now)
+            self.stats['packets'] += 1
+            if key in self._entries:
+                self.stats['duplicates'] += 1
+                return False
+            self._entries[key] = [now, None]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evicted'] += 1
+            return True
+
+    def store_reply(self, packet_id, fromId, packets):
+        """Attaches the packets sent in reply to a claimed packet."""
+        with self._lock:
+            entry = self._entries.get((packet_id, fromId))
+            if entry is not None:
+                entry[1] = list(packets)
+
+    def cached_reply(self, packet_id, fromId):
+        """Returns the reply packets stored for a packet, or None."""
+        with self._lock:
+            entry = self._entries.get((packet_id, fromId))
+            return entry[1] if entry is not None else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _expire_locked(self, now):
+        # Entries are in arrival order, so expired ones are always at the front
+        cutoff = now - self.window
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] > cutoff:
+                break
+            del self._entries[key]
+            self.stats['expired'] += 1
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    now = [0.0]
+    cache = DedupeCache(window=60, max_entries=3, clock=lambda: now[0])
+    assert cache.claim(101, '!a') and not cache.claim(101, '!a')
+    assert cache.claim(101, '!b'), "same id from another node is a different packet"
+    cache.store_reply(101, '!a', ["reply"])
+    assert cache.cached_reply(101, '!a') == ["reply"] and cache.cached_reply(101, '!b') is None
+    now[0] = 61.0
+    assert cache.claim(101, '!a'), "expired after the window"
+    for packet_id in (1, 2, 3, 4):
+        cache.claim(packet_id, '!c')
+    assert len(cache) == 3 and cache.claim(1, '!c'), "oldest evicted at capacity"
+    print(f"DedupeCache OK: {cache.stats}")
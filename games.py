@@ -1,20 +1,43 @@
 # games.py (Blackjack Implementation - FINAL with Manual Betting & Q to Games Menu)
 
 import random
+import threading
+from itertools import combinations_with_replacement
+
+import minesweeper
+from chip_bank import ChipBank
 
 # --- GAME CONSTANTS & CONFIGURATION ---
 CARDS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
 SUITS = ['C', 'D', 'H', 'S'] 
 STARTING_CHIPS = 100 
+SHOE_DECKS = 6               # Decks in the Blackjack shoe shared by every player
+SHOE_PENETRATION = 0.75      # Share of the shoe dealt before the cut card comes out
+DEALER_STANDS_ON = 17        # The dealer draws below this total and stands on every 17, soft or hard
+BLACKJACK_PAYS = 1.5         # A natural wins 3:2 (rounded down to whole chips)
 # -------------------------------------
 
+# --- CARD ENCODING ---
+# A card is one small int, rank * 4 + suit (0-51), so a shoe or a hand is a bytearray.
+CARD_NAMES = tuple(rank for rank in CARDS for suit in SUITS)  # Display name of each card
+ACE_CARDS = CARDS.index('A') * 4     # Cards from here up are aces
+# Blackjack points of each card with aces as 1, as a bytes.translate() table
+_POINTS = bytes(min(CARDS.index(name) + 2, 10) if name != 'A' else 1 for name in CARD_NAMES)
+_POINTS_TABLE = _POINTS + bytes(256 - len(_POINTS))
+# Hand value by hard total (aces as 1): with an ace in the hand one of them counts 11 if
+# that stays at 21 or under (a soft hand). Index [hard total][holds an ace].
+MAX_TABLE_TOTAL = 31
+HAND_VALUES = tuple((hard, hard + 10 if hard <= 11 else hard) for hard in range(MAX_TABLE_TOTAL + 1))
+
 # --- NEW: GAMES MENU CONSTANT ---
 GAMES_MENU_ASCII = """
 -=( Games Center )=-
 ----------------------------------
 
 [B] Blackjack
-[V] Video Poker (Coming Soon!)
+[V] Video Poker
+[W] Minesweeper
+[L] Chip Leaderboard
 
 [M] Back to Main Menu
 
@@ -23,37 +46,152 @@ GAMES_MENU_ASCII = """
 
 # --- BLACKJACK HELPER FUNCTIONS ---
 
-def create_and_shuffle_deck():
-    """Creates a new 52-card deck and shuffles it."""
-    deck = [c for c in CARDS for s in SUITS] 
-    random.shuffle(deck)
+def create_and_shuffle_deck(decks=1, rng=random):
+    """Creates `decks` 52-card decks of encoded cards, shuffled together in a bytearray."""
+    deck = bytearray(range(len(CARD_NAMES))) * decks
+    rng.shuffle(deck)
     return deck
 
 def get_hand_value(hand):
-    """Calculates the value of a Blackjack hand, handling Aces (1 or 11)."""
-    value = 0
-    num_aces = 0
-    
-    for card in hand:
-        # Check for 10, Jack, Queen, or King (all value 10)
-        if card in ('10', 'J', 'Q', 'K'):
-            value += 10
-        elif card == 'A':
-            value += 11
-            num_aces += 1
+    """Calculates the value of a Blackjack hand of encoded cards, handling Aces (1 or 11)."""
+    cards = hand if isinstance(hand, (bytes, bytearray)) else bytes(hand)
+    hard = sum(cards.translate(_POINTS_TABLE))
+    if hard > MAX_TABLE_TOTAL:
+        return hard
+    return HAND_VALUES[hard][bool(cards) and max(cards) >= ACE_CARDS]
+
+def format_hand(hand):
+    """Shows a hand the way players see it, e.g. ['10', 'A']."""
+    return str([CARD_NAMES[card] for card in hand])
+
+
+class Shoe:
+    """
+    Multi-deck shoe shared by every Blackjack player. Cards are dealt from the end of a
+    bytearray; once the cut card is reached the shoe is reshuffled before the next round,
+    instead of building and shuffling a fresh deck for every hand.
+    """
+    def __init__(self, decks=SHOE_DECKS, penetration=SHOE_PENETRATION, rng=random):
+        self.decks = decks
+        self.rng = rng
+        self.cut = int(decks * len(CARD_NAMES) * (1 - penetration))   # Cards left when the cut card shows
+        self.shuffles = 0
+        self._lock = threading.Lock()
+        self._cards = bytearray()
+        self._shuffle_locked()
+
+    def _shuffle_locked(self):
+        self._cards = create_and_shuffle_deck(self.decks, self.rng)
+        self.shuffles += 1
+
+    def start_round(self):
+        """Reshuffles if the cut card came out during the last round."""
+        with self._lock:
+            if len(self._cards) <= self.cut:
+                self._shuffle_locked()
+
+    def deal(self, count=1):
+        """Deals `count` cards as a bytearray (a new hand)."""
+        with self._lock:
+            if len(self._cards) < count:
+                self._shuffle_locked()   # Only if a round outlasts the cut card
+            hand = self._cards[-count:]
+            del self._cards[-count:]
+            return hand
+
+    def draw(self):
+        """Deals one card."""
+        with self._lock:
+            if not self._cards:
+                self._shuffle_locked()
+            return self._cards.pop()
+
+    def __len__(self):
+        return len(self._cards)
+
+
+# The table's shoe: it lasts across hands and players, so a session holds only its hands
+BLACKJACK_SHOE = Shoe()
+
+# Every player's chips, kept across games, sessions and (once auto_responder opens its
+# file) restarts. game_data['chips'] is the working copy during a hand.
+CHIP_BANK = ChipBank(starting_chips=STARTING_CHIPS)
+
+
+def format_leaderboard(fromId, count=None):
+    """The chip leaderboard, with the asking player's own balance (and place) underneath."""
+    lines = ["-=( Chip Leaderboard )=-"]
+    top = CHIP_BANK.top(count)
+    for place, (node_id, chips) in enumerate(top, 1):
+        marker = " <" if node_id == fromId else ""
+        lines.append(f"{place:>2}. {node_id[-4:]} {chips}{marker}")
+    if not top:
+        lines.append("No chips won or lost yet.")
+    rank = CHIP_BANK.rank(fromId)
+    place = f" (#{rank})" if rank else ""
+    lines.append(f"You: {CHIP_BANK.get(fromId)} chips{place}")
+    return "\n".join(lines)
+
+# --- VIDEO POKER HAND EVALUATOR ---
+# Jacks or Better. A hand is classified by table lookup, not by sorting and comparing:
+# every rank gets a prime, so the product of a hand's five primes identifies its ranks
+# (with repeats) uniquely. Flushes are looked up by the 13-bit mask of their ranks instead.
+# Both tables are built once at import from all 6175 possible rank combinations.
+
+POKER_HANDS = ('No Win', 'Jacks or Better', 'Two Pair', 'Three of a Kind', 'Straight',
+               'Flush', 'Full House', 'Four of a Kind', 'Straight Flush', 'Royal Flush')
+(NO_WIN, JACKS_OR_BETTER, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT,
+ FLUSH, FULL_HOUSE, FOUR_OF_A_KIND, STRAIGHT_FLUSH, ROYAL_FLUSH) = range(len(POKER_HANDS))
+POKER_PAYOUTS = (0, 1, 2, 3, 4, 6, 9, 25, 50, 800)   # Full-pay 9/6 table: chips returned per chip bet
+RANK_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+_CARD_PRIMES = tuple(RANK_PRIMES[card >> 2] for card in range(len(CARD_NAMES)))
+_CARD_BITS = tuple(1 << (card >> 2) for card in range(len(CARD_NAMES)))
+
+
+def _build_poker_tables():
+    """Returns (flush table indexed by rank mask, {prime product: hand} for everything else)."""
+    broadway = 0b1111100000000
+    straights = {broadway >> shift for shift in range(9)} | {0b1000000001111}   # A-2-3-4-5 counts too
+    flushes = bytearray(1 << len(CARDS))
+    products = {}
+    for ranks in combinations_with_replacement(range(len(CARDS)), 5):
+        counts = sorted((ranks.count(rank) for rank in set(ranks)), reverse=True)
+        if counts[0] > len(SUITS):
+            continue
+        product = 1
+        for rank in ranks:
+            product *= RANK_PRIMES[rank]
+        if counts[0] == 1:
+            mask = sum(1 << rank for rank in ranks)
+            straight = mask in straights
+            products[product] = STRAIGHT if straight else NO_WIN
+            flushes[mask] = (ROYAL_FLUSH if mask == broadway else STRAIGHT_FLUSH) if straight else FLUSH
+        elif counts[0] == 4:
+            products[product] = FOUR_OF_A_KIND
+        elif counts[0] == 3:
+            products[product] = FULL_HOUSE if counts[1] == 2 else THREE_OF_A_KIND
+        elif counts[1] == 2:
+            products[product] = TWO_PAIR
         else:
-            # All other cards (2-9) are numeric
-            try:
-                value += int(card)
-            except ValueError:
-                print(f"ERROR: Invalid card '{card}' found in hand!")
-            
-    # Adjust for Aces if the value is over 21
-    while value > 21 and num_aces > 0:
-        value -= 10 # Change Ace from 11 to 1
-        num_aces -= 1
-        
-    return value
+            pair = max(ranks, key=ranks.count)
+            products[product] = JACKS_OR_BETTER if pair >= CARDS.index('J') else NO_WIN
+    return bytes(flushes), products
+
+
+_FLUSH_TABLE, _PRODUCT_TABLE = _build_poker_tables()
+
+
+def evaluate_poker_hand(hand):
+    """Returns the POKER_HANDS index of five encoded cards."""
+    a, b, c, d, e = hand
+    if not ((a ^ b) | (a ^ c) | (a ^ d) | (a ^ e)) & 3:    # All one suit
+        return _FLUSH_TABLE[_CARD_BITS[a] | _CARD_BITS[b] | _CARD_BITS[c] | _CARD_BITS[d] | _CARD_BITS[e]]
+    return _PRODUCT_TABLE[_CARD_PRIMES[a] * _CARD_PRIMES[b] * _CARD_PRIMES[c] * _CARD_PRIMES[d] * _CARD_PRIMES[e]]
+
+
+def format_poker_hand(hand):
+    """Numbered cards with suits, e.g. 1:10H 2:JD 3:JS 4:4C 5:9H."""
+    return " ".join(f"{i}:{CARD_NAMES[card]}{SUITS[card & 3]}" for i, card in enumerate(hand, 1))
 
 # --- BLACKJACK GAME LOGIC ---
 
@@ -63,8 +201,8 @@ def start_blackjack(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGO
     """
     state_data = USER_STATES[fromId]
     
-    # Retrieve chips or initialize to the STARTING_CHIPS value (100)
-    chips = state_data.get('game_data', {}).get('chips', STARTING_CHIPS)
+    # Chips come from the bank (STARTING_CHIPS for a new player)
+    chips = CHIP_BANK.get(fromId)
     
     # Store initial/updated game state for betting
     state_data['state'] = 'game_blackjack_betting'
@@ -73,9 +211,8 @@ def start_blackjack(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGO
     # Initialize game data structure if it doesn't exist (e.g., first time loading game)
     if 'game_data' not in state_data:
         state_data['game_data'] = {
-            'deck': [], 
-            'player_hand': [],
-            'dealer_hand': [],
+            'player_hand': bytearray(),
+            'dealer_hand': bytearray(),
             'chips': chips, 
             'bet': 0, 
         }
@@ -90,7 +227,9 @@ def start_blackjack(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGO
         if 'game_data' in state_data:
             del state_data['game_data']
         state_data['last_menu'] = 'GAMES' # Return to Games Menu!
-        return f"** YOU ARE OUT OF CHIPS! **\n{GAMES_MENU_ASCII}" # Show games menu after message
+        # The house stakes a broke player a fresh stack for next time
+        CHIP_BANK.set(fromId, STARTING_CHIPS)
+        return f"** YOU ARE OUT OF CHIPS! ** Your next game starts with {STARTING_CHIPS}.\n{GAMES_MENU_ASCII}"
 
 
     # Prompt for bet
@@ -113,7 +252,7 @@ def process_blackjack_betting(fromId, command_input, USER_STATES, GAMES_MENU_ASC
     # 1. Validate Command as a Number
     try:
         bet = int(command_input.split()[0])
-    except ValueError:
+    except (ValueError, IndexError):
         return f"Invalid input. Please enter a whole number between 1 and {chips} to bet.\n[Q] Quit to Games Menu"
 
     # 2. Validate Bet Amount
@@ -125,14 +264,13 @@ def process_blackjack_betting(fromId, command_input, USER_STATES, GAMES_MENU_ASC
         
     # 3. Valid Bet - Set State and Deal Cards
     
-    # Setup deck and deal cards
-    deck = create_and_shuffle_deck()
-    player_hand = [deck.pop(), deck.pop()]
-    dealer_hand = [deck.pop(), deck.pop()]
+    # Deal from the table's shoe
+    BLACKJACK_SHOE.start_round()
+    player_hand = BLACKJACK_SHOE.deal(2)
+    dealer_hand = BLACKJACK_SHOE.deal(2)
     player_value = get_hand_value(player_hand)
 
     # Update game_data with the new hand and bet
-    game_data['deck'] = deck
     game_data['player_hand'] = player_hand
     game_data['dealer_hand'] = dealer_hand
     game_data['bet'] = bet # Store the accepted bet
@@ -149,8 +287,8 @@ def process_blackjack_betting(fromId, command_input, USER_STATES, GAMES_MENU_ASC
     reply = (
         f"** BLACKJACK (Chips: {chips}) **\n"
         f"Bet: {bet}\n"
-        f"Dealer: [{dealer_hand[0]}, ?]\n"
-        f"You: {player_hand} (Score: {player_value})\n"
+        f"Dealer: [{CARD_NAMES[dealer_hand[0]]}, ?]\n"
+        f"You: {format_hand(player_hand)} (Score: {player_value})\n"
         f"Commands: [H] Hit, [S] Stand, [Q] Quit to Games Menu"
     )
     return reply
@@ -168,22 +306,19 @@ def process_blackjack_turn(fromId, command_input, USER_STATES, GAMES_MENU_ASCII,
 
     if command == 'H':
         # Player Hits
-        if not game_data['deck']:
-            return "ERROR: Deck is empty. Cannot Hit. Use S to Stand.\n[Q] Quit to Games Menu"
-            
-        new_card = game_data['deck'].pop()
+        new_card = BLACKJACK_SHOE.draw()
         game_data['player_hand'].append(new_card)
         player_value = get_hand_value(game_data['player_hand'])
 
         if player_value > 21:
             # Player Busts - Game Over
-            return _process_blackjack_end(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII, result_message="BUST! You went over 21.")
+            return _process_blackjack_end(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
         
         # Player continues
         reply = (
-            f"You Hit and got a {new_card}.\n"
-            f"Dealer: [{game_data['dealer_hand'][0]}, ?]\n"
-            f"You: {game_data['player_hand']} (Score: {player_value})\n"
+            f"You Hit and got a {CARD_NAMES[new_card]}.\n"
+            f"Dealer: [{CARD_NAMES[game_data['dealer_hand'][0]]}, ?]\n"
+            f"You: {format_hand(game_data['player_hand'])} (Score: {player_value})\n"
             f"Commands: [H] Hit, [S] Stand, [Q] Quit to Games Menu"
         )
         return reply
@@ -203,11 +338,35 @@ def process_blackjack_turn(fromId, command_input, USER_STATES, GAMES_MENU_ASCII,
         
     else:
         player_value = get_hand_value(game_data['player_hand'])
-        return (f"Invalid command. Your hand: {game_data['player_hand']} (Score: {player_value})\n"
+        return (f"Invalid command. Your hand: {format_hand(game_data['player_hand'])} (Score: {player_value})\n"
                 f"Bet: {bet}. Use [H] Hit, [S] Stand, or [Q] Quit to Games Menu.")
 
 
-def _process_blackjack_end(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII, result_message=None, immediate_blackjack=False):
+def settle_blackjack(player_value, dealer_value, bet, player_natural=False, dealer_natural=False):
+    """
+    Returns (result text, chips paid back including the bet) for a finished hand.
+    Naturals (21 on the first two cards) are settled before totals are compared: a
+    player's natural pays 3:2 unless the dealer has one too, and a dealer's natural beats
+    any player total, 21 included.
+    """
+    if player_value > 21:
+        return "BUST! You went over 21.", 0
+    if player_natural:
+        if dealer_natural:
+            return "PUSH! (Dealer and You got Blackjack)", bet
+        return "BLACKJACK! You Win 1.5x!", bet + int(bet * BLACKJACK_PAYS)
+    if dealer_natural:
+        return "DEALER BLACKJACK!", 0
+    if dealer_value > 21:
+        return "DEALER BUSTS! YOU WIN!", bet * 2
+    if player_value > dealer_value:
+        return "YOU WIN!", bet * 2
+    if player_value < dealer_value:
+        return "DEALER WINS!", 0
+    return "PUSH (Tie).", bet
+
+
+def _process_blackjack_end(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII, immediate_blackjack=False):
     """
     Handles dealer's turn, final scoring, payout, and resets the game state.
     """
@@ -216,57 +375,32 @@ def _process_blackjack_end(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCI
     
     player_hand = game_data['player_hand']
     dealer_hand = game_data['dealer_hand']
-    deck = game_data['deck']
     
     player_value = get_hand_value(player_hand)
     dealer_value = get_hand_value(dealer_hand)
+    dealer_natural = dealer_value == 21
     bet = game_data['bet']
     
-    final_result = ""
-    payout = 0
-    
-    # 1. Dealer's Turn (only if player didn't bust immediately)
-    if player_value <= 21:
+    # 1. Dealer's Turn (not needed if the player busted or has a natural)
+    if player_value <= 21 and not immediate_blackjack:
         # Dealer must hit until 17 or more
-        while dealer_value < 17 and deck:
-            dealer_hand.append(deck.pop())
+        while dealer_value < DEALER_STANDS_ON:
+            dealer_hand.append(BLACKJACK_SHOE.draw())
             dealer_value = get_hand_value(dealer_hand)
-            
-        if dealer_value > 21:
-            final_result = "DEALER BUSTS! YOU WIN!"
-            payout = bet * 2
-        elif immediate_blackjack:
-            if dealer_value == 21:
-                final_result = "PUSH! (Dealer and You got Blackjack)"
-                payout = bet
-            else:
-                final_result = "BLACKJACK! You Win 1.5x!"
-                payout = bet + int(bet * 1.5)
-        elif player_value > dealer_value:
-            final_result = "YOU WIN!"
-            payout = bet * 2
-        elif player_value < dealer_value:
-            final_result = "DEALER WINS!"
-            payout = 0
-        else: # Tie
-            final_result = "PUSH (Tie)."
-            payout = bet
-            
-    # If player busted
-    elif player_value > 21 and result_message:
-        final_result = result_message 
-        payout = 0 
+
+    final_result, payout = settle_blackjack(player_value, dealer_value, bet, immediate_blackjack, dealer_natural)
         
-    # 2. Update Chips
+    # 2. Update Chips (the bank writes them to disk with its next batch)
     net_change = payout - bet
     game_data['chips'] += net_change
     current_chips = game_data['chips']
+    CHIP_BANK.set(fromId, current_chips)
 
     # 3. Format End Message
     end_message = (
         f"--- GAME OVER ---\n"
-        f"Dealer: {dealer_hand} (Score: {dealer_value})\n"
-        f"You: {player_hand} (Score: {player_value})\n"
+        f"Dealer: {format_hand(dealer_hand)} (Score: {dealer_value})\n"
+        f"You: {format_hand(player_hand)} (Score: {player_value})\n"
         f"\n** {final_result} **\n"
         f"Chips Change: {net_change:+}\n" 
         f"Current Chips: {current_chips}\n"
@@ -278,16 +412,276 @@ def _process_blackjack_end(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCI
     
     return end_message
 
+# --- VIDEO POKER GAME LOGIC ---
+# One hand is two exchanges: the bet deals five cards, then "H 1 3 5" holds those cards and
+# draws the rest. The bet leaves the bank when the cards are dealt; the win is paid on the draw.
+# A hand left at the hold (quit, logoff, expired session) is paid as dealt, so the bet is never lost.
+
+POKER_PAYTABLE = ("Jacks or Better pays per chip: Royal 800, Str Flush 50, Quads 25, Full House 9, "
+                  "Flush 6, Straight 4, Trips 3, Two Pair 2, Jacks+ 1")
+POKER_HOLD_HELP = "[H 1 3 5] Hold cards 1, 3, 5 and draw (H alone draws 5), [Q] Quit"
+
+
+def start_video_poker(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII):
+    """Prompts for a bet, with the chips from the bank."""
+    state_data = USER_STATES[fromId]
+    chips = CHIP_BANK.get(fromId)
+    if chips <= 0:
+        state_data.pop('state', None)
+        state_data.pop('game_data', None)
+        state_data['last_menu'] = 'GAMES'
+        CHIP_BANK.set(fromId, STARTING_CHIPS)
+        return f"** YOU ARE OUT OF CHIPS! ** Your next game starts with {STARTING_CHIPS}.\n{GAMES_MENU_ASCII}"
+
+    state_data['state'] = 'game_poker_betting'
+    state_data['last_menu'] = 'GAME_ACTIVE'
+    state_data['game_data'] = {'cards': bytearray(), 'chips': chips, 'bet': 0}
+    return (
+        f"** VIDEO POKER (Chips: {chips}) **\n"
+        f"{POKER_PAYTABLE}\n"
+        f"Enter your bet amount (1 - {chips}):\n"
+        f"[Q] Quit to Games Menu"
+    )
+
+
+def process_video_poker_deal(fromId, command_input, USER_STATES):
+    """Takes the bet and deals five cards."""
+    state_data = USER_STATES[fromId]
+    game_data = state_data['game_data']
+    chips = CHIP_BANK.get(fromId)
+    try:
+        bet = int(command_input.split()[0])
+    except (ValueError, IndexError):
+        return f"Invalid input. Please enter a whole number between 1 and {chips} to bet.\n[Q] Quit to Games Menu"
+    if not 1 <= bet <= chips:
+        return f"Bet must be between 1 and {chips} chips.\nEnter your bet amount (1 - {chips}):\n[Q] Quit to Games Menu"
+
+    # Ten cards from a fresh deck: the hand, then the replacements in the order they are drawn
+    game_data['cards'] = create_and_shuffle_deck()[:10]
+    game_data['bet'] = bet
+    game_data['chips'] = chips - bet
+    CHIP_BANK.set(fromId, game_data['chips'])
+    state_data['state'] = 'game_poker_hold'
+
+    hand = game_data['cards'][:5]
+    dealt = evaluate_poker_hand(hand)
+    showing = f" ({POKER_HANDS[dealt]})" if dealt != NO_WIN else ""
+    return (
+        f"** VIDEO POKER (Chips: {game_data['chips']}) ** Bet: {bet}\n"
+        f"{format_poker_hand(hand)}{showing}\n"
+        f"{POKER_HOLD_HELP}"
+    )
+
+
+def process_video_poker_draw(fromId, command_input, USER_STATES):
+    """Handles H with the positions to hold, draws the rest and pays the final hand."""
+    state_data = USER_STATES[fromId]
+    game_data = state_data['game_data']
+    words = command_input.split()
+    if not words or words[0] != 'H':
+        return f"Your hand: {format_poker_hand(game_data['cards'][:5])}\n{POKER_HOLD_HELP}"
+
+    positions = ''.join(words[1:])    # "H 1 3 5" and "H 135" both work
+    if not all(position in '12345' for position in positions):
+        return f"Hold positions are 1 to 5, e.g. H 1 3 5.\n{POKER_HOLD_HELP}"
+    held = {int(position) - 1 for position in positions}
+    return (f"{_settle_video_poker(fromId, state_data, held)}\n"
+            f"[N] Deal again (bet {game_data['bet']}) or enter a new bet, [M] Main Menu, [Q] Quit to Games Menu")
+
+
+def _settle_video_poker(fromId, state_data, held):
+    """Replaces the cards not held, pays the hand into the bank and moves to the end state. Returns the result text."""
+    game_data = state_data['game_data']
+    cards = game_data['cards']
+    replacements = iter(cards[5:])
+    final = bytearray(card if i in held else next(replacements) for i, card in enumerate(cards[:5]))
+
+    result = evaluate_poker_hand(final)
+    payout = game_data['bet'] * POKER_PAYOUTS[result]
+    game_data['chips'] += payout
+    CHIP_BANK.set(fromId, game_data['chips'])
+    state_data['state'] = 'game_poker_end'
+    return (
+        f"{format_poker_hand(final)}\n"
+        f"** {POKER_HANDS[result]}{f'! Pays {payout}' if payout else ''} **\n"
+        f"Chips Change: {payout - game_data['bet']:+}  Current Chips: {game_data['chips']}"
+    )
+
+
+def settle_open_hand(fromId, state_data):
+    """
+    Pays out a video poker hand still waiting for the hold, as dealt, before its session state
+    is dropped (logoff, session eviction). Returns the result text, or None if no hand was open.
+    """
+    if state_data.get('state') != 'game_poker_hold' or 'game_data' not in state_data:
+        return None
+    return _settle_video_poker(fromId, state_data, held=range(5))
+
+# --- MINESWEEPER GAME LOGIC ---
+# The board lives in game_data as integer bitboards (see minesweeper.py). After a move only
+# the rows that changed are sent; [B] resends the whole board.
+
+MINESWEEPER_LEVELS_PROMPT = (
+    "** MINESWEEPER **\n"
+    + "\n".join(f"[{key}] {w}x{h}, {mines} mines" for key, (w, h, mines) in minesweeper.LEVELS.items())
+    + "\n[Q] Quit to Games Menu"
+)
+MINESWEEPER_HELP = "Open: C5  Flag: F C5  [B] Board  [Q] Quit"
+
+
+def start_minesweeper(fromId, USER_STATES):
+    """Starts Minesweeper by asking for a board size."""
+    state_data = USER_STATES[fromId]
+    state_data['state'] = 'game_minesweeper_setup'
+    state_data['last_menu'] = 'GAME_ACTIVE'
+    state_data.pop('game_data', None)
+    return MINESWEEPER_LEVELS_PROMPT
+
+
+def _minesweeper_new_board(state_data, level):
+    width, height, mine_count = minesweeper.LEVELS[level]
+    # Mines are placed on the first reveal, so the first cell opened is never a mine
+    state_data['game_data'] = {
+        'width': width, 'height': height, 'mine_count': mine_count,
+        'mines': 0, 'revealed': 0, 'flags': 0, 'moves': 0,
+    }
+    state_data['state'] = 'game_minesweeper_play'
+
+
+def _minesweeper_status(game_data):
+    flags_left = game_data['mine_count'] - bin(game_data['flags']).count('1')
+    return f"Mines: {game_data['mine_count']}  Unflagged: {flags_left}"
+
+
+def _minesweeper_board(game_data, rows=None, show_mines=False):
+    """Column header plus the given rows (default: all) of the board."""
+    width, height = game_data['width'], game_data['height']
+    lines = minesweeper.render_rows(range(height) if rows is None else rows, game_data['mines'],
+                                    game_data['revealed'], game_data['flags'], width, height, show_mines)
+    return "\n".join([minesweeper.column_header(width)] + lines)
+
+
+def process_minesweeper_move(fromId, command_input, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII):
+    """Handles a reveal (C5), a flag toggle (F C5), [B] Board and the menu commands."""
+    state_data = USER_STATES[fromId]
+    game_data = state_data['game_data']
+    width, height = game_data['width'], game_data['height']
+    words = command_input.split()
+    if not words:
+        return MINESWEEPER_HELP
+
+    if words[0] == 'Q':
+        return _leave_game(state_data, 'GAMES', GAMES_MENU_ASCII)
+    if words[0] == 'M':
+        return _leave_game(state_data, 'MAIN', MAIN_MENU_ASCII)
+    if words[0] == 'B' and len(words) == 1:
+        return f"{_minesweeper_status(game_data)}\n{_minesweeper_board(game_data)}\n{MINESWEEPER_HELP}"
+
+    flag = words[0] == 'F' and len(words) == 2
+    target = words[1] if flag or (words[0] == 'R' and len(words) == 2) else ''.join(words)
+    cell = minesweeper.parse_cell(target, width, height)
+    if cell is None:
+        last = minesweeper.COLUMN_LETTERS[width - 1]
+        return f"Unknown cell. Use a column A-{last} and a row 1-{height}.\n{MINESWEEPER_HELP}"
+    bit = 1 << cell
+
+    before = game_data['revealed'] | game_data['flags']
+    if flag:
+        if game_data['revealed'] & bit:
+            return f"{target} is already open."
+        game_data['flags'] ^= bit
+    else:
+        if game_data['flags'] & bit:
+            return f"{target} is flagged. Use F {target} to remove the flag first."
+        if not game_data['moves']:
+            game_data['mines'] = minesweeper.place_mines(width, height, game_data['mine_count'], cell)
+        game_data['moves'] += 1
+        revealed = minesweeper.reveal(cell, game_data['mines'], game_data['revealed'], game_data['flags'], width, height)
+        if revealed is None:
+            state_data['state'] = 'game_minesweeper_end'
+            return (f"** BOOM! {target} was a mine. **\n{_minesweeper_board(game_data, show_mines=True)}\n"
+                    f"[N] New Game, [M] Main Menu, [Q] Quit to Games Menu")
+        game_data['revealed'] = revealed
+        if minesweeper.is_won(game_data['mines'], revealed, width, height):
+            state_data['state'] = 'game_minesweeper_end'
+            return (f"** CLEARED in {game_data['moves']} moves! **\n{_minesweeper_board(game_data, show_mines=True)}\n"
+                    f"[N] New Game, [M] Main Menu, [Q] Quit to Games Menu")
+
+    rows = minesweeper.changed_rows(before, game_data['revealed'] | game_data['flags'], width, height)
+    if not rows:
+        return f"{target} is already open. {_minesweeper_status(game_data)}"
+    return f"{_minesweeper_status(game_data)}\n{_minesweeper_board(game_data, rows)}"
+
+
+def _leave_game(state_data, menu, menu_text):
+    """Clears the game state and returns to a menu."""
+    state_data.pop('state', None)
+    state_data.pop('game_data', None)
+    state_data['last_menu'] = menu
+    return menu_text
+
 # --- EXTERNAL ROUTER ---
 
 def handle_game_command(fromId, command_input, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII):
     """
-    Routes commands based on the active game state (Blackjack only for now).
+    Routes commands based on the active game state (Blackjack, Video Poker and Minesweeper).
     """
     state_data = USER_STATES[fromId]
     active_state = state_data.get('state', 'none')
-    command = command_input[0]
-    
+    command = command_input[:1]
+
+    # Video Poker: bet, hold/draw, and deal again
+    if active_state == 'game_poker_betting':
+        if command == 'M':
+            return _leave_game(state_data, 'MAIN', MAIN_MENU_ASCII)
+        elif command == 'Q':
+            return _leave_game(state_data, 'GAMES', GAMES_MENU_ASCII)
+        return process_video_poker_deal(fromId, command_input, USER_STATES)
+    elif active_state == 'game_poker_hold':
+        if command in ('M', 'Q'):
+            # The bet is already in: leaving mid-hand plays the hand as dealt
+            result = _settle_video_poker(fromId, state_data, held=range(5))
+            if command == 'M':
+                return f"{result}\n{_leave_game(state_data, 'MAIN', MAIN_MENU_ASCII)}"
+            return f"{result}\n{_leave_game(state_data, 'GAMES', GAMES_MENU_ASCII)}"
+        return process_video_poker_draw(fromId, command_input, USER_STATES)
+    elif active_state == 'game_poker_end':
+        if (command == 'N' or command_input.isdigit()) and CHIP_BANK.get(fromId) <= 0:
+            return start_video_poker(fromId, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
+        elif command == 'N':
+            return process_video_poker_deal(fromId, str(state_data['game_data']['bet']), USER_STATES)
+        elif command == 'M':
+            return _leave_game(state_data, 'MAIN', MAIN_MENU_ASCII)
+        elif command == 'Q':
+            return _leave_game(state_data, 'GAMES', GAMES_MENU_ASCII)
+        elif command_input.isdigit():
+            return process_video_poker_deal(fromId, command_input, USER_STATES)
+        return "Hand finished. Use [N] Deal again, a new bet amount, [M] Main Menu, or [Q] Quit to Games Menu."
+
+    # Minesweeper: moves, board size choice and the end-of-game prompt
+    elif active_state == 'game_minesweeper_play':
+        return process_minesweeper_move(fromId, command_input, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII)
+    elif active_state == 'game_minesweeper_setup':
+        if command_input in minesweeper.LEVELS:
+            _minesweeper_new_board(state_data, command_input)
+            width, height, mine_count = minesweeper.LEVELS[command_input]
+            # The board starts all hidden, so there is nothing to draw until the first reveal
+            return (f"{width}x{height} board, {mine_count} mines, all hidden ({minesweeper.HIDDEN}).\n"
+                    f"Columns A-{minesweeper.COLUMN_LETTERS[width - 1]}, rows 1-{height}.\n{MINESWEEPER_HELP}")
+        elif command == 'M':
+            return _leave_game(state_data, 'MAIN', MAIN_MENU_ASCII)
+        elif command == 'Q':
+            return _leave_game(state_data, 'GAMES', GAMES_MENU_ASCII)
+        return MINESWEEPER_LEVELS_PROMPT
+    elif active_state == 'game_minesweeper_end':
+        if command == 'N':
+            return start_minesweeper(fromId, USER_STATES)
+        elif command == 'M':
+            return _leave_game(state_data, 'MAIN', MAIN_MENU_ASCII)
+        elif command == 'Q':
+            return _leave_game(state_data, 'GAMES', GAMES_MENU_ASCII)
+        return "Game finished. Use [N] New Game, [M] Main Menu, or [Q] Quit to Games Menu."
+
     # In-game command (Hit/Stand/Quit)
     if active_state == 'game_blackjack_turn':
         return process_blackjack_turn(fromId, command_input, USER_STATES, GAMES_MENU_ASCII, MAIN_MENU_ASCII, LOGOFF_ASCII)
@@ -337,3 +731,82 @@ def handle_game_command(fromId, command_input, USER_STATES, GAMES_MENU_ASCII, MA
     # Fallback
     state_data['last_menu'] = 'GAMES'
     return GAMES_MENU_ASCII
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    from itertools import product
+
+    def reference_value(names):
+        """The string-based scoring the encoded cards replaced."""
+        value = sum(10 if name in ('10', 'J', 'Q', 'K') else 11 if name == 'A' else int(name) for name in names)
+        aces = names.count('A')
+        while value > 21 and aces:
+            value -= 10
+            aces -= 1
+        return value
+
+    checked = 0
+    for size in (1, 2, 3, 4):
+        for ranks in product(range(len(CARDS)), repeat=size):
+            hand = bytearray(rank * 4 + (i % 4) for i, rank in enumerate(ranks))
+            assert get_hand_value(hand) == reference_value([CARDS[rank] for rank in ranks]), format_hand(hand)
+            checked += 1
+    assert get_hand_value(bytearray(b'\x28' * 12)) == 120, "totals past the table are plain sums"
+    print(f"get_hand_value matches the string scoring on all {checked} hands of 1-4 ranks")
+
+    shoe = Shoe(decks=2, penetration=0.5, rng=random.Random(1))
+    dealt = bytearray()
+    while len(shoe) > shoe.cut:
+        dealt += shoe.deal(2)
+    assert len(dealt) == 52 and shoe.shuffles == 1
+    shoe.start_round()
+    assert shoe.shuffles == 2 and len(shoe) == 104, "reshuffled once the cut card came out"
+    assert sorted(shoe._cards) == sorted(bytearray(range(52)) * 2)
+    print(f"Shoe OK: cut card at {shoe.cut} of 104 cards")
+
+    # Naturals settle before totals: 3:2 even against a dealer bust or a drawn dealer 21
+    assert settle_blackjack(21, 26, 10, player_natural=True)[1] == 25
+    assert settle_blackjack(21, 21, 10, player_natural=True)[1] == 25
+    assert settle_blackjack(21, 21, 10, player_natural=True, dealer_natural=True)[1] == 10
+    assert settle_blackjack(21, 21, 10, dealer_natural=True)[1] == 0
+    assert settle_blackjack(22, 26, 10)[1] == 0 and settle_blackjack(20, 26, 10)[1] == 20
+    print("settle_blackjack OK (python3 blackjack_sim.py --check simulates the whole game)")
+
+    def reference_poker_hand(hand):
+        """Sort-and-compare classification, the way the lookup tables are meant to replace."""
+        ranks = sorted((card >> 2 for card in hand), reverse=True)
+        counts = sorted((ranks.count(rank) for rank in set(ranks)), reverse=True)
+        flush = len({card & 3 for card in hand}) == 1
+        straight = counts[0] == 1 and (ranks[0] - ranks[4] == 4 or ranks == [12, 3, 2, 1, 0])
+        if straight and flush:
+            return ROYAL_FLUSH if ranks[4] == CARDS.index('10') else STRAIGHT_FLUSH
+        if counts[0] == 4:
+            return FOUR_OF_A_KIND
+        if counts[:2] == [3, 2]:
+            return FULL_HOUSE
+        if flush:
+            return FLUSH
+        if straight:
+            return STRAIGHT
+        if counts[0] == 3:
+            return THREE_OF_A_KIND
+        if counts[:2] == [2, 2]:
+            return TWO_PAIR
+        if counts[0] == 2:
+            return JACKS_OR_BETTER if max(rank for rank in ranks if ranks.count(rank) == 2) >= CARDS.index('J') else NO_WIN
+        return NO_WIN
+
+    rng = random.Random(24)
+    for _ in range(100000):
+        hand = create_and_shuffle_deck(rng=rng)[:5]
+        assert evaluate_poker_hand(hand) == reference_poker_hand(hand), format_poker_hand(hand)
+
+    def cards(text):
+        return bytearray(CARDS.index(name[:-1]) * 4 + SUITS.index(name[-1]) for name in text.split())
+    for text, expected in (('10H JH QH KH AH', ROYAL_FLUSH), ('AS 2S 3S 4S 5S', STRAIGHT_FLUSH),
+                           ('AC 2D 3H 4S 5S', STRAIGHT), ('QC KD AH 2S 3S', NO_WIN), ('JC JD 4H 5S 9S', JACKS_OR_BETTER),
+                           ('10C 10D 4H 5S 9S', NO_WIN), ('4C 4D 4H 9S 9C', FULL_HOUSE), ('2C 5C 7C 9C KC', FLUSH)):
+        assert evaluate_poker_hand(cards(text)) == expected, text
+    print(f"evaluate_poker_hand matches sort-and-compare on 100000 random hands "
+          f"({len(_PRODUCT_TABLE)} products, {sum(1 for hand in _FLUSH_TABLE if hand)} flush masks)")
@@ -0,0 +1,345 @@
+# mesh_simulator.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+#
+# Offline load test for the BBS: replays a packet trace (see packet_trace.py) or a
+# synthetic crowd of nodes through auto_responder.onReceive, with a simulated radio that
+# models LoRa airtime on one shared channel and packet loss. Nothing is sent on the air
+# and the message board lives in a temporary directory.
+#
+# Usage: python3 mesh_simulator.py [--nodes 20] [--duration 900] [--speed 50]
+#        python3 mesh_simulator.py --trace recorded.jsonl [--loss 0.05] [--ack-flow]
+#        python3 mesh_simulator.py --nodes 50 --write-trace crowd.jsonl   (save the synthetic trace)
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+
+from airtime import MODEM_PRESETS, DEFAULT_PRESET, ROUTING_ACK_BYTES, airtime_seconds, text_airtime
+from packet_trace import TraceEvent, read_trace, write_trace
+from rate_limiter import RateLimiter, LIMIT_SETTINGS, SUGGESTED_LIMITS
+from bbs_data_manager import STORAGE_MODES
+from send_scheduler import (SendScheduler, AckFlowControl, LoopbackAckInterface, _LoopbackPacket,
+                            DEFAULT_PACING_DELAY, DEFAULT_ACK_TIMEOUT, DEFAULT_MIN_ACK_GAP,
+                            PRIORITY_INTERACTIVE, PRIORITY_NAMES)
+
+# --- CONFIGURATION & CONSTANTS ---
+DEFAULT_SPEED = 50.0         # Simulated seconds per real second
+DEFAULT_NODES = 20
+DEFAULT_DURATION = 900.0     # Simulated seconds over which synthetic sessions start
+MEAN_THINK_TIME = 15.0       # Average pause between a user's commands (simulated seconds)
+DRAIN_TIMEOUT = 3600.0       # Simulated seconds to wait for the last replies after the trace ends
+
+# Command sequences synthetic users send (one session each). '{n}' is replaced by a counter.
+SESSION_SCRIPTS = {
+    'reader':  ['HI', 'B', 'R', 'G', 'N', '1', 'B', 'R T', 'M', 'X'],
+    'summary': ['HI', 'B', 'A', 'R O', 'B', 'X'],
+    'poster':  ['HI', 'B', 'P', 'G', 'Sim post {n}', 'Simulated message body number {n}.', 'END', 'B', 'R G', 'X'],
+    'search':  ['HI', 'B', 'S welcome mesh', '1', 'B', 'X'],
+    'gamer':   ['HI', 'G', 'B', '10', 'S', 'N', '10', 'H', 'S', 'Q', 'M', 'X'],
+}
+
+
+class SimClock:
+    """Simulated time running `speed` times faster than the wall clock."""
+    def __init__(self, speed=DEFAULT_SPEED):
+        self.speed = speed
+        self.start()
+
+    def start(self):
+        """Sets simulated time back to zero."""
+        self._started = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self._started) * self.speed
+
+    def real(self, sim_seconds):
+        """Converts a simulated duration to wall-clock seconds."""
+        return sim_seconds / self.speed
+
+    def sleep_until(self, sim_time):
+        remaining = sim_time - self.now()
+        if remaining > 0:
+            time.sleep(remaining / self.speed)
+
+
+class SimulatedInterface(LoopbackAckInterface):
+    """
+    Meshtastic interface stand-in for the simulator.
+
+    Every transmission (our replies, the users' commands and routing ACKs) occupies the one
+    shared channel for its LoRa time on air, so packets queue behind each other exactly as
+    they would on a busy mesh. Each reply packet is lost with probability `loss`; delivered
+    packets requested with wantAck get a routing ACK once the ACK itself has been on air.
+    on_transmit(destId, text, end, lost) is called for every reply transmission.
+    """
+    def __init__(self, clock, preset=DEFAULT_PRESET, ack_handler=None, loss=0.0, seed=None):
+        super().__init__(ack_handler=ack_handler, loss=loss, seed=seed)
+        self.clock = clock
+        self.preset = preset
+        self.on_transmit = None
+        self._lock = threading.Lock()
+        self._channel_free = 0.0      # Simulated time at which the channel is idle again
+        self.airtime = {'inbound': 0.0, 'outbound': 0.0, 'acks': 0.0}
+        self.counts = {'inbound': 0, 'outbound': 0, 'lost': 0, 'acks': 0, 'bytes_out': 0}
+
+    def occupy(self, duration, kind, earliest=None):
+        """Reserves the channel for `duration` simulated seconds. Returns the (start, end) of the transmission."""
+        with self._lock:
+            start = max(self.clock.now() if earliest is None else earliest, self._channel_free)
+            self._channel_free = start + duration
+            self.airtime[kind] += duration
+            return start, self._channel_free
+
+    def receive(self, text):
+        """Puts one user command on the channel; returns the simulated time it has been fully received."""
+        _, end = self.occupy(text_airtime(text, self.preset), 'inbound')
+        self.counts['inbound'] += 1
+        return end
+
+    def sendText(self, text, destinationId=None, wantAck=False, **kwargs):
+        packet = _LoopbackPacket(next(self._ids))
+        self.sent.append((destinationId, str(text)))
+        _, end = self.occupy(text_airtime(text, self.preset), 'outbound')
+        with self._lock:
+            lost = self._random.random() < self.loss
+            self.counts['outbound'] += 1
+            self.counts['bytes_out'] += len(text.encode('utf-8'))
+            self.counts['lost'] += lost
+        if wantAck and not lost and self.ack_handler:
+            _, ack_end = self.occupy(airtime_seconds(ROUTING_ACK_BYTES, self.preset), 'acks', earliest=end)
+            self.counts['acks'] += 1
+            ack = {'decoded': {'portnum': 'ROUTING_APP', 'requestId': packet.id, 'routing': {'errorReason': 'NONE'}}}
+            timer = threading.Timer(max(0.0, self.clock.real(ack_end - self.clock.now())), self.ack_handler, args=(ack,))
+            timer.daemon = True
+            timer.start()
+        if self.on_transmit:
+            self.on_transmit(destinationId, text, end, lost)
+        return packet
+
+
+class _ReplyText(str):
+    """A reply packet tagged with the reply it belongs to, so retransmissions are recognised."""
+    pass
+
+
+class _Reply:
+    __slots__ = ('fromId', 'received', 'packets', 'priority', 'delivered', 'first', 'complete')
+
+    def __init__(self, fromId, received, packets, priority):
+        self.fromId = fromId
+        self.priority = priority      # Outbound priority class (send_scheduler.PRIORITY_NAMES)
+        self.received = received      # Simulated time the command was fully received
+        self.packets = packets
+        self.delivered = set()        # Indexes of packets that reached the user
+        self.first = None             # Simulated time the first packet was delivered
+        self.complete = None          # Simulated time the last missing packet was delivered
+
+
+def generate_trace(nodes=DEFAULT_NODES, duration=DEFAULT_DURATION, seed=1):
+    """Builds a synthetic trace: each node runs one scripted session starting at a random time."""
+    rng = random.Random(seed)
+    scripts = list(SESSION_SCRIPTS.values())
+    events = []
+    for n in range(nodes):
+        fromId = f"!{0x5e000000 + n:08x}"
+        t = rng.uniform(0, duration)
+        for text in rng.choice(scripts):
+            events.append(TraceEvent(t, fromId, text.format(n=n)))
+            t += rng.expovariate(1 / MEAN_THINK_TIME)
+    events.sort(key=lambda event: event.t)
+    return events
+
+
+def _percentiles(samples):
+    if not samples:
+        return {'p50': None, 'p90': None, 'p99': None}
+    ordered = sorted(samples)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return {'p50': pick(50), 'p90': pick(90), 'p99': pick(99)}
+
+
+def run_simulation(events, speed=DEFAULT_SPEED, preset=DEFAULT_PRESET, loss=0.0, ack_flow=False,
+                   workers=None, storage='json', seed=1, verbose=False, rate_limit=False):
+    """
+    Replays `events` through auto_responder.onReceive on a simulated radio and returns a
+    report dict: throughput, reply latency percentiles (simulated seconds) and airtime.
+    With rate_limit the suggested rate limits apply (the BBS ships with them off),
+    measured in simulated time.
+    """
+    import auto_responder as ar
+    from bbs_data_manager import BBSData
+    from worker_pool import KeyedWorkerPool, DEFAULT_WORKERS
+
+    clock = SimClock(speed)
+    flow_control = None
+    if ack_flow:
+        flow_control = AckFlowControl(ack_timeout=clock.real(DEFAULT_ACK_TIMEOUT),
+                                      min_gap=clock.real(DEFAULT_MIN_ACK_GAP),
+                                      fixed_delay=clock.real(DEFAULT_PACING_DELAY))
+    radio = SimulatedInterface(clock, preset, flow_control.on_routing_packet if flow_control else None, loss, seed)
+    scheduler = SendScheduler(pacing_delay=clock.real(DEFAULT_PACING_DELAY), flow_control=flow_control)
+    pool = KeyedWorkerPool(DEFAULT_WORKERS if workers is None else workers)
+    limits = SUGGESTED_LIMITS if rate_limit else {name: 0 for name in LIMIT_SETTINGS}
+    limiter = RateLimiter(clock=clock.now)
+    for name, value in limits.items():
+        limiter.set_limit(name, value)
+    scheduler.add_send_listener(lambda destId, text: limiter.charge_airtime(destId, text_airtime(text)))
+
+    replies = []
+    pending = {}                       # {fromId: deque of _Reply not yet fully sent}
+    current = threading.local()        # Receive time of the packet a worker is handling
+    lock = threading.Lock()
+
+    def tracked_enqueue(interface, destId, packets, priority=PRIORITY_INTERACTIVE):
+        reply = _Reply(destId, getattr(current, 'received', clock.now()), len(packets), priority)
+        tagged = []
+        for index, text in enumerate(packets):
+            text = _ReplyText(text)
+            text.reply, text.index = reply, index
+            tagged.append(text)
+        with lock:
+            replies.append(reply)
+            pending.setdefault(destId, deque()).append(reply)
+        SendScheduler.enqueue(scheduler, interface, destId, tagged, priority)
+
+    def on_transmit(destId, text, end, lost):
+        reply = getattr(text, 'reply', None)
+        if reply is None or lost:
+            return
+        with lock:
+            if text.index in reply.delivered:
+                return                 # A retransmission of a packet that already arrived
+            reply.delivered.add(text.index)
+            if reply.first is None:
+                reply.first = end
+            if len(reply.delivered) == reply.packets:
+                reply.complete = end
+
+    def tracked_handle_packet(packet, interface):
+        current.received = packet['_sim_received']
+        handle_packet(packet, interface)
+
+    scheduler.enqueue = tracked_enqueue
+    radio.on_transmit = on_transmit
+    handle_packet = ar.handle_packet
+    saved = (ar.outbound_scheduler, ar.packet_workers, ar.bbs_data_handler, ar.rate_limiter)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    with tempfile.TemporaryDirectory() as tmp, output:
+        ar.attach_data_handler(BBSData(page_size=4, data_file=os.path.join(tmp, 'bbs_messages.json'), storage=storage))
+        ar.outbound_scheduler, ar.packet_workers, ar.rate_limiter = scheduler, pool, limiter
+        ar.handle_packet = tracked_handle_packet
+        try:
+            clock.start()
+            for event in events:
+                clock.sleep_until(event.t)
+                received = radio.receive(event.text)
+                clock.sleep_until(received)
+                ar.onReceive({'fromId': event.fromId, 'id': None, '_sim_received': received,
+                              'decoded': {'portnum': 'TEXT_MESSAGE_APP', 'text': event.text}}, radio)
+            pool.wait_idle(clock.real(DRAIN_TIMEOUT))
+            scheduler.wait_idle(clock.real(DRAIN_TIMEOUT))
+            finished = clock.now()
+        finally:
+            pool.shutdown()
+            scheduler.stop()
+            ar.handle_packet = handle_packet
+            ar.bbs_data_handler.close()
+            ar.outbound_scheduler, ar.packet_workers, ar.bbs_data_handler, ar.rate_limiter = saved
+
+    first = [r.first - r.received for r in replies if r.first is not None]
+    complete = [r.complete - r.received for r in replies if r.complete is not None]
+    duration = max(finished, radio._channel_free) or 1.0
+    total_airtime = sum(radio.airtime.values())
+    return {
+        'preset': preset,
+        'commands': len(events),
+        'nodes': len({event.fromId for event in events}),
+        'replies': len(replies),
+        'throttled': limiter.stats['throttled'],
+        'incomplete_replies': sum(1 for r in replies if r.complete is None),
+        'packets_out': radio.counts['outbound'],
+        'packets_lost': radio.counts['lost'],
+        'bytes_out': radio.counts['bytes_out'],
+        'sim_seconds': duration,
+        'wall_seconds': clock.real(duration),
+        'commands_per_min': len(events) / duration * 60,
+        'packets_per_min': radio.counts['outbound'] / duration * 60,
+        'airtime': dict(radio.airtime, total=total_airtime),
+        'channel_utilization': total_airtime / duration,
+        'latency_first': _percentiles(first),
+        'latency_complete': _percentiles(complete),
+        'latency_first_by_class': {name: _percentiles([r.first - r.received for r in replies
+                                                       if r.priority == priority and r.first is not None])
+                                   for priority, name in enumerate(PRIORITY_NAMES)},
+        'replies_by_class': {name: sum(1 for r in replies if r.priority == priority)
+                             for priority, name in enumerate(PRIORITY_NAMES)},
+        'flow_control': dict(flow_control.stats) if flow_control else None,
+    }
+
+
+def print_report(report):
+    def fmt(value):
+        return "-" if value is None else f"{value:.1f}s"
+    print(f"\n--- Mesh simulation ({report['preset']}) ---")
+    print(f"Nodes: {report['nodes']}   Commands: {report['commands']}   Replies: {report['replies']} "
+          f"({report['incomplete_replies']} incomplete, {report['throttled']} commands throttled)")
+    print(f"Reply packets: {report['packets_out']} ({report['packets_lost']} lost), {report['bytes_out']} bytes")
+    print(f"Simulated time: {report['sim_seconds']:.0f}s (wall {report['wall_seconds']:.1f}s)")
+    print(f"Throughput: {report['commands_per_min']:.1f} commands/min, {report['packets_per_min']:.1f} reply packets/min")
+    airtime = report['airtime']
+    print(f"Airtime: {airtime['total']:.0f}s total (replies {airtime['outbound']:.0f}s, commands {airtime['inbound']:.0f}s, "
+          f"ACKs {airtime['acks']:.0f}s), channel busy {report['channel_utilization']:.0%}")
+    for name, label in (('latency_first', 'First reply packet'), ('latency_complete', 'Complete reply')):
+        p = report[name]
+        print(f"{label + ' latency:':<30} p50 {fmt(p['p50'])}  p90 {fmt(p['p90'])}  p99 {fmt(p['p99'])}")
+    for name, p in report['latency_first_by_class'].items():
+        print(f"{'  ' + name + ' (' + str(report['replies_by_class'][name]) + ' replies):':<30} "
+              f"p50 {fmt(p['p50'])}  p90 {fmt(p['p90'])}  p99 {fmt(p['p99'])}")
+    flow = report['flow_control']
+    if flow:
+        print(f"ACK flow control: {flow['packets']} chunks, {flow['transmissions'] - flow['packets']} retransmissions "
+              f"({flow['timeouts']} timeouts), {flow['failed']} given up")
+
+
+# --- COMMAND LINE ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traffic through the BBS on a simulated mesh (no radio needed).")
+    parser.add_argument('--trace', help="Replay this packet trace (JSON Lines, see packet_trace.py) instead of synthetic traffic.")
+    parser.add_argument('--write-trace', metavar='PATH', help="Save the synthetic trace to PATH before running it.")
+    parser.add_argument('--nodes', type=int, default=DEFAULT_NODES, help="Synthetic nodes, one session each.")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="Simulated seconds over which sessions start.")
+    parser.add_argument('--speed', type=float, default=DEFAULT_SPEED, help="Simulated seconds per real second.")
+    parser.add_argument('--preset', choices=sorted(MODEM_PRESETS), default=DEFAULT_PRESET, help="Modem preset for airtime.")
+    parser.add_argument('--loss', type=float, default=0.0, help="Probability that a reply packet is lost.")
+    parser.add_argument('--ack-flow', action='store_true', help="Use ACK flow control instead of the fixed pacing gap.")
+    parser.add_argument('--workers', type=int, default=None, help="Packet handling threads (default: the BBS default).")
+    parser.add_argument('--storage', choices=STORAGE_MODES, default='json', help="Message store engine.")
+    parser.add_argument('--rate-limit', action='store_true', help="Apply the suggested rate limits (off by default, as on the BBS).")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="Show the BBS log output.")
+    args = parser.parse_args()
+
+    if args.trace:
+        events = read_trace(args.trace)
+    else:
+        events = generate_trace(args.nodes, args.duration, args.seed)
+        if args.write_trace:
+            write_trace(args.write_trace, events)
+    if not events:
+        parser.error("the trace is empty")
+
+    report = run_simulation(events, args.speed, args.preset, args.loss, args.ack_flow,
+                            args.workers, args.storage, args.seed, args.verbose, args.rate_limit)
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
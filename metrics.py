@@ -0,0 +1,287 @@
+# metrics.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURATION & CONSTANTS ---
+# Histogram buckets (seconds) for handler, storage and reply timings
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LABEL_SETS = 500         # Per metric; further label combinations are folded into 'other'
+OVERFLOW_LABEL = 'other'
+DEFAULT_JSON_INTERVAL = 60   # Seconds between metrics file writes
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}    # {tuple of label values: value}
+
+    def _key(self, labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        if key not in self._values and len(self._values) >= MAX_LABEL_SETS:
+            key = tuple(OVERFLOW_LABEL for _ in self.labelnames)
+        return key
+
+    def _labels_text(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key)) + (extra or [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, optionally split by labels."""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            return [(self._labels_text(key), value) for key, value in sorted(self._values.items())]
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labelnames, key)), 'value': value} for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """
+    Value read from a callback at export time (queue depth, live sessions). kind='counter'
+    exports a running total kept elsewhere (e.g. SendScheduler.stats) as a counter.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read, kind='gauge'):
+        super().__init__(name, help_text)
+        self.read = read
+        self.kind = kind
+
+    def value(self):
+        try:
+            return self.read()
+        except Exception:
+            return float('nan')
+
+    def samples(self):
+        return [('', self.value())]
+
+    def snapshot(self):
+        return [{'labels': {}, 'value': self.value()}]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with sum and count, optionally split by labels."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def count(self):
+        with self._lock:
+            return sum(entry[2] for entry in self._values.values())
+
+    def quantile(self, q, **labels):
+        """Estimates a quantile from the buckets (over all label sets unless labels are given)."""
+        with self._lock:
+            if labels:
+                entries = [self._values[self._key(labels)]] if self._key(labels) in self._values else []
+            else:
+                entries = list(self._values.values())
+            counts = [sum(entry[0][i] for entry in entries) for i in range(len(self.buckets) + 1)]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(('_bucket' + self._labels_text(key, [('le', le)]), cumulative))
+            lines.append(('_sum' + self._labels_text(key), total))
+            lines.append(('_count' + self._labels_text(key), count))
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            keys = sorted(self._values)
+            rows = [(key, self._values[key][1], self._values[key][2]) for key in keys]
+        return [{
+            'labels': dict(zip(self.labelnames, key)),
+            'count': count,
+            'sum': total,
+            'p50': self.quantile(0.5, **dict(zip(self.labelnames, key))),
+            'p95': self.quantile(0.95, **dict(zip(self.labelnames, key))),
+        } for key, total, count in rows]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds the BBS metrics and renders them as Prometheus text or a JSON snapshot."""
+    def __init__(self, prefix='meshbbs_'):
+        self.prefix = prefix
+        self.started = time.time()
+        self._metrics = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(self.prefix + name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, read, kind='gauge'):
+        return self._add(Gauge(self.prefix + name, help_text, read, kind))
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, value in metric.samples():
+                lines.append(f"{metric.name}{suffix} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {
+            'timestamp': time.time(),
+            'uptime_s': time.time() - self.started,
+            'metrics': {metric.name: {'type': metric.kind, 'help': metric.help, 'values': metric.snapshot()}
+                        for metric in self._metrics.values()},
+        }
+
+    def write_json(self, path):
+        """Writes the snapshot through a temporary file and an atomic rename."""
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_file, path)
+
+
+# --- EXPORTERS ---
+
+def start_http_exporter(registry, port, host='127.0.0.1'):
+    """Serves registry.render_prometheus() at http://host:port/metrics from a daemon thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bbs-metrics-http", daemon=True).start()
+    return server
+
+
+class JsonFileExporter:
+    """Rewrites a JSON snapshot of the registry every `interval` seconds until stopped."""
+    def __init__(self, registry, path, interval=DEFAULT_JSON_INTERVAL):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bbs-metrics-file", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            self.registry.write_json(self.path)
+        except OSError as e:
+            print(f"ERROR: Could not write metrics file {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self.write()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value != value:
+            return 'NaN'
+        if value in (float('inf'), float('-inf')):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
@@ -0,0 +1,264 @@
+# minesweeper.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+#
+# Minesweeper board logic on integer bitboards. Cell (x, y) is bit y * width + x, so a
+# whole board (mines, revealed cells, flags) is three Python ints, and a reveal, a flood
+# fill or the neighbour counts of every cell are a handful of shifts and masks over them.
+# The session glue and reply texts live in games.py.
+
+import random
+from functools import lru_cache
+
+# --- CONFIGURATION & CONSTANTS ---
+# Board sizes offered in the game: (width, height, mines)
+LEVELS = {
+    '1': (9, 9, 10),
+    '2': (12, 12, 24),
+    '3': (16, 16, 40),
+}
+COLUMN_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+HIDDEN = '#'
+FLAG = 'F'
+EMPTY = '.'
+MINE = '*'
+WRONG_FLAG = 'X'
+
+_DIRECTIONS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+@lru_cache(maxsize=16)
+def board_masks(width, height):
+    """Returns (all cells, cells not in the first column, cells not in the last column)."""
+    full = (1 << (width * height)) - 1
+    first_column = full // ((1 << width) - 1)    # One bit at the start of every row
+    return full, full & ~first_column, full & ~(first_column << (width - 1))
+
+
+def neighbour_boards(board, width, height):
+    """
+    Yields eight bitboards, one per direction: bit i of each is set if the cell next to
+    cell i in that direction is set in board (cells off the edge count as unset).
+    """
+    full, not_first, not_last = board_masks(width, height)
+    for dx, dy in _DIRECTIONS:
+        offset = dy * width + dx
+        shifted = board >> offset if offset > 0 else board << -offset
+        if dx == 1:
+            shifted &= not_last      # The cell to the right of the last column is off the board
+        elif dx == -1:
+            shifted &= not_first
+        yield shifted & full
+
+
+def dilate(board, width, height):
+    """The cells of board plus every cell touching one of them."""
+    grown = board
+    for shifted in neighbour_boards(board, width, height):
+        grown |= shifted
+    return grown
+
+
+def neighbour_counts(mines, width, height):
+    """
+    Adjacent mine counts of every cell as four bit planes (count = p0 + 2*p1 + 4*p2 + 8*p3),
+    summed with a bit-sliced adder over the eight neighbour boards.
+    """
+    planes = [0, 0, 0, 0]
+    for carry in neighbour_boards(mines, width, height):
+        for k in range(4):
+            planes[k], carry = planes[k] ^ carry, planes[k] & carry
+            if not carry:
+                break
+    return planes
+
+
+def place_mines(width, height, count, safe_cell, rng=random):
+    """
+    Places `count` mines at random, keeping safe_cell and its neighbours clear so the first
+    reveal always opens some ground. Returns the mines bitboard.
+    """
+    cells = width * height
+    safe_cells = set(_set_bits(dilate(1 << safe_cell, width, height)))
+    count = min(count, cells - len(safe_cells))
+    if cells <= 4096:
+        chosen = rng.sample([i for i in range(cells) if i not in safe_cells], count)
+    else:
+        # Large boards: sample from the whole board and redraw the few that land in the safe area
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(i for i in rng.sample(range(cells), count - len(chosen)) if i not in safe_cells)
+    bits = bytearray((cells + 7) // 8)
+    for i in chosen:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _set_bits(board):
+    """Indexes of the set bits of a bitboard (meant for sparse boards: one pass per bit)."""
+    indexes = []
+    while board:
+        low = board & -board
+        indexes.append(low.bit_length() - 1)
+        board ^= low
+    return indexes
+
+
+def reveal(cell, mines, revealed, flags, width, height):
+    """
+    Opens a cell. Returns the new revealed bitboard, or None if the cell is a mine.
+    A cell with no adjacent mines opens its whole empty region and the numbered border
+    around it: an iterative wavefront over bitboards, one dilation per step, so a large
+    open area never recurses. Flagged cells are never opened by the flood.
+    """
+    bit = 1 << cell
+    if mines & bit:
+        return None
+    if (revealed | flags) & bit:
+        return revealed
+    full = board_masks(width, height)[0]
+    empty = full & ~dilate(mines, width, height)     # Cells with no mine in or around them
+    if not empty & bit:
+        return revealed | bit
+    opened = bit
+    frontier = bit
+    closed = flags | revealed
+    while frontier:
+        grown = dilate(frontier, width, height) & ~opened & ~closed
+        opened |= grown
+        frontier = grown & empty          # Only empty cells keep spreading
+    return revealed | opened
+
+
+def is_won(mines, revealed, width, height):
+    """Won once every cell without a mine is open."""
+    return revealed == board_masks(width, height)[0] & ~mines
+
+
+def render_rows(rows, mines, revealed, flags, width, height, show_mines=False):
+    """
+    Returns the text of the given rows: a row number, then one character per cell
+    (HIDDEN, FLAG, EMPTY or the count 1-8; with show_mines, MINE and WRONG_FLAG too).
+    """
+    planes = neighbour_counts(mines, width, height)
+    row_mask = (1 << width) - 1
+    lines = []
+    for y in rows:
+        shift = y * width
+        row_mine = mines >> shift & row_mask
+        row_open = revealed >> shift & row_mask
+        row_flag = flags >> shift & row_mask
+        p0, p1, p2, p3 = (plane >> shift & row_mask for plane in planes)
+        cells = []
+        for x in range(width):
+            if row_open >> x & 1:
+                count = (p0 >> x & 1) | (p1 >> x & 1) << 1 | (p2 >> x & 1) << 2 | (p3 >> x & 1) << 3
+                cells.append(str(count) if count else EMPTY)
+            elif show_mines and row_mine >> x & 1:
+                cells.append(FLAG if row_flag >> x & 1 else MINE)
+            elif row_flag >> x & 1:
+                cells.append(WRONG_FLAG if show_mines else FLAG)
+            else:
+                cells.append(HIDDEN)
+        lines.append(f"{y + 1:>2} {''.join(cells)}")
+    return lines
+
+
+def column_header(width):
+    return "   " + COLUMN_LETTERS[:width]
+
+
+def changed_rows(before, after, width, height):
+    """Rows whose cells differ between two bitboards (the rows a reply has to resend)."""
+    diff = before ^ after
+    row_mask = (1 << width) - 1
+    return [y for y in range(height) if diff >> (y * width) & row_mask]
+
+
+def parse_cell(text, width, height):
+    """Parses a cell like 'C5' (column letter, row number). Returns the cell index or None."""
+    text = text.strip().upper()
+    if len(text) < 2 or text[0] not in COLUMN_LETTERS[:width] or not text[1:].isdigit():
+        return None
+    x = COLUMN_LETTERS.index(text[0])
+    y = int(text[1:]) - 1
+    if not 0 <= y < height:
+        return None
+    return y * width + x
+
+
+# Reveal correctness checks (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    from collections import deque
+
+    def naive_counts(mines, width, height):
+        counts = []
+        for y in range(height):
+            for x in range(width):
+                counts.append(sum(1 for dx, dy in _DIRECTIONS
+                                  if 0 <= x + dx < width and 0 <= y + dy < height
+                                  and mines >> ((y + dy) * width + x + dx) & 1))
+        return counts
+
+    def naive_reveal(cell, mines, revealed, flags, width, height):
+        """Cell-by-cell breadth-first flood fill, the textbook way."""
+        if mines >> cell & 1:
+            return None
+        counts = naive_counts(mines, width, height)
+        queue = deque([cell])
+        opened = set()
+        while queue:
+            i = queue.popleft()
+            if i in opened or (revealed | flags) >> i & 1 and i != cell:
+                continue
+            if flags >> i & 1:
+                continue
+            opened.add(i)
+            if counts[i] == 0:
+                x, y = i % width, i // width
+                for dx, dy in _DIRECTIONS:
+                    if 0 <= x + dx < width and 0 <= y + dy < height:
+                        queue.append((y + dy) * width + x + dx)
+        return revealed | sum(1 << i for i in opened)
+
+    rng = random.Random(23)
+    trials = 0
+    for trial in range(400):
+        width, height = rng.randint(1, 20), rng.randint(1, 20)
+        cells = width * height
+        mines = place_mines(width, height, rng.randint(0, cells // 3), rng.randrange(cells), rng)
+        planes = neighbour_counts(mines, width, height)
+        counts = [(planes[0] >> i & 1) + 2 * (planes[1] >> i & 1) + 4 * (planes[2] >> i & 1) + 8 * (planes[3] >> i & 1)
+                  for i in range(cells)]
+        assert counts == naive_counts(mines, width, height), (width, height)
+        revealed = 0
+        flags = sum(1 << i for i in rng.sample(range(cells), rng.randint(0, cells // 10)))
+        for move in range(5):
+            cell = rng.randrange(cells)
+            expected = naive_reveal(cell, mines, revealed, flags, width, height)
+            got = reveal(cell, mines, revealed, flags, width, height)
+            if revealed >> cell & 1 or flags >> cell & 1:
+                expected = None if mines >> cell & 1 else revealed
+            assert got == expected, (width, height, mines, revealed, flags, cell)
+            if got is None:
+                break
+            revealed = got
+            trials += 1
+        assert not mines & revealed
+    print(f"reveal() matches a cell-by-cell flood fill on {trials} moves over 400 random boards")
+
+    width, height, count = LEVELS['1']
+    for safe_cell in range(width * height):
+        mines = place_mines(width, height, count, safe_cell, rng)
+        assert bin(mines).count('1') == count and not dilate(1 << safe_cell, width, height) & mines
+    mines = place_mines(200, 200, 6000, 20100, rng)
+    assert bin(mines).count('1') == 6000 and not dilate(1 << 20100, 200, 200) & mines
+    print("place_mines: right count, first cell and its neighbours always clear")
+
+    mines = 0b000_000_001   # One mine in the corner of a 3x3 board
+    revealed = reveal(8, mines, 0, 0, 3, 3)
+    assert is_won(mines, revealed, 3, 3)
+    assert render_rows(range(3), mines, revealed, 0, 3, 3) == [" 1 #1.", " 2 11.", " 3 ..."]
+    assert changed_rows(0, revealed, 3, 3) == [0, 1, 2] and changed_rows(revealed, revealed | 1, 3, 3) == [0]
+    assert parse_cell('c3', 3, 3) == 8 and parse_cell('D1', 3, 3) is None and parse_cell('A4', 3, 3) is None
+    print("Rendering, win check and cell parsing OK")
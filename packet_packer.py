@@ -0,0 +1,199 @@
+# packet_packer.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+# --- CONFIGURATION & CONSTANTS ---
+# Largest Data payload a Meshtastic packet carries (DATA_PAYLOAD_LEN in the protobufs).
+# sendText refuses anything longer, and the limit is in UTF-8 bytes, not characters.
+MAX_PAYLOAD_BYTES = 233
+
+
+def payload_bytes(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def fits_in_packet(text, limit=MAX_PAYLOAD_BYTES):
+    """True if text can go out as a single packet without a header."""
+    return len(text) <= limit // 4 or payload_bytes(text) <= limit
+
+
+def packet_header(index, total):
+    return f"[{index}/{total}] "
+
+
+def _word_fits(text, start, capacity):
+    """True if the word starting at text[start] fits in an empty chunk."""
+    segment = text[start:start + capacity + 1]
+    end = segment.find(' ')
+    return payload_bytes(segment if end < 0 else segment[:end]) <= capacity
+
+
+def _split_at_word(text, budget, capacity):
+    """
+    Splits text into (head, tail) with head at most budget bytes, breaking at the last space
+    that fits (the space itself is dropped). A word that would not fit even in an empty
+    chunk of capacity bytes is cut between characters instead, wherever the budget ends.
+    Returns (None, text) when nothing fits, so the text can start the next chunk.
+    """
+    if payload_bytes(text) <= budget:
+        return text, ''
+    window = text[:budget + 1].encode('utf-8')   # At least budget + 1 bytes
+    cut = window.rfind(b' ', 0, budget + 1)
+    if cut > 0:
+        head = window[:cut].decode('utf-8')
+        if _word_fits(text, len(head) + 1, capacity):
+            return head, text[len(head) + 1:]
+    elif budget < capacity and _word_fits(text, 0, capacity):
+        return None, text
+    cut = budget
+    while cut > 0 and window[cut] & 0xC0 == 0x80:   # Never cut inside a multi-byte character
+        cut -= 1
+    if cut == 0:
+        return None, text
+    head = window[:cut].decode('utf-8')
+    tail = text[len(head):]
+    # A space right at the cut is the break itself and goes on neither side
+    if tail.startswith(' '):
+        return head, tail[1:]
+    return head.rstrip(' ') if head.endswith(' ') else head, tail
+
+
+def pack_lines(message, capacity):
+    """
+    Packs the lines of message into as few chunks of at most capacity bytes as possible.
+
+    Lines are kept whole whenever they fit in a chunk of their own, so menus never break
+    mid-line. A line too long for any chunk is flowed: it fills the rest of the current
+    chunk and continues in the next ones, split at word boundaries (a word longer than a
+    whole chunk is cut between characters wherever the chunk fills up). Blank lines at either end of a chunk are
+    dropped. Filling every chunk as far as these rules allow is optimal for an ordered
+    sequence, so no packing uses fewer chunks.
+    """
+    if capacity < 4:
+        raise ValueError(f"capacity of {capacity} bytes cannot hold a UTF-8 character")
+    chunks = []
+    current = []      # Lines of the chunk being filled
+    used = 0          # Its size in bytes, including the joining newlines
+
+    for line in message.split('\n'):
+        if not line and not current:
+            continue          # A blank line at the top of a packet only costs airtime
+        size = payload_bytes(line)
+        separator = 1 if current else 0
+        if used + separator + size <= capacity:
+            current.append(line)
+            used += separator + size
+            continue
+        if size <= capacity:
+            chunks.append('\n'.join(current).rstrip('\n'))
+            current, used = ([line], size) if line else ([], 0)
+            continue
+
+        # Longer than a whole chunk: flow it across chunks at word boundaries
+        rest = line
+        while rest:
+            separator = 1 if current else 0
+            head, rest = _split_at_word(rest, capacity - used - separator, capacity)
+            if head is None:
+                chunks.append('\n'.join(current).rstrip('\n'))
+                current, used = [], 0
+                continue
+            current.append(head)
+            used += separator + payload_bytes(head)
+            if rest:
+                chunks.append('\n'.join(current).rstrip('\n'))
+                current, used = [], 0
+
+    if current:
+        chunks.append('\n'.join(current).rstrip('\n'))
+    return chunks
+
+
+def pack_message(message, limit=MAX_PAYLOAD_BYTES, skip_headers=False):
+    """
+    Returns the packet texts for message, each at most limit UTF-8 bytes including its
+    "[i/n] " header. Headers are added only when there is more than one packet; the space
+    they need depends on n, so a pack that reaches another digit is redone with more room.
+    """
+    message = message.rstrip('\n')
+    if skip_headers:
+        return pack_lines(message, limit)
+    if fits_in_packet(message, limit):
+        return [message]
+
+    total_guess = 9
+    while True:
+        reserve = len(packet_header(total_guess, total_guess))
+        chunks = pack_lines(message, limit - reserve)
+        total = len(chunks)
+        if total <= total_guess:
+            return [packet_header(i + 1, total) + chunk for i, chunk in enumerate(chunks)]
+        total_guess = total_guess * 10 + 9
+
+
+# Property checks (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    import random
+    import time
+
+    def minimum_chunks(message, capacity):
+        """Optimum over the same break points pack_lines may use, by dynamic programming."""
+        pieces = []   # (bytes, joiner bytes to the previous piece)
+        for line in message.split('\n'):
+            if payload_bytes(line) <= capacity:
+                pieces.append((payload_bytes(line), 1))
+                continue
+            for i, word in enumerate(line.split(' ')):
+                joiner = 1
+                if payload_bytes(word) <= capacity:
+                    pieces.append((payload_bytes(word), joiner))
+                    continue
+                for character in word:   # Words longer than a chunk may break anywhere
+                    pieces.append((payload_bytes(character), joiner))
+                    joiner = 0
+        best = [0] + [None] * len(pieces)
+        for end in range(1, len(pieces) + 1):
+            size = 0
+            for start in range(end - 1, -1, -1):
+                size += pieces[start][0] + (pieces[start + 1][1] if start + 1 < end else 0)
+                if size > capacity:
+                    break
+                if best[start] is not None and (best[end] is None or best[start] + 1 < best[end]):
+                    best[end] = best[start] + 1
+        return best[-1]
+
+    alphabet = ['a', 'b', 'Z', '7', '-', '(', '▓', '▒', '░', 'é', '€', '🂡', '♠']
+    def random_word(rng):
+        return ''.join(rng.choices(alphabet, k=rng.choice([1, 2, 3, 4, 5, 6, 8, 13, 40, 300])))
+    def random_message(rng, max_lines, min_words=0):
+        lines = []
+        for _ in range(rng.randint(1, max_lines)):
+            lines.append(' '.join(random_word(rng) for _ in range(rng.randint(min_words, 12))))
+        return '\n'.join(lines)
+    def words_of(text):
+        return ''.join(text.split())
+
+    rng = random.Random(233)
+    started = time.perf_counter()
+    for trial in range(1000):
+        message = random_message(rng, 20)
+        limit = rng.choice([24, 60, 120, MAX_PAYLOAD_BYTES])
+        skip = rng.random() < 0.2
+        packets = pack_message(message, limit, skip_headers=skip)
+        assert all(payload_bytes(p) <= limit for p in packets), (message, limit)
+        assert all(p for p in packets) or len(packets) == 1
+        bodies = packets
+        if len(packets) > 1 and not skip:
+            bodies = []
+            for i, p in enumerate(packets):
+                header = packet_header(i + 1, len(packets))
+                assert p.startswith(header)
+                bodies.append(p[len(header):])
+        # Nothing lost, duplicated or reordered (splits only drop the breaking space)
+        assert words_of(''.join(bodies)) == words_of(message.rstrip('\n')), (message, limit)
+    print(f"1000 random messages: no packet over its limit, no text lost ({time.perf_counter() - started:.2f}s)")
+
+    for trial in range(400):
+        message = random_message(rng, 6, min_words=1)
+        capacity = rng.choice([16, 30, 50])
+        assert len(pack_lines(message, capacity)) == minimum_chunks(message, capacity), (message, capacity)
+    print("400 messages: packet count equals the dynamic-programming minimum")
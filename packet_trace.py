@@ -0,0 +1,75 @@
+# packet_trace.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+#
+# Packet trace format (JSON Lines), used to record live sessions and replay them in the
+# mesh simulator. One incoming text packet per line, in arrival order:
+#
+#   {"t": 12.84, "from": "!a1b2c3d4", "text": "R G"}
+#
+#   t     seconds since the start of the trace
+#   from  sender node ID (fromId)
+#   text  the decoded text exactly as received
+#
+# Blank lines and lines starting with '#' are ignored.
+
+import json
+import threading
+import time
+
+
+class TraceEvent:
+    """One incoming text packet of a trace."""
+    __slots__ = ('t', 'fromId', 'text')
+
+    def __init__(self, t, fromId, text):
+        self.t = t
+        self.fromId = fromId
+        self.text = text
+
+    def to_json(self):
+        return json.dumps({'t': round(self.t, 3), 'from': self.fromId, 'text': self.text})
+
+
+def read_trace(path):
+    """Reads a trace file and returns its events sorted by time."""
+    events = []
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                entry = json.loads(line)
+                events.append(TraceEvent(float(entry['t']), entry['from'], entry['text']))
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{path}:{line_number}: not a trace event ({e})") from None
+    events.sort(key=lambda event: event.t)
+    return events
+
+
+def write_trace(path, events):
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(event.to_json() + "\n")
+
+
+class TraceRecorder:
+    """Writes every received text packet to a trace file (auto_responder --record-trace)."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._file = open(path, 'w')
+
+    def record(self, fromId, text):
+        event = TraceEvent(time.monotonic() - self._started, fromId, text)
+        with self._lock:
+            if self._file:
+                self._file.write(event.to_json() + "\n")
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
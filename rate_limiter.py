@@ -0,0 +1,220 @@
+# rate_limiter.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import threading
+import time
+from collections import OrderedDict
+
+# --- CONFIGURATION & CONSTANTS ---
+# Every limit is off (0) unless the sysop opts in with --node-rate etc. or LIMIT; the bursts
+# only matter once their rate is set.
+# Incoming commands each node may send: a steady rate plus a burst for quick menu navigation
+DEFAULT_NODE_RATE = 0         # Commands per minute
+DEFAULT_NODE_BURST = 8
+# Commands from all nodes together
+DEFAULT_GLOBAL_RATE = 0       # Commands per minute
+DEFAULT_GLOBAL_BURST = 40
+# Estimated time on air of our replies (see airtime.py)
+DEFAULT_NODE_AIRTIME = 0      # Seconds per hour spent answering one node
+DEFAULT_GLOBAL_AIRTIME = 0    # Seconds per hour for all replies together
+# A starting point for a busy channel (README: Rate Limits). 360 s/hour is a 10% duty cycle.
+SUGGESTED_LIMITS = {'NODE_RATE': 12, 'NODE_BURST': 8, 'NODE_AIR': 120,
+                    'GLOBAL_RATE': 120, 'GLOBAL_BURST': 40, 'GLOBAL_AIR': 360}
+AIRTIME_BURST_FRACTION = 0.25 # An airtime bucket holds a quarter of an hour's budget
+
+MAX_TRACKED_NODES = 1024      # Least recently seen nodes are forgotten (and start with full buckets)
+
+# Runtime-tunable limits (the sysop LIMIT command): name -> (attribute, unit)
+LIMIT_SETTINGS = {
+    'NODE_RATE': ('node_rate', '/min'),
+    'NODE_BURST': ('node_burst', ''),
+    'NODE_AIR': ('node_airtime', 's/h'),
+    'GLOBAL_RATE': ('global_rate', '/min'),
+    'GLOBAL_BURST': ('global_burst', ''),
+    'GLOBAL_AIR': ('global_airtime', 's/h'),
+}
+
+
+class TokenBucket:
+    """Lazily refilled token bucket. charge() may take it below zero (airtime already spent)."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate              # Tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def available(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens
+
+    def take(self, amount, now):
+        if self.available(now) < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def charge(self, amount, now):
+        self.available(now)
+        self.tokens -= amount
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` tokens are available."""
+        missing = amount - self.available(now)
+        return max(missing, 0) / self.rate if self.rate else float('inf')
+
+
+class _NodeBudget:
+    __slots__ = ('commands', 'airtime', 'warned')
+
+    def __init__(self):
+        self.commands = None
+        self.airtime = None
+        self.warned = False   # Already told to slow down since its last accepted command
+
+
+class RateLimiter:
+    """
+    Per-node and global token buckets, checked in onReceive before a command is handled.
+
+    Commands are counted when they arrive. Airtime is charged after each reply packet is
+    sent (the send listener), so a node whose replies overdrew its airtime budget is
+    refused until the bucket has refilled. A limit of 0 disables that bucket (the default).
+    """
+    def __init__(self, node_rate=DEFAULT_NODE_RATE, node_burst=DEFAULT_NODE_BURST,
+                 node_airtime=DEFAULT_NODE_AIRTIME, global_rate=DEFAULT_GLOBAL_RATE,
+                 global_burst=DEFAULT_GLOBAL_BURST, global_airtime=DEFAULT_GLOBAL_AIRTIME,
+                 clock=time.monotonic):
+        self.node_rate = node_rate
+        self.node_burst = node_burst
+        self.node_airtime = node_airtime
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.global_airtime = global_airtime
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._nodes = OrderedDict()   # {fromId: _NodeBudget}, least recently seen first
+        self._global_commands = None
+        self._global_airtime = None
+        self._rebuild_locked(self.clock())
+        self.stats = {'accepted': 0, 'throttled': 0}
+
+    def check(self, fromId):
+        """
+        Takes one command token for fromId. Returns None if the command may run, otherwise
+        (reason, retry_after_seconds, first) where first is True for the first refusal
+        since the node's last accepted command.
+        """
+        now = self.clock()
+        with self._lock:
+            node = self._node_locked(fromId, now)
+            refusal = self._refusal_locked(node, now)
+            if refusal is None:
+                node.warned = False
+                self.stats['accepted'] += 1
+                return None
+            self.stats['throttled'] += 1
+            first = not node.warned
+            node.warned = True
+            return refusal + (first,)
+
+    def charge_airtime(self, fromId, seconds):
+        """Charges the time on air of a reply packet to its destination and the global budget."""
+        now = self.clock()
+        with self._lock:
+            node = self._node_locked(fromId, now)
+            if node.airtime:
+                node.airtime.charge(seconds, now)
+            if self._global_airtime:
+                self._global_airtime.charge(seconds, now)
+
+    def set_limit(self, name, value):
+        """Changes one of LIMIT_SETTINGS at runtime. Existing buckets keep their fill level."""
+        attribute, _ = LIMIT_SETTINGS[name]
+        if value < 0:
+            raise ValueError("limits cannot be negative")
+        with self._lock:
+            setattr(self, attribute, value)
+            self._rebuild_locked(self.clock())
+
+    def limits(self):
+        return {name: getattr(self, attribute) for name, (attribute, _) in LIMIT_SETTINGS.items()}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._nodes)
+
+    # --- INTERNALS ---
+
+    def _refusal_locked(self, node, now):
+        # Airtime first: those buckets are only checked, commands are only taken when accepted
+        if self._global_airtime and self._global_airtime.available(now) <= 0:
+            return 'global_airtime', self._global_airtime.wait_time(0.001, now)
+        if node.airtime and node.airtime.available(now) <= 0:
+            return 'node_airtime', node.airtime.wait_time(0.001, now)
+        if node.commands and not node.commands.take(1, now):
+            return 'node_commands', node.commands.wait_time(1, now)
+        if self._global_commands and not self._global_commands.take(1, now):
+            if node.commands:
+                node.commands.tokens += 1   # Not this node's fault; give its token back
+            return 'global_commands', self._global_commands.wait_time(1, now)
+        return None
+
+    def _node_locked(self, fromId, now):
+        node = self._nodes.get(fromId)
+        if node is None:
+            node = self._nodes[fromId] = _NodeBudget()
+            self._configure_node(node, now)
+            while len(self._nodes) > MAX_TRACKED_NODES:
+                self._nodes.popitem(last=False)
+        else:
+            self._nodes.move_to_end(fromId)
+        return node
+
+    def _configure_node(self, node, now):
+        node.commands = _resize(node.commands, self.node_rate / 60, self.node_burst, now)
+        node.airtime = _resize(node.airtime, self.node_airtime / 3600,
+                               self.node_airtime * AIRTIME_BURST_FRACTION, now)
+
+    def _rebuild_locked(self, now):
+        self._global_commands = _resize(self._global_commands, self.global_rate / 60, self.global_burst, now)
+        self._global_airtime = _resize(self._global_airtime, self.global_airtime / 3600,
+                                       self.global_airtime * AIRTIME_BURST_FRACTION, now)
+        for node in self._nodes.values():
+            self._configure_node(node, now)
+
+
+def _resize(bucket, rate, capacity, now):
+    """Returns a bucket with the new rate/capacity (None when the limit is off), keeping its fill level."""
+    if not rate or not capacity:
+        return None
+    if bucket is None:
+        return TokenBucket(rate, capacity, now)
+    bucket.available(now)
+    bucket.rate, bucket.capacity = rate, capacity
+    bucket.tokens = min(bucket.tokens, capacity)
+    return bucket
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    now = [0.0]
+    limiter = RateLimiter(node_rate=6, node_burst=3, node_airtime=36, global_rate=0, global_airtime=0,
+                          clock=lambda: now[0])
+    assert [limiter.check('!a') for _ in range(3)] == [None] * 3
+    reason, retry, first = limiter.check('!a')
+    assert reason == 'node_commands' and first and abs(retry - 10) < 1e-9
+    assert not limiter.check('!a')[2], "only the first refusal is flagged for a reply"
+    assert limiter.check('!b') is None, "other nodes are not affected"
+    now[0] = 10.0
+    assert limiter.check('!a') is None, "one command refilled after 10 s at 6/min"
+
+    limiter.charge_airtime('!b', 12.0)   # Bucket holds 9 s; now 3 s in debt, refills at 0.01 s/s
+    reason, retry, _ = limiter.check('!b')
+    assert reason == 'node_airtime' and 290 < retry < 310
+    limiter.set_limit('NODE_AIR', 0)
+    assert limiter.check('!b') is None, "airtime limit switched off at runtime"
+    print(f"RateLimiter OK: {limiter.stats}, limits {limiter.limits()}")
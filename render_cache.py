@@ -0,0 +1,106 @@
+# render_cache.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import sys
+import threading
+from collections import OrderedDict
+
+# Upper bound for the memory held by cached pages and packet lists (approximate bytes).
+DEFAULT_CACHE_BYTES = 512 * 1024
+
+# Tag for entries that depend on the whole board (e.g. the Activity Summary)
+ALL_TOPICS = '*'
+
+
+class RenderCache:
+    """
+    LRU cache for rendered replies (subject list pages, message views) and the final
+    packet lists chunk_and_send builds from them.
+
+    Entries can be tagged with a topic; post_message invalidates every entry of the topic
+    it posted to (via on_post). The cache evicts least recently used entries once the
+    estimated size of its values passes max_bytes.
+
+    Every invalidation also bumps the topic's generation. A caller reads generation() before
+    it renders and passes it to put(), so a page rendered from data that a concurrent post
+    has already changed is never stored over the invalidation.
+    """
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {key: (value, size, topic_id)}
+        self._by_topic = {}             # {topic_id: set of keys}
+        self._generations = {}          # {topic_id: invalidations so far}
+        self._bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'stale': 0}
+
+    def get(self, key):
+        """Returns the cached value (marking it recently used) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def generation(self, topic_id):
+        """Returns the topic's current generation, to pass to put() once the value is rendered."""
+        with self._lock:
+            return self._generations.get(topic_id, 0)
+
+    def put(self, key, value, topic_id=None, generation=None):
+        """
+        Stores a value; entries with a topic_id are dropped when that topic gets a new post.
+        If generation is given and the topic has been invalidated since, the value is stale
+        and is not stored.
+        """
+        size = _estimate_size(key) + _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generations.get(topic_id, 0):
+                self.stats['stale'] += 1
+                return
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (value, size, topic_id)
+            self._bytes += size
+            if topic_id is not None:
+                self._by_topic.setdefault(topic_id, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def invalidate_topic(self, topic_id):
+        with self._lock:
+            self._generations[topic_id] = self._generations.get(topic_id, 0) + 1
+            for key in self._by_topic.pop(topic_id, ()):
+                if key in self._entries:
+                    self._remove_locked(key)
+                    self.stats['invalidations'] += 1
+
+    def on_post(self, topic_id, message):
+        """Post listener for BBSData: a new post changes every page of its topic and board-wide views."""
+        self.invalidate_topic(topic_id)
+        self.invalidate_topic(ALL_TOPICS)
+
+    def size(self):
+        """Returns (entries, approximate bytes) currently held."""
+        with self._lock:
+            return len(self._entries), self._bytes
+
+    def _remove_locked(self, key):
+        _, size, topic_id = self._entries.pop(key)
+        self._bytes -= size
+        if topic_id is not None:
+            keys = self._by_topic.get(topic_id)
+            if keys:
+                keys.discard(key)
+
+
+def _estimate_size(value):
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+    return sys.getsizeof(value)
@@ -0,0 +1,373 @@
+# search_index.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import heapq
+import math
+import os
+import pickle
+import re
+import sqlite3
+import threading
+from array import array
+
+# --- CONFIGURATION & CONSTANTS ---
+INDEX_VERSION = 2
+SUBJECT_WEIGHT = 3          # A word in the subject counts as much as three in the body
+MAX_TERM_WEIGHT = 255       # Weights are stored in one byte per posting
+MIN_TERM_LENGTH = 2
+MAX_QUERY_TERMS = 8
+MATCH_BONUS = 1e6           # Score per matched query word (dominates tf-idf, see search())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# On-disk postings (SQLiteSearchIndex): one row per (term, post), read a term at a time
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_postings (
+    term   TEXT NOT NULL,
+    id     INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (term, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS search_documents (
+    id    INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_counts (
+    topic     TEXT PRIMARY KEY,
+    documents INTEGER NOT NULL
+);
+"""
+
+# Words too common to be worth a posting list
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have i if in is it its me my no not of on or so
+that the this to was we were will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-cases text and returns its indexable words (in order, with repeats)."""
+    return [word for word in _WORD_RE.findall(text.lower())
+            if len(word) >= MIN_TERM_LENGTH and word not in STOP_WORDS]
+
+
+def term_weights(message):
+    """Returns {term: weight} for one message (subject words weighted higher, capped to a byte)."""
+    weights = {}
+    for term in tokenize(message['subject']):
+        weights[term] = weights.get(term, 0) + SUBJECT_WEIGHT
+    for term in tokenize(message['body']):
+        weights[term] = weights.get(term, 0) + 1
+    return {term: min(weight, MAX_TERM_WEIGHT) for term, weight in weights.items()}
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def rank(entries, documents, limit=None):
+    """
+    Ranks message IDs from the (ids, weights) posting lists of the query terms: posts
+    matching more of the query words come first, then higher tf-idf score, then newer posts.
+    """
+    if len(entries) == 1:
+        # One word: rank by weight, then newest, entirely in C
+        ids, weights = entries[0]
+        pairs = zip(weights, ids)
+        top = heapq.nlargest(limit, pairs) if limit else sorted(pairs, reverse=True)
+        return [msg_id for _, msg_id in top]
+
+    # Every matched word adds MATCH_BONUS, which outweighs any tf-idf total, so
+    # posts matching more of the query always rank first.
+    scores = {}
+    get = scores.get
+    for ids, weights in entries:
+        idf = math.log(1 + documents / len(ids))
+        contribution = [MATCH_BONUS + weight * idf for weight in range(MAX_TERM_WEIGHT + 1)]
+        for msg_id, weight in zip(ids, weights):
+            scores[msg_id] = get(msg_id, 0.0) + contribution[weight]
+    # Newest first among equal scores (both selections are stable)
+    newest_first = sorted(scores, reverse=True)
+    if limit:
+        return heapq.nlargest(limit, newest_first, key=scores.__getitem__)
+    return sorted(newest_first, key=scores.__getitem__, reverse=True)
+
+
+def search_indexes(indexes, query, limit=None):
+    """
+    Searches several indexes as one (the in-memory index of the hot set first, then the
+    on-disk index of the archived posts). Posting lists of a term are joined, so the ranking
+    is the same as a single index over every post.
+    """
+    terms = query_terms(query)
+    merged = {}
+    documents = 0
+    for index in indexes:
+        documents += index.documents
+        for term, (ids, weights) in index.postings(terms).items():
+            entry = merged.get(term)
+            if entry is None:
+                merged[term] = (array('I', ids), array('B', weights))
+                continue
+            seen = set(entry[0])   # A post moved to the archive during the search counts once
+            for msg_id, weight in zip(ids, weights):
+                if msg_id not in seen:
+                    entry[0].append(msg_id)
+                    entry[1].append(weight)
+    entries = [merged[term] for term in terms if term in merged]
+    if not entries:
+        return []
+    ranked = rank(entries, max(documents, 1), limit)
+    topics = {}
+    for index in indexes:
+        topics.update(index.topics_of([msg_id for msg_id in ranked if msg_id not in topics]))
+    return [(topics[msg_id], msg_id) for msg_id in ranked if msg_id in topics]
+
+
+class SearchIndex:
+    """
+    Inverted index over message subjects and bodies.
+
+    Each term maps to two parallel arrays: message IDs (ascending, since IDs only grow)
+    and a one-byte weight (term count, subject words weighted higher). Appending a post
+    is O(words in the post); a query only walks the posting lists of its own terms.
+    last_id records the newest indexed message (and last_timestamp its post time, to tell
+    whether a persisted index belongs to the board it is loaded with), so a persisted index
+    can be brought up to date by indexing just the posts after it. Posts moved to the
+    archive are removed again, so the index only grows with the hot set.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}         # {term: (array('I') of message IDs, array('B') of weights)}
+        self._topics = bytearray()  # Topic letter of every ID from _topic_base on (0 = not indexed)
+        self._topic_base = 0
+        self.documents = 0
+        self.last_id = 0
+        self.last_timestamp = None
+
+    def add(self, topic_id, message):
+        """Indexes one message. Messages must be added in ascending ID order."""
+        msg_id = message['id']
+        weights = term_weights(message)
+        with self._lock:
+            if msg_id <= self.last_id:
+                return
+            for term, weight in weights.items():
+                entry = self._postings.get(term)
+                if entry is None:
+                    entry = self._postings[term] = (array('I'), array('B'))
+                entry[0].append(msg_id)
+                entry[1].append(weight)
+            if not self._topics:
+                self._topic_base = msg_id
+            position = msg_id - self._topic_base
+            if len(self._topics) <= position:
+                self._topics.extend(bytes(position + 1 - len(self._topics)))
+            self._topics[position] = ord(topic_id)
+            self.documents += 1
+            self.last_id = msg_id
+            self.last_timestamp = message['timestamp']
+
+    def remove(self, ids, terms=None):
+        """
+        Drops posts from the index (they moved to the archive). terms are the words the posts
+        were indexed under, if known; otherwise every posting list is checked.
+        """
+        ids = set(ids)
+        with self._lock:
+            for term in list(self._postings) if terms is None else terms:
+                entry = self._postings.get(term)
+                if entry is None:
+                    continue
+                keep = [k for k, msg_id in enumerate(entry[0]) if msg_id not in ids]
+                if len(keep) == len(entry[0]):
+                    continue
+                if keep:
+                    self._postings[term] = (array('I', (entry[0][k] for k in keep)),
+                                            array('B', (entry[1][k] for k in keep)))
+                else:
+                    del self._postings[term]
+            for msg_id in ids:
+                position = msg_id - self._topic_base
+                if 0 <= position < len(self._topics) and self._topics[position]:
+                    self._topics[position] = 0
+                    self.documents -= 1
+            # Removed posts are the oldest ones, so the topic table can usually shrink from the front
+            leading = len(self._topics) - len(self._topics.lstrip(b'\0'))
+            if leading:
+                del self._topics[:leading]
+                self._topic_base += leading
+
+    def ids(self):
+        """Returns the IDs of every indexed post."""
+        with self._lock:
+            return [self._topic_base + position for position, topic in enumerate(self._topics) if topic]
+
+    def postings(self, terms):
+        """Returns {term: (ids, weights)} copies of the posting lists of the given terms."""
+        with self._lock:
+            return {term: (array('I', self._postings[term][0]), array('B', self._postings[term][1]))
+                    for term in terms if term in self._postings}
+
+    def topics_of(self, ids):
+        """Returns {msg_id: topic_id} for the given IDs that are in the index."""
+        with self._lock:
+            found = {}
+            for msg_id in ids:
+                position = msg_id - self._topic_base
+                if 0 <= position < len(self._topics) and self._topics[position]:
+                    found[msg_id] = chr(self._topics[position])
+            return found
+
+    def search(self, query, limit=None):
+        """
+        Returns [(topic_id, msg_id)] ranked best first: posts matching more of the query
+        words come first, then higher tf-idf score, then newer posts.
+        """
+        terms = query_terms(query)
+        with self._lock:
+            entries = [self._postings[term] for term in terms if term in self._postings]
+            if not entries:
+                return []
+            ranked = rank(entries, max(self.documents, 1), limit)
+            return [(chr(self._topics[msg_id - self._topic_base]), msg_id) for msg_id in ranked]
+
+    # --- PERSISTENCE ---
+
+    def save(self, path):
+        """Writes the index through a temporary file and an atomic rename."""
+        with self._lock:
+            state = {
+                'version': INDEX_VERSION,
+                'last_id': self.last_id,
+                'last_timestamp': self.last_timestamp,
+                'documents': self.documents,
+                'topic_base': self._topic_base,
+                'topics': bytes(self._topics),
+                'postings': {term: (ids.tobytes(), weights.tobytes())
+                             for term, (ids, weights) in self._postings.items()},
+            }
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by save(). Returns None if it is missing, unreadable or outdated."""
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get('version') != INDEX_VERSION:
+            return None
+        index = cls()
+        index.last_id = state['last_id']
+        index.last_timestamp = state['last_timestamp']
+        index.documents = state['documents']
+        index._topic_base = state['topic_base']
+        index._topics = bytearray(state['topics'])
+        for term, (id_bytes, weight_bytes) in state['postings'].items():
+            ids = array('I')
+            ids.frombytes(id_bytes)
+            weights = array('B')
+            weights.frombytes(weight_bytes)
+            index._postings[term] = (ids, weights)
+        return index
+
+    def memory_estimate(self):
+        """Approximate bytes held by the posting lists."""
+        with self._lock:
+            return len(self._topics) + sum(
+                ids.itemsize * len(ids) + len(weights) + 64 + len(term)
+                for term, (ids, weights) in self._postings.items())
+
+
+class SQLiteSearchIndex:
+    """
+    The postings of SearchIndex kept in SQLite tables instead of memory: a query reads the
+    rows of its own terms, so neither memory nor open time grows with the number of posts.
+    It indexes the whole board in SQLite storage (inside the board's database) and the
+    archived posts in json/journal storage. Rankings match SearchIndex (see search_indexes).
+    """
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._counts = dict(self._conn.execute("SELECT topic, documents FROM search_counts"))
+        self.last_id = self._conn.execute("SELECT MAX(id) FROM search_documents").fetchone()[0] or 0
+
+    @property
+    def documents(self):
+        return sum(self._counts.values())
+
+    def count(self, topic_id):
+        return self._counts.get(topic_id, 0)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add(self, topic_id, message):
+        self.add_many([(topic_id, message)])
+
+    def add_many(self, rows):
+        """
+        Indexes (topic_id, message) rows in one transaction and returns how many were new;
+        posts already indexed are skipped, so indexing a batch again is harmless.
+        """
+        added = {}
+        last_id = self.last_id
+        with self._lock:
+            with self._conn:
+                for topic_id, message in rows:
+                    msg_id = message['id']
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO search_documents (id, topic) VALUES (?, ?)", (msg_id, topic_id))
+                    if not cursor.rowcount:
+                        continue
+                    self._conn.executemany(
+                        "INSERT INTO search_postings (term, id, weight) VALUES (?, ?, ?)",
+                        [(term, msg_id, weight) for term, weight in term_weights(message).items()])
+                    added[topic_id] = added.get(topic_id, 0) + 1
+                    last_id = max(last_id, msg_id)
+                for topic_id, count in added.items():
+                    self._conn.execute("INSERT OR IGNORE INTO search_counts (topic, documents) VALUES (?, 0)", (topic_id,))
+                    self._conn.execute("UPDATE search_counts SET documents = documents + ? WHERE topic = ?", (count, topic_id))
+            # Only once the transaction is committed
+            for topic_id, count in added.items():
+                self._counts[topic_id] = self._counts.get(topic_id, 0) + count
+            self.last_id = last_id
+        return sum(added.values())
+
+    def postings(self, terms):
+        """Returns {term: (ids, weights)} for the given terms, read from disk."""
+        found = {}
+        with self._lock:
+            for term in terms:
+                rows = self._conn.execute("SELECT id, weight FROM search_postings WHERE term = ?", (term,)).fetchall()
+                if rows:
+                    ids, weights = zip(*rows)
+                    found[term] = (array('I', ids), array('B', weights))
+        return found
+
+    def topics_of(self, ids, batch=500):
+        """Returns {msg_id: topic_id} for the given IDs that are in the index."""
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), batch):
+                chunk = ids[start:start + batch]
+                found.update(self._conn.execute(
+                    f"SELECT id, topic FROM search_documents WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def search(self, query, limit=None):
+        """Returns [(topic_id, msg_id)] ranked best first, as SearchIndex.search does."""
+        return search_indexes([self], query, limit)
@@ -0,0 +1,547 @@
+# send_scheduler.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import itertools
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+# --- CONFIGURATION & CONSTANTS ---
+
+# Minimum gap (seconds) between two transmissions from the BBS node.
+# This is the same 2.5 second spacing chunk_and_send always used to avoid dropped packets.
+DEFAULT_PACING_DELAY = 2.5
+
+# ACK flow control: how long to wait for the routing ACK of a chunk before retransmitting.
+# Each retry waits BACKOFF times longer than the last one.
+DEFAULT_ACK_TIMEOUT = 6.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_ACK_BACKOFF = 2.0
+# Small gap kept between transmissions even when ACKs come back instantly.
+DEFAULT_MIN_ACK_GAP = 0.3
+
+# Outbound priority classes, highest first. A packet of a higher class goes out before
+# any waiting packet of a lower class, except that a class passed over STARVATION_LIMITS
+# times in a row gets the next transmission. Game turns alternate with a busy interactive
+# class; bulk output still gets at least one transmission in five. Priority only reorders
+# destinations: each destination's replies go out in the order they were queued.
+PRIORITY_INTERACTIVE = 0   # Single-packet menu replies, prompts, warnings
+PRIORITY_GAME = 1          # Game turns
+PRIORITY_BULK = 2          # Multi-packet reads, summaries, search results
+PRIORITY_NAMES = ('interactive', 'game', 'bulk')
+STARVATION_LIMITS = (None, 1, 4)
+
+
+class SendScheduler:
+    """
+    Outbound packet queue for the BBS node.
+
+    onReceive hands the finished packets for a reply to enqueue() and returns straight away.
+    A single background sender drains one queue per destination in round-robin order, so a
+    long multi-chunk reply to one node no longer holds back the first packet to everyone else.
+    All traffic still leaves through one radio, so the pacing gap is kept between transmissions.
+    Each priority class has its own queues and rotation; between two packets of a long bulk
+    reply, waiting interactive and game packets to other nodes are slipped in first. A reply
+    to a node that still has packets queued in a lower class joins that class, so it never
+    overtakes the rest of an earlier reply to the same node.
+    With ACK flow control a destination waiting for the ACK of its chunk is parked while the
+    others keep being served, and a chunk given up on drops the rest of its reply.
+    """
+    def __init__(self, pacing_delay=DEFAULT_PACING_DELAY, flow_control=None):
+        self.pacing_delay = pacing_delay
+        self.flow_control = flow_control   # Optional AckFlowControl replacing the fixed gap
+        # Per priority class: {destId: deque of (interface, text, last chunk of its reply)}
+        # and the destIds with pending packets in round-robin order
+        self._queues = [{} for _ in PRIORITY_NAMES]
+        self._rotations = [deque() for _ in PRIORITY_NAMES]
+        self._passed_over = [0] * len(PRIORITY_NAMES)   # Consecutive sends that skipped a waiting class
+        self._in_flight = {}       # {destId: _Flight} parked until the ACK of their last chunk
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._sending = 0          # Packets taken off the queues but not yet settled
+        self._last_send = 0.0
+        self._send_listeners = []  # Callables run as callback(destId, text) after each packet is sent
+        self.stats = {'packets': 0, 'replies': 0, 'pacing_wait': 0.0, 'preempted': 0, 'starvation_turns': 0, 'dropped': 0,
+                      'demoted': 0,
+                      'by_class': [0] * len(PRIORITY_NAMES)}
+
+    def add_send_listener(self, callback):
+        """Registers callback(destId, text), called on the sender thread after every packet handed to the radio."""
+        self._send_listeners.append(callback)
+
+    def enqueue(self, interface, destId, packets, priority=PRIORITY_INTERACTIVE):
+        """
+        Queues the packets of one reply for destId in a priority class (or behind destId's
+        packets still queued in a lower one) and wakes the sender thread.
+        """
+        if not packets:
+            return
+        with self._cond:
+            for lower in range(len(self._queues) - 1, priority, -1):
+                if destId in self._queues[lower]:
+                    priority = lower
+                    self.stats['demoted'] += 1
+                    break
+            queues = self._queues[priority]
+            queue = queues.get(destId)
+            if queue is None:
+                queue = queues[destId] = deque()
+                self._rotations[priority].append(destId)
+            last = len(packets) - 1
+            queue.extend((interface, text, index == last) for index, text in enumerate(packets))
+            self._start_locked()
+            self._cond.notify()
+
+    def pending(self, destId=None):
+        """Returns the number of queued packets, for one destination or overall."""
+        with self._cond:
+            if destId is not None:
+                return sum(len(queues.get(destId, ())) for queues in self._queues)
+            return sum(len(q) for queues in self._queues for q in queues.values())
+
+    def wait_idle(self, timeout=None):
+        """Blocks until every queued packet has been sent (and ACKed or given up on). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(self._rotations) or self._sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self):
+        """Stops the sender thread. Packets still queued are discarded."""
+        with self._cond:
+            self._running = False
+            for queues, rotation in zip(self._queues, self._rotations):
+                queues.clear()
+                rotation.clear()
+            self._in_flight.clear()
+            self._sending = 0
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=self.pacing_delay + 1)
+            self._thread = None
+
+    def _start_locked(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="bbs-sender", daemon=True)
+        self._thread.start()
+
+    def _wake(self):
+        """Called by the flow control when an ACK or NAK arrives for a parked destination."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def _ready_locked(self, rotation):
+        """True if the rotation has a destination that is not parked waiting for an ACK."""
+        return any(destId not in self._in_flight for destId in rotation)
+
+    def _next_class_locked(self):
+        """Picks the class to send from: the highest one waiting, unless a lower one is starving."""
+        waiting = [priority for priority, rotation in enumerate(self._rotations) if self._ready_locked(rotation)]
+        chosen = waiting[0]
+        starving = [priority for priority in waiting[1:] if self._passed_over[priority] >= STARVATION_LIMITS[priority]]
+        if starving:
+            chosen = max(starving, key=lambda priority: self._passed_over[priority])
+            self.stats['starvation_turns'] += 1
+        for priority in waiting:
+            if priority > chosen:
+                self._passed_over[priority] += 1
+        self._passed_over[chosen] = 0
+        if waiting[-1] > chosen:
+            self.stats['preempted'] += 1
+        return chosen
+
+    def _next_packet_locked(self):
+        """Pops the next packet: chosen class first, then round-robin, one packet per destination per turn."""
+        priority = self._next_class_locked()
+        rotation, queues = self._rotations[priority], self._queues[priority]
+        while rotation[0] in self._in_flight:
+            rotation.rotate(-1)      # Parked destinations keep their queue and wait for their ACK
+        destId = rotation.popleft()
+        queue = queues[destId]
+        interface, text, last = queue.popleft()
+        if queue:
+            rotation.append(destId)
+        else:
+            del queues[destId]
+        self.stats['by_class'][priority] += 1
+        return _Flight(destId, interface, text, last, priority)
+
+    def _drop_reply_locked(self, flight):
+        """Discards the chunks still queued after a failed chunk, up to the end of its reply."""
+        queues = self._queues[flight.priority]
+        queue = queues.get(flight.destId)
+        dropped = 0
+        while queue and not flight.last:
+            _, _, last = queue.popleft()
+            dropped += 1
+            if last:
+                break
+        if queue is not None and not queue:
+            del queues[flight.destId]
+            self._rotations[flight.priority].remove(flight.destId)
+        self.stats['dropped'] += dropped
+        return dropped
+
+    def _next_action_locked(self):
+        """
+        Returns (flight, None) when there is work: a parked chunk whose ACK arrived or timed out
+        (flight.outstanding set), or the next packet to transmit. Otherwise (None, seconds to wait).
+        """
+        now = time.monotonic()
+        for flight in self._in_flight.values():
+            if flight.outstanding.waiter.event.is_set():
+                return flight, None
+
+        # Keep the pacing gap from the previous transmission, but never wait when idle.
+        # An ACK already paces a lone conversation, so only a small gap remains; while another
+        # chunk is still in the air the full gap applies.
+        if self.flow_control and not self._in_flight:
+            gap = self.flow_control.min_gap
+        else:
+            gap = self.pacing_delay
+        gap_wait = self._last_send + gap - now
+        wait = None
+        for flight in self._in_flight.values():
+            due = flight.outstanding.deadline - now
+            if due <= 0 and gap_wait <= 0:
+                return flight, None     # Timed out: poll() retransmits or gives up
+            wait = max(due, gap_wait) if wait is None else min(wait, max(due, gap_wait))
+        if any(self._ready_locked(rotation) for rotation in self._rotations):
+            if gap_wait <= 0:
+                return self._next_packet_locked(), None
+            wait = gap_wait if wait is None else min(wait, gap_wait)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    flight, wait = self._next_action_locked()
+                    if flight is not None:
+                        break
+                    waited_from = time.monotonic()
+                    self._cond.wait(wait)
+                    if wait is not None and not self._in_flight:
+                        self.stats['pacing_wait'] += min(time.monotonic() - waited_from, wait)
+                if flight.outstanding is None:
+                    self._sending += 1
+
+            try:
+                if flight.outstanding is not None:
+                    confirmed = self.flow_control.poll(flight.outstanding)
+                    if confirmed is None:
+                        continue            # Retransmitted, still parked
+                elif self.flow_control:
+                    flight.outstanding = self.flow_control.transmit(flight.interface, flight.destId, flight.text,
+                                                                   wake=self._wake)
+                    if flight.outstanding is not None:
+                        with self._cond:
+                            self._in_flight[flight.destId] = flight
+                        continue            # Parked until its ACK; other destinations go meanwhile
+                    confirmed = True
+                else:
+                    flight.interface.sendText(flight.text, destinationId=flight.destId)
+                    confirmed = True
+                self._finish(flight, confirmed)
+            except Exception as e:
+                print(f"ERROR: Failed to send packet to {flight.destId}: {e}")
+                self._finish(flight, False, sent=False)
+            finally:
+                with self._cond:
+                    self._last_send = time.monotonic()
+                    self._cond.notify_all()
+
+    def _finish(self, flight, confirmed, sent=True):
+        """Settles a packet: runs the send listeners, and drops the rest of its reply if it failed."""
+        with self._cond:
+            self._in_flight.pop(flight.destId, None)
+            self._sending -= 1
+            dropped = 0 if confirmed else self._drop_reply_locked(flight)
+        if sent:
+            self.stats['packets'] += 1
+            for callback in self._send_listeners:
+                callback(flight.destId, flight.text)
+        if dropped:
+            print(f"ERROR: Dropped the remaining {dropped} chunk(s) of the reply to {flight.destId}.")
+        elif confirmed and flight.last:
+            self.stats['replies'] += 1
+            print(f"SUCCESS: Reply sent to {flight.destId}.")
+
+
+class _Flight:
+    """One packet taken off the queues, with its ACK state while its destination is parked."""
+    __slots__ = ('destId', 'interface', 'text', 'last', 'priority', 'outstanding')
+
+    def __init__(self, destId, interface, text, last, priority):
+        self.destId = destId
+        self.interface = interface
+        self.text = text
+        self.last = last              # Final chunk of its reply
+        self.priority = priority
+        self.outstanding = None       # AckFlowControl transmission, set while waiting for the ACK
+
+
+# --- ACK-DRIVEN FLOW CONTROL ---
+
+class _AckWaiter:
+    """One outstanding packet waiting for its routing ACK/NAK."""
+    __slots__ = ('event', 'error', 'wake')
+
+    def __init__(self, wake=None):
+        self.event = threading.Event()
+        self.error = None
+        self.wake = wake      # Called once the ACK/NAK is in, so a parked sender can move on
+
+
+class _Outstanding:
+    """A chunk sent by AckFlowControl.transmit(), with its current attempt and ACK deadline."""
+    __slots__ = ('interface', 'destId', 'text', 'wake', 'started', 'attempt', 'timeout', 'deadline', 'packet_id', 'waiter')
+
+    def __init__(self, interface, destId, text, timeout, wake):
+        self.interface = interface
+        self.destId = destId
+        self.text = text
+        self.wake = wake
+        self.started = time.monotonic()
+        self.attempt = 0
+        self.timeout = timeout
+        self.deadline = None
+        self.packet_id = None
+        self.waiter = None
+
+
+class AckFlowControl:
+    """
+    Sends each chunk with wantAck=True and moves on as soon as the routing ACK comes back,
+    instead of always sleeping DEFAULT_PACING_DELAY. On timeout (or a NAK) the chunk is
+    retransmitted, waiting DEFAULT_ACK_BACKOFF times longer on every retry.
+
+    transmit() sends a chunk without waiting; the sender thread parks that destination and
+    calls poll() once the ACK is in or the deadline has passed, so one silent node never
+    holds up the replies to everyone else.
+
+    ACKs arrive as ROUTING_APP packets on 'meshtastic.receive'; onReceive forwards them
+    to on_routing_packet(), which matches decoded['requestId'] to the id of the sent packet.
+    """
+    def __init__(self, ack_timeout=DEFAULT_ACK_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff=DEFAULT_ACK_BACKOFF, min_gap=DEFAULT_MIN_ACK_GAP, fixed_delay=DEFAULT_PACING_DELAY):
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.min_gap = min_gap
+        self.fixed_delay = fixed_delay     # The old fixed sleep, kept for the comparison stats
+        self._lock = threading.Lock()
+        self._waiters = {}                 # {packet id: _AckWaiter}
+        self._early = OrderedDict()        # ACKs that arrived before their waiter was registered
+        self.stats = {
+            'packets': 0,        # Chunks handed to transmit()
+            'transmissions': 0,  # Radio transmissions, including retries
+            'acked': 0,
+            'naks': 0,
+            'timeouts': 0,
+            'failed': 0,         # Chunks given up on after max_retries
+            'ack_wait_total': 0.0,
+        }
+
+    def transmit(self, interface, destId, text, wake=None):
+        """
+        Sends one chunk without waiting for its ACK. Returns the _Outstanding to poll(), or
+        None if the interface reports no packet id (the fixed sleep paces it instead).
+        wake() is called from the receive thread when the ACK or NAK arrives.
+        """
+        with self._lock:
+            self.stats['packets'] += 1
+        outstanding = _Outstanding(interface, destId, text, self.ack_timeout, wake)
+        if not self._transmit(outstanding):
+            # The interface cannot report a packet id, so there is nothing to wait for
+            time.sleep(self.fixed_delay)
+            self._record_wait(outstanding.started)
+            return None
+        return outstanding
+
+    def poll(self, outstanding):
+        """
+        Checks a chunk sent by transmit(). Returns True once it is ACKed, False once the retries
+        have run out, and None while it is still waiting (retransmitting it if the ACK timed out).
+        """
+        waiter = outstanding.waiter
+        if not waiter.event.is_set() and time.monotonic() < outstanding.deadline:
+            return None
+        with self._lock:
+            self._waiters.pop(outstanding.packet_id, None)
+        if waiter.event.is_set() and waiter.error is None:
+            with self._lock:
+                self.stats['acked'] += 1
+            self._record_wait(outstanding.started)
+            return True
+
+        with self._lock:
+            if waiter.error is not None:
+                self.stats['naks'] += 1
+            else:
+                self.stats['timeouts'] += 1
+        reason = waiter.error or f"no ACK after {outstanding.timeout:.1f}s"
+        print(f"WARNING: Chunk to {outstanding.destId} not confirmed ({reason}), "
+              f"attempt {outstanding.attempt + 1}/{self.max_retries + 1}.")
+
+        if outstanding.attempt < self.max_retries:
+            outstanding.attempt += 1
+            outstanding.timeout *= self.backoff
+            if self._transmit(outstanding):
+                return None
+            self._record_wait(outstanding.started)
+            return True
+
+        with self._lock:
+            self.stats['failed'] += 1
+        self._record_wait(outstanding.started)
+        print(f"ERROR: Giving up on chunk to {outstanding.destId} after {self.max_retries + 1} attempts.")
+        return False
+
+    def on_routing_packet(self, packet):
+        """Matches an incoming ROUTING_APP packet (ACK or NAK) to the chunk waiting for it."""
+        decoded = packet.get('decoded', {})
+        request_id = decoded.get('requestId')
+        if not request_id:
+            return
+        error = decoded.get('routing', {}).get('errorReason', 'NONE')
+        error = None if error == 'NONE' else error
+
+        with self._lock:
+            waiter = self._waiters.get(request_id)
+            if waiter is None:
+                self._early[request_id] = error
+                while len(self._early) > 64:
+                    self._early.popitem(last=False)
+                return
+        waiter.error = error
+        waiter.event.set()
+        if waiter.wake:
+            waiter.wake()
+
+    def summary(self):
+        """Returns the effective per-chunk delay compared with the old fixed sleep."""
+        with self._lock:
+            stats = dict(self.stats)
+        done = stats['packets'] - stats['failed']
+        avg_wait = stats['ack_wait_total'] / stats['packets'] if stats['packets'] else 0.0
+        lines = [
+            f"Chunks: {stats['packets']} ({done} confirmed, {stats['failed']} failed)",
+            f"Transmissions: {stats['transmissions']} (timeouts {stats['timeouts']}, NAKs {stats['naks']})",
+            f"Avg delay per chunk: {avg_wait:.2f}s vs fixed {self.fixed_delay:.2f}s",
+        ]
+        if stats['packets']:
+            saved = self.fixed_delay * stats['packets'] - stats['ack_wait_total']
+            lines.append(f"Time saved vs fixed sleep: {saved:+.1f}s")
+        return "\n".join(lines)
+
+    def _transmit(self, outstanding):
+        """Puts one attempt of the chunk on the air. Returns False if there is no packet id to wait for."""
+        packet = outstanding.interface.sendText(outstanding.text, destinationId=outstanding.destId, wantAck=True)
+        with self._lock:
+            self.stats['transmissions'] += 1
+        packet_id = getattr(packet, 'id', None)
+        if not packet_id:
+            return False
+        outstanding.packet_id = packet_id
+        outstanding.waiter = self._register(packet_id, outstanding.wake)
+        outstanding.deadline = time.monotonic() + outstanding.timeout
+        return True
+
+    def _register(self, packet_id, wake=None):
+        waiter = _AckWaiter(wake)
+        with self._lock:
+            if packet_id in self._early:
+                waiter.error = self._early.pop(packet_id)
+                waiter.event.set()
+            else:
+                self._waiters[packet_id] = waiter
+        return waiter
+
+    def _record_wait(self, started):
+        with self._lock:
+            self.stats['ack_wait_total'] += time.monotonic() - started
+
+
+class LoopbackAckInterface:
+    """
+    Stand-in for a Meshtastic interface when testing flow control without a radio.
+    sendText() returns a packet with an id and, unless the packet is "lost", delivers a
+    routing ACK to ack_handler after ack_latency seconds (plus up to jitter seconds).
+    """
+    def __init__(self, ack_handler=None, ack_latency=0.5, jitter=0.0, loss=0.0, seed=None):
+        self.ack_handler = ack_handler
+        self.ack_latency = ack_latency
+        self.jitter = jitter
+        self.loss = loss
+        self.sent = []
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+
+    def sendText(self, text, destinationId=None, wantAck=False, **kwargs):
+        packet = _LoopbackPacket(next(self._ids))
+        self.sent.append((destinationId, text))
+        if wantAck and self.ack_handler and self._random.random() >= self.loss:
+            delay = self.ack_latency + self._random.uniform(0, self.jitter)
+            ack = {'decoded': {'portnum': 'ROUTING_APP', 'requestId': packet.id, 'routing': {'errorReason': 'NONE'}}}
+            timer = threading.Timer(delay, self.ack_handler, args=(ack,))
+            timer.daemon = True
+            timer.start()
+        return packet
+
+
+class _LoopbackPacket:
+    __slots__ = ('id',)
+
+    def __init__(self, packet_id):
+        self.id = packet_id
+
+
+# Example usage (for testing purposes, not run during normal operation)
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare ACK flow control with the fixed 2.5s chunk sleep.")
+    parser.add_argument('--chunks', type=int, default=12, help="Number of chunks to send.")
+    parser.add_argument('--latency', type=float, default=0.4, help="Simulated ACK latency (seconds).")
+    parser.add_argument('--jitter', type=float, default=0.4, help="Extra random ACK latency (seconds).")
+    parser.add_argument('--loss', type=float, default=0.1, help="Probability that a packet (or its ACK) is lost.")
+    parser.add_argument('--timeout', type=float, default=1.5, help="ACK timeout before the first retransmit.")
+    args = parser.parse_args()
+
+    # A menu reply queued behind a long reply to the same node waits for it; other nodes still
+    # go ahead of the bulk packets
+    radio = LoopbackAckInterface()
+    scheduler = SendScheduler(pacing_delay=0.05)
+    scheduler.enqueue(radio, '!a', ['a1', 'a2', 'a3'], PRIORITY_BULK)
+    scheduler.enqueue(radio, '!a', ['a-menu'], PRIORITY_INTERACTIVE)
+    scheduler.enqueue(radio, '!b', ['b-menu'], PRIORITY_INTERACTIVE)
+    scheduler.wait_idle()
+    scheduler.stop()
+    order = [text for _, text in radio.sent]
+    assert [text for text in order if text.startswith('a')] == ['a1', 'a2', 'a3', 'a-menu'], order
+    assert order.index('b-menu') < order.index('a2'), order
+    print(f"Per-node order OK: {order}")
+
+    flow = AckFlowControl(ack_timeout=args.timeout)
+    radio = LoopbackAckInterface(flow.on_routing_packet, args.latency, args.jitter, args.loss, seed=1)
+    scheduler = SendScheduler(flow_control=flow)
+
+    started = time.monotonic()
+    scheduler.enqueue(radio, '!test', [f"[{i + 1}/{args.chunks}] chunk" for i in range(args.chunks)])
+    scheduler.wait_idle()
+    elapsed = time.monotonic() - started
+    scheduler.stop()
+
+    print(flow.summary())
+    print(f"Wall time: {elapsed:.1f}s (fixed sleep would take {args.chunks * DEFAULT_PACING_DELAY:.1f}s)")
@@ -0,0 +1,217 @@
+# session_manager.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# --- CONFIGURATION & CONSTANTS ---
+DEFAULT_MAX_SESSIONS = 256        # Live sessions kept before the least recently used is evicted
+DEFAULT_IDLE_TTL = 60 * 60        # Seconds without a packet before a session is evicted
+SWEEP_INTERVAL = 60               # Seconds between idle sweeps (run on incoming packets)
+
+# Every key the handlers and games keep in a user's state
+SESSION_FIELDS = (
+    'first_contact', 'reset_next', 'last_menu', 'state',
+    'last_topic', 'current_page', 'max_pages',
+    'topic', 'subject', 'body_chunks',
+    'search_query', 'search_hits',
+    'more_packets',
+    'game_data',
+)
+_FIELD_SET = frozenset(SESSION_FIELDS)
+
+
+class Session:
+    """
+    Slotted per-node session record.
+
+    Handlers and games treat a session like the old USER_STATES dicts (state_data['state'],
+    state_data.get(...), 'x' in state_data, del state_data['x']); an unset slot behaves like
+    a missing key. Keys outside SESSION_FIELDS go to a small overflow dict.
+    """
+    __slots__ = SESSION_FIELDS + ('node_id', 'last_seen', '_extra')
+
+    def __init__(self, node_id, **fields):
+        self.node_id = node_id
+        self.last_seen = time.monotonic()
+        self._extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    _MISSING = object()
+
+    def pop(self, key, default=_MISSING):
+        try:
+            value = self[key]
+        except KeyError:
+            if default is Session._MISSING:
+                raise
+            return default
+        del self[key]
+        return value
+
+    def keys(self):
+        present = [key for key in SESSION_FIELDS if hasattr(self, key)]
+        return present + list(self._extra or ())
+
+    def approx_size(self):
+        """Rough memory held by this session in bytes (slots plus their values, one level deep)."""
+        size = sys.getsizeof(self)
+        for key in self.keys():
+            size += _approx_size(self[key])
+        return size
+
+
+class SessionStore:
+    """
+    Bounded store of live sessions, used as USER_STATES.
+
+    Sessions idle longer than idle_ttl are evicted by a periodic sweep, and the least
+    recently active session is evicted when max_sessions is exceeded. Each eviction calls
+    on_evict(node_id, session, reason) so the caller can clean up (drop drafts).
+    """
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, idle_ttl=DEFAULT_IDLE_TTL, on_evict=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._sessions = OrderedDict()   # {node_id: Session}, least recently active first
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+        self.stats = {'created': 0, 'evicted_idle': 0, 'evicted_lru': 0}
+
+    # --- Mapping access (what the handlers and games use) ---
+
+    def __contains__(self, node_id):
+        return node_id in self._sessions
+
+    def __getitem__(self, node_id):
+        return self._sessions[node_id]
+
+    def __setitem__(self, node_id, fields):
+        """Replaces a node's session; accepts a Session or a plain dict of fields."""
+        session = fields if isinstance(fields, Session) else Session(node_id, **fields)
+        with self._lock:
+            self._sessions[node_id] = session
+            self._sessions.move_to_end(node_id)
+            self.stats['created'] += 1
+            self._evict_over_capacity()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, node_id, default=None):
+        return self._sessions.get(node_id, default)
+
+    def pop(self, node_id, *default):
+        with self._lock:
+            return self._sessions.pop(node_id, *default)
+
+    # --- Session lifecycle ---
+
+    def touch(self, node_id):
+        """Marks a node active and returns its session (None if it has none). Runs the idle sweep when due."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self.evict_idle(now)
+            session = self._sessions.get(node_id)
+            if session is not None:
+                session.last_seen = now
+                self._sessions.move_to_end(node_id)
+            return session
+
+    def create(self, node_id, **fields):
+        """Starts a fresh session for node_id."""
+        self[node_id] = Session(node_id, **fields)
+        return self._sessions[node_id]
+
+    def evict_idle(self, now=None):
+        """Evicts every session idle for longer than idle_ttl. Returns the number evicted."""
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        with self._lock:
+            self._last_sweep = now
+            # Sessions are ordered by activity, so stop at the first one still fresh
+            while self._sessions:
+                node_id, session = next(iter(self._sessions.items()))
+                if now - session.last_seen < self.idle_ttl:
+                    break
+                self._evict(node_id, 'idle')
+                evicted += 1
+        return evicted
+
+    def _evict_over_capacity(self):
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)), 'lru')
+
+    def _evict(self, node_id, reason):
+        session = self._sessions.pop(node_id)
+        self.stats['evicted_' + reason] += 1
+        if self.on_evict:
+            try:
+                self.on_evict(node_id, session, reason)
+            except Exception as e:
+                print(f"ERROR: Session cleanup for {node_id} failed: {e}")
+
+    def memory_estimate(self):
+        """Approximate bytes held by all live sessions."""
+        with self._lock:
+            return sum(session.approx_size() for session in self._sessions.values())
+
+    def summary(self):
+        """Session counters for logs and the stats report."""
+        stats = dict(self.stats)
+        stats['live'] = len(self._sessions)
+        stats['memory_bytes'] = self.memory_estimate()
+        return stats
+
+
+def _approx_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
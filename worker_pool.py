@@ -0,0 +1,92 @@
+# worker_pool.py
+# Copyright (c) 2025 DicksterTheDick. Licensed under the MIT License.
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION & CONSTANTS ---
+DEFAULT_WORKERS = 4   # Threads handling packets; different nodes are served in parallel
+
+
+class KeyedWorkerPool:
+    """
+    Runs submitted jobs on a thread pool while keeping jobs with the same key strictly
+    serial and in submission order.
+
+    Each key (the sender's node ID) has its own FIFO queue. At most one worker drains a
+    key's queue at a time, so one node's packets are handled one after another exactly as
+    they arrived, while packets from other nodes run on the remaining workers.
+    With max_workers=0 jobs run inline on the caller's thread (the old serial behaviour).
+    """
+    def __init__(self, max_workers=DEFAULT_WORKERS, name="bbs-worker"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=name) if max_workers > 0 else None
+        self._cond = threading.Condition()
+        self._queues = {}    # {key: deque of (fn, args)}; present only while the key has work
+        self._pending = 0    # Jobs submitted but not finished
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'max_pending': 0}
+
+    def submit(self, key, fn, *args):
+        """Queues fn(*args) behind any earlier job for the same key."""
+        if self._executor is None:
+            self.stats['submitted'] += 1
+            self.stats['completed' if self._run_job(fn, args) else 'failed'] += 1
+            return
+        with self._cond:
+            self.stats['submitted'] += 1
+            self._pending += 1
+            self.stats['max_pending'] = max(self.stats['max_pending'], self._pending)
+            queue = self._queues.get(key)
+            if queue is not None:
+                # A worker is already draining this key; it will pick the job up in order
+                queue.append((fn, args))
+                return
+            self._queues[key] = deque([(fn, args)])
+        self._executor.submit(self._drain, key)
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        with self._cond:
+            return self._pending
+
+    def wait_idle(self, timeout=None):
+        """Blocks until every submitted job has finished. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, wait=True):
+        """Stops accepting work; with wait=True lets queued jobs finish first."""
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+
+    def _drain(self, key):
+        while True:
+            with self._cond:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                fn, args = queue[0]
+            ok = self._run_job(fn, args)
+            with self._cond:
+                self.stats['completed' if ok else 'failed'] += 1
+                queue.popleft()
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _run_job(self, fn, args):
+        try:
+            fn(*args)
+            return True
+        except Exception as e:
+            # One bad packet must not stop the node's queue
+            print(f"ERROR: Worker job failed: {e}")
+            return False